@@ -0,0 +1,90 @@
+"""Lossy precision encodings for float blob columns, decoded transparently on read"""
+import json
+
+import numpy as np
+
+ENCODINGS = [
+    None, # store float64 as-is
+    'float32', # single precision, ~7 significant digits
+    'quantize', # fixed-point integers with step 2*tolerance, so |error| <= tolerance
+    'delta', # as quantize, then store differences between successive rows, which are small for smooth series
+]
+METADATA_KEY = b'windy_golfing.encoding'
+
+def _smallest_int_dtype(arr):
+    """Return the smallest signed integer dtype holding every value of arr"""
+    lo, hi = (arr.min(), arr.max()) if arr.size else (0, 0)
+    for dtype in (np.int8, np.int16, np.int32, np.int64):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return dtype
+    raise OverflowError("Quantized values exceed int64; use a larger tolerance.")
+
+def check_precision(encoding=None, tolerance=None):
+    """Raise ValueError unless the encoding is known and given the tolerance it needs, e.g. before generating data to encode"""
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown encoding {encoding!r}. Choose from {ENCODINGS}.")
+    if tolerance is not None and not tolerance > 0:
+        raise ValueError(f"tolerance must be positive, got {tolerance!r}.")
+    if encoding in ('quantize', 'delta') and tolerance is None:
+        raise ValueError(f"The {encoding!r} encoding requires a positive tolerance.")
+
+def encode_table(df, encoding=None, tolerance=None):
+    """
+    Convert a DataFrame of float columns to a pyarrow Table in the given encoding.
+
+    NaNs are stored as nulls. The encoding is recorded in the table's schema metadata, so decode_table can reverse it.
+
+    Parameters:
+    -------
+    df: pd.DataFrame
+        The dataset, with a default index and float columns.
+    encoding: str | None
+        One of ENCODINGS.
+    tolerance: float | None
+        The maximum absolute error allowed per value. Required by 'quantize' and 'delta'.
+    """
+    import pyarrow as pa
+    check_precision(encoding, tolerance or None)
+    if encoding is None:
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+    step = 2*tolerance if tolerance else None
+    arrays = {}
+    for c in df.columns:
+        x = df[c].to_numpy(dtype=np.float64)
+        mask = np.isnan(x)
+        if encoding == 'float32':
+            arrays[c] = pa.array(x.astype(np.float32), mask=mask)
+            continue
+        q = np.where(mask, 0, np.round(np.where(mask, 0, x)/step)).astype(np.int64)
+        if encoding == 'delta':
+            q = np.diff(q, prepend=0) # masked rows hold 0, so cumsum restores every row exactly
+        arrays[c] = pa.array(q.astype(_smallest_int_dtype(q)), mask=mask)
+
+    table = pa.table(arrays)
+    metadata = {'encoding': encoding, 'step': step}
+    return table.replace_schema_metadata({METADATA_KEY: json.dumps(metadata)})
+
+def decode_table(table):
+    """Convert a pyarrow Table written by encode_table back to a DataFrame of float64 columns, with NaN for nulls"""
+    import pandas as pd
+    metadata = table.schema.metadata or {}
+    if METADATA_KEY not in metadata:
+        return table.to_pandas()
+    metadata = json.loads(metadata[METADATA_KEY])
+
+    columns = {}
+    for c in table.column_names:
+        col = table.column(c)
+        mask = col.is_null().to_numpy(zero_copy_only=False)
+        if metadata['encoding'] == 'float32':
+            x = col.to_numpy(zero_copy_only=False).astype(np.float64)
+        else:
+            q = col.fill_null(0).to_numpy().astype(np.int64)
+            if metadata['encoding'] == 'delta':
+                q = np.cumsum(q)
+            x = q*metadata['step']
+        x[mask] = np.nan
+        columns[c] = x
+    return pd.DataFrame(columns)
@@ -0,0 +1,126 @@
+"""Garbage collection and compaction of blob storage"""
+import time
+
+from django.apps import apps
+from django.conf import settings
+
+from .wranglers import BlobWrangler
+
+class BlobJanitor():
+    """Reconciles the blobs in storage against the model entries referring to them"""
+    def __init__(self, storage=None, grace=None, verbosity=0):
+        """
+        Parameters:
+        -------
+        storage: StorageBackend | None
+            Where blobs are kept. Defaults to the backend configured by settings.BLOB_STORAGE.
+        grace: float | None
+            Blobs written less than this many seconds ago are never collected, since a blob is stored before its entry is created (e.g. queued trial blobs await the next checkpoint). Defaults to settings.BLOB_GC_GRACE.
+        verbosity: int
+            0 is silent, 1 prints a summary, 2 also prints each blob deleted.
+        """
+        self.wrangler = BlobWrangler(storage)
+        self.storage = self.wrangler.storage
+        self.grace = settings.BLOB_GC_GRACE if grace is None else grace
+        self.verbosity = verbosity
+
+    @staticmethod
+    def blob_models():
+        """Models whose entries refer to blobs, by a blob_filename field"""
+        return [M for M in apps.get_models() if any(f.name == 'blob_filename' for f in M._meta.fields)]
+
+    def referenced(self,):
+        """Return the set of blob filenames referred to by any model entry, in one query per model"""
+        filenames = set()
+        for Model in self.blob_models():
+            filenames.update(Model.objects.exclude(blob_filename=None).values_list('blob_filename', flat=True).distinct())
+        return filenames
+
+    @staticmethod
+    def stem(name):
+        return name.split('.', 1)[0]
+
+    def is_stale(self, name, now):
+        try:
+            return now - self.storage.modified(name) > self.grace
+        except FileNotFoundError:
+            return False # deleted meanwhile
+
+    def collect_garbage(self, dry_run=False):
+        """
+        Delete orphaned blobs, i.e. those no model entry refers to (nor derived from one that is), e.g. after cascading deletes or crashed tasks, and stale partial writes.
+
+        Parameters:
+        -------
+        dry_run: bool
+            Only report what would be deleted.
+
+        Returns:
+        -------
+        report: dict
+            'stored', 'referenced': number of blobs in storage and referred to by entries,
+            'orphans': names of the orphaned blobs deleted,
+            'temporary': names of the partial writes deleted,
+            'dangling': number of entries whose blob is missing from storage (reported, not deleted).
+        """
+        # list storage before querying entries: a blob stored in between is then either referenced or too new to collect
+        now = time.time()
+        stored = set(self.storage.list())
+        temporary = self.storage.list_temporary()
+        referenced = self.referenced()
+
+        # files derived from a blob (e.g. downsampled levels, '<stem>.L10.fthr') share its stem, and live as long as it does
+        referenced_stems = {self.stem(name) for name in referenced}
+        orphans = sorted(name for name in stored if self.stem(name) not in referenced_stems and self.is_stale(name, now))
+        temporary = sorted(name for name in temporary if self.is_stale(name, now))
+        for name in orphans + temporary:
+            if self.verbosity >= 2:
+                print(f"[Janitor] {'Would delete' if dry_run else 'Deleting'} {name}")
+            if not dry_run:
+                try:
+                    self.storage.delete(name)
+                except FileNotFoundError:
+                    pass
+
+        report = {
+            'stored': len(stored),
+            'referenced': len(referenced),
+            'orphans': orphans,
+            'temporary': temporary,
+            'dangling': len(referenced - stored),
+        }
+        if self.verbosity >= 1:
+            print(f"[Janitor] {report['stored']} blobs stored, {report['referenced']} referenced. {'Would delete' if dry_run else 'Deleted'} {len(orphans)} orphans and {len(temporary)} partial writes. {report['dangling']} entries are missing their blob.")
+        return report
+
+    def compact(self, min_blobs=None, dry_run=False):
+        """
+        Pack small blobs into shared pack files, for each model defining a blob_pack_groups classmethod which yields groups of entries whose blobs belong together (e.g. the trials of an experiment).
+
+        Parameters:
+        -------
+        min_blobs: int | None
+            Groups with fewer unpacked blobs are left alone. Defaults to settings.BLOB_PACK_MIN_BLOBS.
+        dry_run: bool
+            Only report what would be packed.
+
+        Returns:
+        -------
+        report: dict
+            'packs': names of the pack files written, 'packed': number of blobs packed.
+        """
+        min_blobs = settings.BLOB_PACK_MIN_BLOBS if min_blobs is None else min_blobs
+        report = {'packs': [], 'packed': 0}
+        for Model in self.blob_models():
+            if not hasattr(Model, 'blob_pack_groups'):
+                continue
+            for objs in Model.blob_pack_groups():
+                objs = list(objs)
+                if len(objs) < min_blobs:
+                    continue
+                if not dry_run:
+                    report['packs'] += self.wrangler.pack_blobs(objs)
+                report['packed'] += len(objs)
+        if self.verbosity >= 1:
+            print(f"[Janitor] {'Would pack' if dry_run else 'Packed'} {report['packed']} blobs into {len(report['packs'])} pack files.")
+        return report
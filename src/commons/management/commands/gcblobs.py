@@ -0,0 +1,20 @@
+"""Blob storage maintenance: delete orphaned blobs and compact small ones into pack files"""
+from django.core.management.base import BaseCommand
+
+from commons.janitors import BlobJanitor
+
+class Command(BaseCommand):
+    help = "Reconcile blob storage against the database in one bulk pass, deleting orphaned blobs, after compacting small blobs (e.g. an experiment's trials) into pack files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be deleted and packed.")
+        parser.add_argument('--no-compact', action='store_true', help="Skip compaction into pack files.")
+        parser.add_argument('--grace', type=float, default=None, help="Never delete blobs written less than this many seconds ago. Defaults to settings.BLOB_GC_GRACE.")
+        parser.add_argument('--min-blobs', type=int, default=None, help="Only compact groups of at least this many blobs. Defaults to settings.BLOB_PACK_MIN_BLOBS.")
+
+    def handle(self, *args, **options):
+        janitor = BlobJanitor(grace=options['grace'], verbosity=max(options['verbosity'], 1))
+        # compact first, so the files it replaces are deleted in the same run should it be interrupted
+        if not options['no_compact']:
+            janitor.compact(min_blobs=options['min_blobs'], dry_run=options['dry_run'])
+        janitor.collect_garbage(dry_run=options['dry_run'])
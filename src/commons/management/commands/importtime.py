@@ -0,0 +1,57 @@
+"""Startup benchmark: measure the import cost of the compute modules loaded by Celery workers"""
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+class Command(BaseCommand):
+    help = "Measure the import time of worker compute modules with `python -X importtime`, failing if any heavy module is pulled in."
+
+    default_modules = [
+        'winds.generators',
+        'simulator.simulation.sim',
+        'simulator.simulation.scientists',
+    ]
+    default_forbid = [
+        'matplotlib',
+        'pandas',
+        'termcolor',
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('modules', nargs='*', default=self.default_modules, help="Modules to import.")
+        parser.add_argument('--forbid', nargs='*', default=self.default_forbid, help="Top level packages that must not be imported.")
+        parser.add_argument('--top', type=int, default=10, help="Number of slowest imports to list.")
+
+    def handle(self, *args, **options):
+        # time each module in a fresh interpreter, after django.setup() as a worker would
+        code = "import django; django.setup(); " + "; ".join(f"import {m}" for m in options['modules'])
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'windy_golfing.settings')}
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, env=env)
+        if proc.returncode != 0:
+            raise CommandError(proc.stderr)
+
+        # parse lines like "import time:       self [us] |  cumulative | imported package"
+        imports = {}
+        for line in proc.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            _, self_us, cumulative_us, name = [x.strip() for x in line.replace('import time:', '|', 1).split('|')]
+            imports[name] = (int(self_us), int(cumulative_us))
+
+        total_us = sum(self_us for self_us, _ in imports.values())
+        self.stdout.write(f"Total import time: {total_us/1000:.1f} ms over {len(imports)} modules")
+        for m in options['modules']:
+            self.stdout.write(f"  {m}: {imports[m][1]/1000:.1f} ms cumulative")
+
+        self.stdout.write(f"Slowest {options['top']} imports (self time):")
+        slowest = sorted(imports.items(), key=lambda item: item[1][0], reverse=True)[:options['top']]
+        for name, (self_us, _) in slowest:
+            self.stdout.write(f"  {self_us/1000:8.1f} ms  {name}")
+
+        # acceptance check
+        offenders = sorted({name.split('.')[0] for name in imports} & set(options['forbid']))
+        if offenders:
+            raise CommandError(f"Heavy modules imported: {offenders}")
+        self.stdout.write(self.style.SUCCESS("OK: no heavy modules imported."))
@@ -1,9 +1,93 @@
+import hashlib
+import json
+
 from django.db import models
 
 class Timestamped(models.Model):
     """Abstract model to add timestamp fields"""
-    created_at = models.DateTimeField(auto_now=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True, editable=False, db_index=True)
     modified_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         abstract = True
+
+def hash_params(fields, params):
+    """
+    Return a sha256 hex digest identifying a parameter set, independent of how its values were given (e.g. 100 vs 100.0, a related object vs its pk).
+
+    Parameters:
+    -------
+    fields: list of django Field
+        The model fields making up the parameter set.
+    params: dict
+        Field name to value. Missing fields take their default, as when creating a model instance.
+    """
+    values = {}
+    for field in fields:
+        value = params[field.name] if field.name in params else field.get_default()
+        if field.is_relation:
+            value = getattr(value, 'pk', value)
+            value = None if value is None else str(value)
+        elif hasattr(field, 'base_field') and value is not None: # ArrayField
+            value = [field.base_field.get_prep_value(v) for v in value]
+        else:
+            value = field.get_prep_value(value)
+        values[field.name] = value
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()
+
+class ParamsHashed(models.Model):
+    """Abstract model for parameter sets stored once each: params_hash has a unique index, so a duplicate is found with a single indexed lookup"""
+    params_hash = models.CharField(max_length=64, unique=True, null=True, editable=False)
+
+    params_hash_exclude = ['id', 'created_at', 'modified_at', 'params_hash'] # fields not part of the parameter set
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def params_hash_fields(cls):
+        return [f for f in cls._meta.concrete_fields if f.name not in cls.params_hash_exclude]
+
+    @classmethod
+    def hash_params(cls, params):
+        """Return the params_hash of the parameter set given as a dict, e.g. a serializer's validated_data"""
+        return hash_params(cls.params_hash_fields(), params)
+
+    @classmethod
+    def find_duplicate_id(cls, params):
+        """Return the id of the existing entry with this parameter set, or None, in one query"""
+        return cls.objects.filter(params_hash=cls.hash_params(params)).values_list('id', flat=True).first()
+
+    @classmethod
+    def bulk_get_or_create(cls, list_params):
+        """
+        Return the entry for each parameter set, creating those that don't exist yet, in one query plus one bulk insert.
+
+        Parameters:
+        -------
+        list_params: list of dict
+            Parameter sets, e.g. a list serializer's validated_data. Duplicates within the list share an entry.
+
+        Returns:
+        -------
+        objs: list of Model instances
+            One per parameter set, in the same order.
+        """
+        hashes = [cls.hash_params(params) for params in list_params]
+        objs = {o.params_hash: o for o in cls.objects.filter(params_hash__in=set(hashes))}
+        new_objs = []
+        for h, params in zip(hashes, list_params):
+            if h not in objs:
+                objs[h] = cls(**params)
+                objs[h].params_hash = h # bulk_create doesn't call save
+                new_objs.append(objs[h])
+        cls.objects.bulk_create(new_objs)
+        return [objs[h] for h in hashes]
+
+    def set_params_hash(self,):
+        """Set params_hash from the current field values, e.g. before a bulk_create, which doesn't call save"""
+        self.params_hash = self.hash_params({f.name: getattr(self, f.attname) for f in self.params_hash_fields()})
+
+    def save(self, *args, **kwargs):
+        self.set_params_hash()
+        super().save(*args, **kwargs)
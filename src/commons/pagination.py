@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+class CreatedCursorPagination(CursorPagination):
+    """
+    Newest first, in pages of ?page_size= rows (default 100).
+
+    Cursors seek on the indexed created_at column, so later pages cost no more than the first and no total count is taken, unlike offset pagination. Rows added while paging don't shift the pages.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
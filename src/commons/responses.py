@@ -0,0 +1,217 @@
+"""HTTP responses which stream blob data straight from storage, without loading it into pandas or re-serializing it as JSON"""
+import io
+import re
+
+import numpy as np
+
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+
+from .encodings import METADATA_KEY, decode_table
+from .wranglers import BlobWrangler
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+MULTI_RANGE_PATTERN = re.compile(r'^bytes=\d*-\d*(\s*,\s*\d*-\d*)+$')
+STREAM_CHUNK_SIZE = 2**20 # bytes
+
+def ranged_file_response(request, f, size, filename, content_type='application/octet-stream'):
+    """
+    Serve a file as-is, honoring a single-range HTTP Range header.
+
+    Whole files go out through FileResponse, so the server can use sendfile for real files. Ranges are answered with 206 Partial Content.
+
+    Parameters:
+    -------
+    request: HttpRequest
+        The request, whose Range header is read.
+    f: file object
+        Readable, seekable binary file to serve. The response takes ownership and closes it.
+    size: int
+        Size of the file in bytes.
+    filename: str
+        Name offered to the client in Content-Disposition.
+    content_type: str
+        The response's Content-Type.
+    """
+    header = request.headers.get('Range')
+    if header is None:
+        response = FileResponse(f, as_attachment=True, filename=filename, content_type=content_type)
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    if MULTI_RANGE_PATTERN.match(header.strip()):
+        # multiple ranges aren't supported, so the header is ignored and the whole file served (RFC 7233)
+        response = FileResponse(f, as_attachment=True, filename=filename, content_type=content_type)
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    # parse "bytes=first-last", "bytes=first-" or "bytes=-suffix_length"
+    match = RANGE_PATTERN.match(header.strip())
+    first, last = match.groups() if match else ('', '')
+    if first:
+        start, end = int(first), (min(int(last), size-1) if last else size-1)
+    elif last:
+        start, end = max(size-int(last), 0), size-1
+    else:
+        start, end = None, None
+    if start is None or start > end or start >= size:
+        f.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    def stream():
+        with f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                data = f.read(min(STREAM_CHUNK_SIZE, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+
+    response = StreamingHttpResponse(stream(), status=206, content_type=content_type)
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def npy_response(columns, filename):
+    """
+    Stream equal-length 1D arrays as a single (N, len(columns)) .npy file.
+
+    The array is written in Fortran order, so each column's buffer is sent as-is after the header rather than being interleaved into rows.
+
+    Parameters:
+    -------
+    columns: list of np.array
+        The columns of the array, all of the same length and dtype.
+    filename: str
+        Name offered to the client in Content-Disposition.
+    """
+    dtype = columns[0].dtype
+    shape = (len(columns[0]), len(columns))
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {
+        'descr': np.lib.format.dtype_to_descr(dtype),
+        'fortran_order': True,
+        'shape': shape,
+    })
+
+    def stream():
+        yield header.getvalue()
+        for col in columns:
+            yield np.ascontiguousarray(col, dtype=dtype).tobytes()
+
+    response = StreamingHttpResponse(stream(), content_type='application/octet-stream')
+    response['Content-Length'] = len(header.getvalue()) + dtype.itemsize*shape[0]*shape[1]
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def blob_download_response(request, obj, timestep):
+    """
+    Download the (x, y, z) time series in a model object's blob.
+
+    Query parameters:
+    -------
+    filetype: str ['arrow' | 'npy']
+        'arrow' (default) serves the stored Arrow/feather file as-is, honoring HTTP Range. 'npy' serves a (T, 3) .npy array, or (T, 4) with the times first if the blob has a t column (e.g. a sampled trajectory, see simulator.simulation.samplers).
+    start, stop: float
+        Optional time window in seconds, selecting the rows with start <= t <= stop. Implies filetype=npy.
+
+    Parameters:
+    -------
+    request: HttpRequest
+        The download request.
+    obj: Model instance
+        The object whose blob is downloaded.
+    timestep: float
+        The time between rows of the blob, in seconds.
+    """
+    wrangler = BlobWrangler()
+    basename = obj.id.__str__()
+    try:
+        start, stop = time_params(request)
+    except ValueError as exc:
+        return JsonResponse({'message': str(exc)}, status=400)
+    filetype = request.query_params.get('filetype', 'npy' if start is not None or stop is not None else 'arrow')
+    if filetype == 'arrow':
+        content_type = 'application/vnd.apache.arrow.file'
+        if wrangler.is_packed(obj):
+            # serve just the object's rows of the shared pack file
+            import pyarrow.feather as feather
+            buf = io.BytesIO()
+            feather.write_feather(wrangler.read_table(obj), buf, **wrangler.compression(type(obj)))
+            return ranged_file_response(request, io.BytesIO(buf.getvalue()), buf.tell(), f'{basename}.fthr', content_type=content_type)
+        size = wrangler.storage.size(obj.blob_filename)
+        return ranged_file_response(request, wrangler.open_blob(obj), size, obj.blob_filename, content_type=content_type)
+
+    # read just the requested rows, memory-mapping the file if the storage is local
+    table = wrangler.read_table(obj)
+    names = ['t', 'x', 'y', 'z'] if 't' in table.column_names else ['x', 'y', 'z']
+    table = table.select(names)
+    encoded = table.schema.metadata and METADATA_KEY in table.schema.metadata
+    if 't' in names:
+        # sampled rows aren't evenly spaced, so window them by their times
+        t = (decode_table(table.select(['t']))['t'] if encoded else table.column('t')).to_numpy()
+        row_start, row_stop = time_window(start, stop, t)
+    else:
+        row_start, row_stop = row_window(start, stop, timestep, table.num_rows)
+    if encoded:
+        # delta-encoded rows depend on every row before them, so decode from the start
+        df = decode_table(table.slice(0, row_stop)).iloc[row_start:]
+        columns = [df[c].to_numpy() for c in names]
+    else:
+        table = table.slice(row_start, row_stop-row_start)
+        columns = [table.column(c).to_numpy() for c in names]
+    return npy_response(columns, f'{basename}.npy')
+
+def time_params(request):
+    """Parse the start and stop query parameters (seconds), each None if not given. Raises ValueError if either isn't a finite number."""
+    values = []
+    for key in ['start', 'stop']:
+        value = request.query_params.get(key)
+        try:
+            value = float(value) if value else None
+        except ValueError:
+            value = np.nan
+        if value is not None and not np.isfinite(value):
+            raise ValueError(f'{key} must be a time in seconds, got {request.query_params.get(key)!r}.')
+        values.append(value)
+    return tuple(values)
+
+def row_window(start, stop, timestep, num_rows):
+    """The range of rows [row_start, row_stop) with start <= t <= stop, given the parsed start and stop (see time_params)"""
+    eps = 1e-9 # so a time falling on a row isn't lost to float error
+    row_start = max(int(np.ceil(start/timestep - eps)), 0) if start is not None else 0
+    row_stop = min(int(np.floor(stop/timestep + eps)) + 1, num_rows) if stop is not None else num_rows
+    return row_start, max(row_stop, row_start)
+
+def time_window(start, stop, t):
+    """As row_window, for rows at ascending times t (seconds), e.g. a sampled trajectory"""
+    eps = 1e-9
+    row_start = int(np.searchsorted(t, start - eps, side='left')) if start is not None else 0
+    row_stop = int(np.searchsorted(t, stop + eps, side='right')) if stop is not None else len(t)
+    return row_start, max(row_stop, row_start)
+
+def array_download_response(request, arr, timestep, basename):
+    """
+    Download an in-memory (T, 3) array of (x, y, z) values, e.g. a lazily generated wind spacetime which has no blob.
+
+    Takes the same query parameters as blob_download_response. The Arrow file is built on demand.
+    """
+    try:
+        start, stop = time_params(request)
+    except ValueError as exc:
+        return JsonResponse({'message': str(exc)}, status=400)
+    filetype = request.query_params.get('filetype', 'npy' if start is not None or stop is not None else 'arrow')
+    row_start, row_stop = row_window(start, stop, timestep, arr.shape[0])
+    if filetype == 'arrow':
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        table = pa.table({c: np.ascontiguousarray(arr[row_start:row_stop, i]) for i, c in enumerate(['x', 'y', 'z'])})
+        buf = io.BytesIO()
+        feather.write_feather(table, buf, compression='uncompressed')
+        return ranged_file_response(request, io.BytesIO(buf.getvalue()), buf.tell(), f'{basename}.fthr', content_type='application/vnd.apache.arrow.file')
+    return npy_response([arr[row_start:row_stop, i] for i in range(arr.shape[1])], f'{basename}.npy')
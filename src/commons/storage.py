@@ -0,0 +1,222 @@
+"""Storage backends holding the blobs that BlobWrangler reads and writes"""
+import io
+import os
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+class StorageBackend:
+    """Base class: stores named blobs of bytes"""
+    def save(self, name, data):
+        """Store bytes, data, under name, replacing any existing blob"""
+        raise NotImplementedError
+
+    def open(self, name):
+        """Return a readable, seekable binary file object for the blob"""
+        raise NotImplementedError
+
+    def delete(self, name):
+        """Delete the blob. Raises FileNotFoundError if it doesn't exist."""
+        raise NotImplementedError
+
+    def exists(self, name):
+        raise NotImplementedError
+
+    def size(self, name):
+        """Size of the blob in bytes"""
+        raise NotImplementedError
+
+    def list(self,):
+        """Return the names of all stored blobs"""
+        raise NotImplementedError
+
+    def modified(self, name):
+        """Time the blob was last written, in seconds since the epoch"""
+        raise NotImplementedError
+
+    def list_temporary(self,):
+        """Return the names of partially written blobs left behind by interrupted saves, for garbage collection"""
+        return []
+
+    def path(self, name):
+        """Return the blob's local filesystem path, if it has one (so it can be memory-mapped or sent with sendfile), otherwise None"""
+        return None
+
+class LocalStorageBackend(StorageBackend):
+    """Blobs stored as files in a local directory"""
+    def __init__(self, location):
+        self.location = str(location)
+
+    def save(self, name, data):
+        os.makedirs(self.location, exist_ok=True)
+        # write to a temporary file then rename, so readers never see a partial blob
+        tmp_path = self.path(name) + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path(name))
+
+    def open(self, name):
+        return open(self.path(name), 'rb')
+
+    def delete(self, name):
+        os.remove(self.path(name))
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+    def size(self, name):
+        return os.path.getsize(self.path(name))
+
+    def list(self,):
+        if not os.path.isdir(self.location):
+            return []
+        with os.scandir(self.location) as it:
+            return [entry.name for entry in it if entry.is_file() and not entry.name.endswith('.tmp')]
+
+    def modified(self, name):
+        return os.path.getmtime(self.path(name))
+
+    def list_temporary(self,):
+        if not os.path.isdir(self.location):
+            return []
+        with os.scandir(self.location) as it:
+            return [entry.name for entry in it if entry.is_file() and entry.name.endswith('.tmp')]
+
+    def path(self, name):
+        return os.path.join(self.location, name)
+
+class MemoryStorageBackend(StorageBackend):
+    """Blobs held in a dict, for tests"""
+    def __init__(self,):
+        self.blobs = {}
+        self.mtimes = {}
+        self.lock = threading.Lock()
+
+    def save(self, name, data):
+        with self.lock:
+            self.blobs[name] = bytes(data)
+            self.mtimes[name] = time.time()
+
+    def open(self, name):
+        try:
+            return io.BytesIO(self.blobs[name])
+        except KeyError:
+            raise FileNotFoundError(name)
+
+    def delete(self, name):
+        with self.lock:
+            try:
+                del self.blobs[name]
+                del self.mtimes[name]
+            except KeyError:
+                raise FileNotFoundError(name)
+
+    def exists(self, name):
+        return name in self.blobs
+
+    def size(self, name):
+        try:
+            return len(self.blobs[name])
+        except KeyError:
+            raise FileNotFoundError(name)
+
+    def list(self,):
+        return list(self.blobs.keys())
+
+    def modified(self, name):
+        try:
+            return self.mtimes[name]
+        except KeyError:
+            raise FileNotFoundError(name)
+
+class S3StorageBackend(StorageBackend):
+    """
+    Blobs stored as objects in an S3-compatible bucket.
+
+    Requires boto3. Pointing endpoint_url at a local stand-in (e.g. MinIO, or moto's server mode) allows testing without AWS.
+    """
+    def __init__(self, bucket, prefix='', endpoint_url=None, client=None, **client_kwargs):
+        """
+        Parameters:
+        -------
+        bucket: str
+            Name of the bucket holding the blobs.
+        prefix: str
+            Key prefix under which blobs are stored, e.g. 'blobs/'.
+        endpoint_url: str | None
+            URL of an S3-compatible service, if not AWS.
+        client: boto3 S3 client | None
+            An existing client to use. Otherwise one is created from endpoint_url and client_kwargs (e.g. region_name, aws_access_key_id).
+        """
+        if client is None:
+            try:
+                import boto3
+            except ImportError as exc:
+                raise ImportError("S3StorageBackend requires boto3. Try `pip install boto3`.") from exc
+            client = boto3.client('s3', endpoint_url=endpoint_url, **client_kwargs)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _key(self, name):
+        return self.prefix + name
+
+    def _not_found(self, exc):
+        code = getattr(exc, 'response', {}).get('Error', {}).get('Code')
+        return code in ('404', 'NoSuchKey', 'NotFound')
+
+    def save(self, name, data):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(name), Body=bytes(data))
+
+    def open(self, name):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(name))
+        except Exception as exc:
+            if self._not_found(exc):
+                raise FileNotFoundError(name) from exc
+            raise
+        return io.BytesIO(response['Body'].read())
+
+    def delete(self, name):
+        if not self.exists(name):
+            raise FileNotFoundError(name)
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(name))
+
+    def exists(self, name):
+        try:
+            self.size(name)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _head(self, name):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(name))
+        except Exception as exc:
+            if self._not_found(exc):
+                raise FileNotFoundError(name) from exc
+            raise
+
+    def size(self, name):
+        return self._head(name)['ContentLength']
+
+    def modified(self, name):
+        return self._head(name)['LastModified'].timestamp()
+
+    def list(self,):
+        names = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for o in page.get('Contents', []):
+                names.append(o['Key'][len(self.prefix):])
+        return names
+
+@lru_cache(maxsize=None)
+def get_storage_backend():
+    """Return the process-wide StorageBackend configured by settings.BLOB_STORAGE"""
+    config = settings.BLOB_STORAGE
+    Backend = import_string(config['BACKEND'])
+    return Backend(**config.get('OPTIONS', {}))
@@ -0,0 +1,17 @@
+from celery import shared_task
+
+from .janitors import BlobJanitor
+
+@shared_task
+def collectBlobGarbageTask() -> dict:
+    """Periodic blob storage maintenance (see settings.CELERY_BEAT_SCHEDULE): compacts small blobs into pack files then deletes orphaned blobs, returning a summary."""
+    janitor = BlobJanitor()
+    compact_report = janitor.compact()
+    gc_report = janitor.collect_garbage()
+    return {
+        'packed': compact_report['packed'],
+        'packs': len(compact_report['packs']),
+        'orphans': len(gc_report['orphans']),
+        'temporary': len(gc_report['temporary']),
+        'dangling': gc_report['dangling'],
+    }
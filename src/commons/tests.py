@@ -1,3 +1,165 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from django.test import SimpleTestCase, TestCase, RequestFactory
+
+from winds.models import WindSpacetime
+
+from .encodings import encode_table, decode_table
+from .janitors import BlobJanitor
+from .responses import ranged_file_response
+from .storage import LocalStorageBackend, MemoryStorageBackend, S3StorageBackend
+
+try:
+    import boto3
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
 
 # Create your tests here.
+class TestRangedFileResponse(SimpleTestCase):
+    def setUp(self,):
+        fd, self.filepath = tempfile.mkstemp()
+        self.data = bytes(range(100))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.data)
+
+    def tearDown(self,):
+        os.remove(self.filepath)
+
+    def get(self, **headers):
+        request = RequestFactory().get('/', **headers)
+        return ranged_file_response(request, open(self.filepath, 'rb'), len(self.data), 'blob.fthr')
+
+    def test_whole_file(self,):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        response.close()
+
+    def test_ranges(self,):
+        for header, expected in [
+            ('bytes=10-19', self.data[10:20]),
+            ('bytes=90-', self.data[90:]),
+            ('bytes=-5', self.data[-5:]),
+            ('bytes=95-200', self.data[95:]),
+        ]:
+            response = self.get(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(b''.join(response.streaming_content), expected)
+
+    def test_unsatisfiable_range(self,):
+        for header in ['bytes=100-', 'bytes=20-10', 'items=0-1']:
+            response = self.get(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 416)
+            self.assertEqual(response['Content-Range'], 'bytes */100')
+
+    def test_multiple_ranges_serve_whole_file(self,):
+        response = self.get(HTTP_RANGE='bytes=0-9, 20-29')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        response.close()
+
+class StorageBackendContract:
+    """Behaviour every StorageBackend must share. Subclasses set self.storage in setUp."""
+    def test_save_open_size(self,):
+        self.storage.save('a.fthr', b'abc')
+        self.storage.save('a.fthr', b'abcd') # replaces
+        with self.storage.open('a.fthr') as f:
+            self.assertEqual(f.read(), b'abcd')
+        self.assertEqual(self.storage.size('a.fthr'), 4)
+        self.assertTrue(self.storage.exists('a.fthr'))
+
+    def test_list_and_delete(self,):
+        self.storage.save('a.fthr', b'a')
+        self.storage.save('b.fthr', b'b')
+        self.assertEqual(sorted(self.storage.list()), ['a.fthr', 'b.fthr'])
+        self.storage.delete('a.fthr')
+        self.assertFalse(self.storage.exists('a.fthr'))
+        self.assertEqual(self.storage.list(), ['b.fthr'])
+
+    def test_modified(self,):
+        before = time.time()
+        self.storage.save('a.fthr', b'a')
+        self.assertAlmostEqual(self.storage.modified('a.fthr'), before, delta=5)
+
+    def test_missing_blob(self,):
+        with self.assertRaises(FileNotFoundError):
+            self.storage.open('missing.fthr')
+        with self.assertRaises(FileNotFoundError):
+            self.storage.delete('missing.fthr')
+
+class TestLocalStorageBackend(StorageBackendContract, SimpleTestCase):
+    def setUp(self,):
+        self.location = tempfile.mkdtemp()
+        self.storage = LocalStorageBackend(os.path.join(self.location, 'blobs'))
+
+    def tearDown(self,):
+        shutil.rmtree(self.location)
+
+class TestMemoryStorageBackend(StorageBackendContract, SimpleTestCase):
+    def setUp(self,):
+        self.storage = MemoryStorageBackend()
+
+@unittest.skipIf(mock_aws is None, "requires boto3 and moto")
+class TestS3StorageBackend(StorageBackendContract, SimpleTestCase):
+    def setUp(self,):
+        self.mock = mock_aws()
+        self.mock.start()
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket='blobs')
+        self.storage = S3StorageBackend('blobs', prefix='test/', client=client)
+
+    def tearDown(self,):
+        self.mock.stop()
+
+class TestEncodings(SimpleTestCase):
+    def setUp(self,):
+        t = np.linspace(0, 10, 1001)
+        self.df = pd.DataFrame({'x': np.sin(t), 'y': 3*t, 'z': 1e4*np.cos(t)})
+        self.df.iloc[:100] = np.nan # e.g. a trajectory before the ball is hit
+
+    def roundtrip(self, encoding, tolerance=None):
+        return decode_table(encode_table(self.df, encoding, tolerance))
+
+    def test_lossless_by_default(self,):
+        pd.testing.assert_frame_equal(self.roundtrip(None), self.df)
+
+    def test_lossy_encodings_within_tolerance(self,):
+        for encoding, tolerance, atol in [('float32', None, 1e-3), ('quantize', 1e-3, 1e-3), ('delta', 1e-3, 1e-3)]:
+            decoded = self.roundtrip(encoding, tolerance)
+            self.assertEqual(list(decoded.columns), ['x', 'y', 'z'])
+            self.assertTrue((decoded.isna() == self.df.isna()).all().all())
+            np.testing.assert_allclose(decoded.to_numpy(), self.df.to_numpy(), rtol=0, atol=atol*(1+1e-9))
+
+    def test_tolerance_required(self,):
+        with self.assertRaises(ValueError):
+            encode_table(self.df, 'delta')
+
+class TestBlobJanitor(TestCase):
+    def setUp(self,):
+        self.storage = MemoryStorageBackend()
+        self.janitor = BlobJanitor(self.storage, grace=60)
+        WindSpacetime.objects.create(generator_name='Constant', blob_filename='kept.fthr')
+        WindSpacetime.objects.create(generator_name='Constant', duration=10, blob_filename='missing.fthr')
+        for name in ['kept.fthr', 'kept.L10.fthr', 'orphan.fthr', 'orphan.L10.fthr', 'new_orphan.fthr']:
+            self.storage.save(name, b'')
+            if name != 'new_orphan.fthr':
+                self.storage.mtimes[name] -= 3600
+
+    def test_collects_stale_orphans_only(self,):
+        report = self.janitor.collect_garbage()
+        self.assertEqual(report['orphans'], ['orphan.L10.fthr', 'orphan.fthr'])
+        self.assertEqual(report['dangling'], 1)
+        self.assertEqual(sorted(self.storage.list()), ['kept.L10.fthr', 'kept.fthr', 'new_orphan.fthr'])
+
+    def test_dry_run(self,):
+        report = self.janitor.collect_garbage(dry_run=True)
+        self.assertEqual(len(report['orphans']), 2)
+        self.assertEqual(len(self.storage.list()), 5)
@@ -1,9 +1,11 @@
 """Utility tools for use throughout the project"""
 
 def list_model_fields(Model):
-    """Returns a list of the fields in a model"""
+    """Returns a list of the fields in a model, including the attnames of foreign keys (e.g. 'windspacetime_id')"""
     fields = Model._meta.get_fields()
-    return [field.name for field in fields]
+    names = [field.name for field in fields]
+    names += [field.attname for field in Model._meta.concrete_fields if field.attname != field.name]
+    return names
 
 def trim_dict(d, stencil):
     """
@@ -1,3 +1,104 @@
-from django.shortcuts import render
+"""Mixins for the list APIs, so large tables can be polled cheaply, and a base for async views"""
+import hashlib
+import json
 
-# Create your views here.
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.serializers import ListSerializer
+
+class SparseFieldsetMixin:
+    """
+    ?fields=id,duration limits a GET response to the given fields, and the query to loading their columns (e.g. skipping large ArrayFields).
+
+    For ModelViewSet classes.
+    """
+    always_loaded_fields = ['id', 'created_at', 'modified_at'] # needed for pagination and ETags
+
+    def requested_fields(self,):
+        if self.request is None or self.request.method != 'GET':
+            return None
+        fields = self.request.query_params.get('fields')
+        return [f for f in fields.split(',') if f] if fields else None
+
+    def get_queryset(self,):
+        qs = super().get_queryset()
+        fields = self.requested_fields()
+        if fields:
+            model_fields = {f.name for f in qs.model._meta.concrete_fields}
+            qs = qs.only(*(set(self.always_loaded_fields) | (set(fields) & model_fields)))
+        return qs
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        fields = self.requested_fields()
+        if fields:
+            target = serializer.child if isinstance(serializer, ListSerializer) else serializer
+            unknown = set(fields) - set(target.fields)
+            if unknown:
+                raise ValidationError({'fields': f'Unknown fields: {sorted(unknown)}'})
+            for name in set(target.fields) - set(fields):
+                target.fields.pop(name)
+        return serializer
+
+class ConditionalMixin:
+    """
+    ETag responses for list and retrieve, with 304 Not Modified for a matching If-None-Match.
+
+    The ETag hashes the request path (incl. query string) with the (id, modified_at) of the objects in the response, so a client polling an unchanged page costs one indexed query and no serialization. For ModelViewSet classes with Timestamped models.
+    """
+    def get_etag(self, objs):
+        h = hashlib.md5(self.request.get_full_path().encode())
+        for o in objs:
+            h.update(f'{o.pk}:{o.modified_at.isoformat()};'.encode())
+        return quote_etag(h.hexdigest())
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        objs = page if page is not None else list(queryset)
+
+        etag = self.get_etag(objs)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        serializer = self.get_serializer(objs, many=True)
+        response = self.get_paginated_response(serializer.data) if page is not None else Response(serializer.data)
+        response['ETag'] = etag
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+
+        etag = self.get_etag([instance])
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        response = Response(self.get_serializer(instance).data)
+        response['ETag'] = etag
+        return response
+
+class AsyncJSONView(View):
+    """
+    Base class for async JSON views, served under ASGI (see windy_golfing.asgi). Every handler is an `async def`, so a client waiting on one (e.g. long-polling) holds no worker thread; blocking calls go through asgiref's sync_to_async for just as long as they take.
+
+    DRF's APIView is sync only, so these are plain Django views. Like APIView, they're CSRF exempt.
+    """
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    @staticmethod
+    def json_body(request):
+        """The request's JSON body, or None if it isn't a JSON object"""
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
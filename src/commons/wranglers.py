@@ -1,23 +1,124 @@
-import os
-import pandas as pd
+import io
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
 
 from django.conf import settings
 
+from .encodings import METADATA_KEY, encode_table, decode_table
+from .storage import get_storage_backend
+
+# N.B. pandas is imported where used, since blob I/O is the only thing needing it
+
+@lru_cache(maxsize=None)
+def get_io_pool():
+    """Return the process-wide thread pool running blob reads and writes in the background"""
+    return ThreadPoolExecutor(max_workers=settings.BLOB_IO_THREADS, thread_name_prefix='blob-io')
+
 class BlobWrangler():
     """Interface between the ORM and Blob storage"""
+    def __init__(self, storage=None):
+        """
+        Parameters:
+        -------
+        storage: StorageBackend | None
+            Where blobs are kept. Defaults to the backend configured by settings.BLOB_STORAGE.
+        """
+        self.storage = storage if storage is not None else get_storage_backend()
+        self.pending = [] # (obj, future) for blobs queued by queue_blob, awaiting flush
+
+    @staticmethod
+    def is_packed(obj):
+        """Whether the object's blob is a slice of rows in a pack file shared with other objects (see pack_blobs)"""
+        return getattr(obj, 'pack_offset', None) is not None
 
-    staging_path = os.path.join(settings.BASE_DIR, '.blob_storage')
+    def blob_path(self, obj):
+        """Given a model object, return the local path of its blob file, or None if the storage backend isn't a local filesystem"""
+        return self.storage.path(obj.blob_filename)
+
+    def open_blob(self, obj):
+        """Given a model object, return a readable binary file object for its blob"""
+        return self.storage.open(obj.blob_filename)
+
+    def compression(self, Model):
+        """Feather compression options for blobs of the given Model, per settings.BLOB_COMPRESSION"""
+        return settings.BLOB_COMPRESSION.get(Model._meta.model_name, settings.BLOB_COMPRESSION['default'])
+
+    def precision(self, Model, precision=None):
+        """Precision encoding options for blobs of the given Model: those given, otherwise per settings.BLOB_PRECISION"""
+        if precision is not None:
+            return precision
+        return settings.BLOB_PRECISION.get(Model._meta.model_name, settings.BLOB_PRECISION['default'])
+
+    def _store(self, filename, df, Model, precision=None):
+        """Encode a DataFrame, serialize it to compressed feather and save it to storage"""
+        import pyarrow.feather as feather
+        table = encode_table(df, **self.precision(Model, precision))
+        buf = io.BytesIO()
+        feather.write_feather(table, buf, **self.compression(Model))
+        self.storage.save(filename, buf.getbuffer())
+
+    def _read_file(self, filename, columns=None):
+        """Read a stored feather file as a pyarrow Table, memory-mapping it if the storage is local"""
+        import pyarrow.feather as feather
+        filepath = self.storage.path(filename)
+        if filepath is not None:
+            return feather.read_table(filepath, columns=columns, memory_map=True)
+        with self.storage.open(filename) as f:
+            return feather.read_table(f, columns=columns)
+
+    def read_table(self, obj, columns=None):
+        """Given a model object, read its blob as a pyarrow Table, still encoded (see decode_table). Memory-maps the file if the storage is local."""
+        table = self._read_file(obj.blob_filename, columns)
+        if self.is_packed(obj):
+            table = table.slice(obj.pack_offset, obj.pack_length)
+        return table
 
     def read_blob(self, obj):
-        """Given a model object, load and return the associated DataFrame"""
-        filename = obj.blob_filename
-        filepath = os.path.join(self.staging_path, filename)
-        return pd.read_feather(filepath,)
+        """Given a model object, load and return the associated DataFrame, decoding any precision encoding"""
+        return decode_table(self.read_table(obj))
+
+    def read_blobs(self, objs):
+        """Given model objects, load their DataFrames concurrently, returning them in the same order. Each pack file is read once."""
+        objs = list(objs)
+        pool = get_io_pool()
+        pack_filenames = list({o.blob_filename for o in objs if self.is_packed(o)})
+        packs = dict(zip(pack_filenames, pool.map(self._read_file, pack_filenames)))
+
+        def read(obj):
+            if self.is_packed(obj):
+                return decode_table(packs[obj.blob_filename].slice(obj.pack_offset, obj.pack_length))
+            return self.read_blob(obj)
+        return list(pool.map(read, objs))
+
+    def iter_blobs(self, objs, prefetch=None):
+        """
+        Given model objects, yield their DataFrames in order, reading the next few ahead in the background.
+
+        Parameters:
+        -------
+        objs: iterable of Model instances
+            The objects whose blobs are read.
+        prefetch: int | None
+            Number of blobs to read ahead. Defaults to settings.BLOB_IO_THREADS.
+        """
+        prefetch = prefetch or settings.BLOB_IO_THREADS
+        pool = get_io_pool()
+        futures = deque()
+        for obj in objs:
+            futures.append(pool.submit(self.read_blob, obj))
+            if len(futures) > prefetch:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
 
-    def write_blob(self, df, Model, model_params):
+    def write_blob(self, df, Model, model_params, precision=None):
         """
         Given a DataFrame, Model class, and model instance parameters, convert and write the DataFrame to blob storage, creating a new Model entry along the way and returning it.
-        
+
         Parameters:
         -------
         df: pd.DataFrame
@@ -26,6 +127,8 @@ class BlobWrangler():
             The model class representing a table in the RDB.
         model_params: dict
             The parameters used to create and save a model instance to the table.
+        precision: dict | None
+            Opt-in lossy encoding, e.g. {'encoding': 'delta', 'tolerance': 1e-3} (see commons.encodings). Defaults to settings.BLOB_PRECISION for the Model.
 
         Returns:
         -------
@@ -38,15 +141,172 @@ class BlobWrangler():
         # save blob
         ## assume Model's primary key is a uuid object
         filename = obj.id.__str__() + '.fthr' # feather file
-        filepath = os.path.join(self.staging_path, filename)
-        df.to_feather(filepath)
+        self._store(filename, df, Model, precision)
         # add blob_filename and save obj (after blob successfully stored)
         obj.blob_filename = filename
         obj.save()
         return obj
 
+    def queue_blob(self, df, Model, model_params, precision=None):
+        """
+        Asynchronous version of write_blob: the blob is written in the background and the Model entry is only created on the next flush, in a batch.
+
+        The DataFrame must not be modified after queueing. Returns the (unsaved) model object, whose id is already assigned.
+        """
+        obj = Model(**model_params)
+        obj.blob_filename = obj.id.__str__() + '.fthr' # feather file
+        future = get_io_pool().submit(self._store, obj.blob_filename, df, Model, precision)
+        self.pending.append((obj, future))
+        return obj
+
+    def queue_entry(self, Model, model_params):
+        """Queue a Model entry without a blob (e.g. a trial answered by a landing table), to be created on the next flush with those queued by queue_blob. Returns the (unsaved) model object."""
+        obj = Model(**model_params)
+        self.pending.append((obj, None))
+        return obj
+
+    def flush(self,):
+        """
+        Wait for all queued blobs to be written, then create their Model entries with one bulk insert per Model.
+
+        Returns:
+        -------
+        objs: list of Model instances
+            The objects for the table entries just created, in the order they were queued.
+        """
+        pending, self.pending = self.pending, []
+        objs_by_model = {}
+        for obj, future in pending:
+            if future is not None:
+                future.result() # raises if the blob failed to store, before any entry is created
+            objs_by_model.setdefault(type(obj), []).append(obj)
+        for Model, objs in objs_by_model.items():
+            Model.objects.bulk_create(objs)
+        return [obj for obj, _ in pending]
+
+    def write_blobs(self, dfs, Model, list_model_params, precision=None):
+        """
+        Batch version of write_blob: write each DataFrame to blob storage concurrently, then create all the Model entries in a single bulk insert.
+
+        Parameters:
+        -------
+        dfs: list of pd.DataFrame
+            The datasets destined for blob storage.
+        Model: class
+            The model class representing a table in the RDB.
+        list_model_params: list of dict
+            The parameters used to create each model instance, in the same order as dfs.
+        precision: dict | None
+            Opt-in lossy encoding, as for write_blob.
+
+        Returns:
+        -------
+        objs: list of Model instances
+            The objects for the table entries just created.
+        """
+        for df, model_params in zip(dfs, list_model_params):
+            self.queue_blob(df, Model, model_params, precision)
+        return self.flush()
+
+    def write_array(self, obj, arr):
+        """Store an np.array as the object's blob, in .npy format so it can be memory-mapped, setting its blob_filename. The object is left for the caller to save."""
+        buf = io.BytesIO()
+        np.save(buf, arr)
+        obj.blob_filename = obj.id.__str__() + '.npy'
+        self.storage.save(obj.blob_filename, buf.getbuffer())
+
+    def read_array(self, obj):
+        """Given a model object whose blob was stored by write_array, return the np.array, memory-mapped read-only if the storage is local"""
+        filepath = self.storage.path(obj.blob_filename)
+        if filepath is not None:
+            return np.load(filepath, mmap_mode='r')
+        with self.storage.open(obj.blob_filename) as f:
+            arr = np.load(io.BytesIO(f.read()))
+        arr.flags.writeable = False
+        return arr
+
+    @staticmethod
+    def level_filename(obj, factor):
+        """Filename of a downsampled level of the object's blob. It shares the blob's stem, so BlobJanitor keeps it as long as the blob."""
+        return f'{obj.id.__str__()}.L{factor}.fthr'
+
+    def write_level(self, obj, factor, df, precision=None):
+        """Store a downsampled level of the object's blob (see winds.summaries)"""
+        self._store(self.level_filename(obj, factor), df, type(obj), precision)
+
+    def read_level(self, obj, factor):
+        """Given a model object, load and return the DataFrame of a downsampled level of its blob"""
+        return decode_table(self._read_file(self.level_filename(obj, factor)))
+
+    def pack_blobs(self, objs):
+        """
+        Compact the blobs of many objects of one Model into pack files, so storage holds a few large files instead of many tiny ones.
+
+        Each object's rows are appended to a pack and the object is updated to point at them (blob_filename, pack_offset, pack_length), then its own file is deleted. Blobs with different columns or precision encodings go to separate packs. Objects already packed, or whose blob is missing, are left alone.
+
+        Parameters:
+        -------
+        objs: list of Model instances
+            Objects of a Model with pack_offset and pack_length fields, in the order their rows are laid out.
+
+        Returns:
+        -------
+        pack_filenames: list of str
+            The pack files written.
+        """
+        import pyarrow as pa
+        import pyarrow.feather as feather
+
+        objs = [o for o in objs if o.blob_filename is not None and not self.is_packed(o)]
+        if not objs:
+            return []
+        Model = type(objs[0])
+
+        def read(obj):
+            try:
+                return self.read_table(obj)
+            except FileNotFoundError:
+                return None # dangling entry, reported by BlobJanitor.collect_garbage
+        tables = list(get_io_pool().map(read, objs))
+
+        # group by columns and precision encoding
+        groups = {}
+        for obj, table in zip(objs, tables):
+            if table is not None:
+                key = (tuple(table.column_names), (table.schema.metadata or {}).get(METADATA_KEY))
+                groups.setdefault(key, []).append((obj, table))
+
+        pack_filenames = []
+        for (column_names, encoding), group in groups.items():
+            # each column takes its widest type in the group, e.g. quantized blobs use the smallest int type holding their values
+            fields = []
+            for i, name in enumerate(column_names):
+                fields.append(pa.field(name, max((table.schema.field(i).type for _, table in group), key=lambda t: t.bit_width)))
+            schema = pa.schema(fields, metadata={METADATA_KEY: encoding} if encoding else None)
+            pack = pa.concat_tables([table.cast(schema) for _, table in group])
+
+            # write the pack first; until the entries point at it, it's an orphan the janitor can collect
+            pack_filename = uuid.uuid4().__str__() + '.pack.fthr'
+            buf = io.BytesIO()
+            feather.write_feather(pack, buf, **self.compression(Model))
+            self.storage.save(pack_filename, buf.getbuffer())
+
+            old_filenames = []
+            offset = 0
+            for obj, table in group:
+                old_filenames.append(obj.blob_filename)
+                obj.blob_filename, obj.pack_offset, obj.pack_length = pack_filename, offset, table.num_rows
+                offset += table.num_rows
+            Model.objects.bulk_update([obj for obj, _ in group], ['blob_filename', 'pack_offset', 'pack_length'])
+            for filename in old_filenames:
+                self.storage.delete(filename)
+            pack_filenames.append(pack_filename)
+        return pack_filenames
+
     def delete_blob(self, obj):
-        """Given a model object, delete the associated blob file"""
-        filename = obj.blob_filename
-        filepath = os.path.join(self.staging_path, filename)
-        os.remove(filepath)
\ No newline at end of file
+        """Given a model object, delete the associated blob file, and any downsampled levels. Objects without a blob (e.g. lazily generated wind spacetimes) are skipped. A pack file is shared, so it's left for BlobJanitor.collect_garbage to delete once no entries refer to it."""
+        if obj.blob_filename is None or self.is_packed(obj):
+            return # lazily generated, or packed
+        self.storage.delete(obj.blob_filename)
+        for factor in getattr(obj, 'pyramid_factors', None) or []:
+            self.storage.delete(self.level_filename(obj, factor))
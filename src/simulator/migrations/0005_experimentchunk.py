@@ -0,0 +1,39 @@
+# Generated by Django 4.1.3 on 2026-10-19 17:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0004_simtrial_position_final_simtrial_position_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExperimentChunk',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('num_trials', models.IntegerField()),
+                ('trials_done', models.IntegerField(default=0)),
+                ('rng_state', models.JSONField(null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='simtrial',
+            name='trial_index',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='simtrial',
+            name='chunk',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='simulator.experimentchunk'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.1.3 on 2026-10-19 17:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0005_experimentchunk'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='experimentchunk',
+            name='rng_state',
+        ),
+        migrations.AddField(
+            model_name='simexperiment',
+            name='seed',
+            field=models.BigIntegerField(null=True),
+        ),
+    ]
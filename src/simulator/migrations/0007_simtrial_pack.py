@@ -0,0 +1,23 @@
+# Generated by Django 4.1.3 on 2026-10-19 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0006_simexperiment_seed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='simtrial',
+            name='pack_length',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='simtrial',
+            name='pack_offset',
+            field=models.IntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.1.3 on 2026-10-19 17:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0007_simtrial_pack'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='simexperiment',
+            index=models.Index(fields=['windspacetime', '-created_at'], name='simulator_s_windspa_fcf2ab_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='simtrial',
+            index=models.Index(fields=['chunk', 'trial_index'], name='simulator_s_chunk_i_c5672d_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.1.3 on 2026-10-19 17:19
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+import django.db.models.deletion
+
+
+def link_trials_to_experiments(apps, schema_editor):
+    """Copy the M2M links to the new foreign key in one UPDATE, and mark existing experiments complete, as the collater only saved them once all trials had run"""
+    SimTrial = apps.get_model('simulator', 'SimTrial')
+    SimExperiment = apps.get_model('simulator', 'SimExperiment')
+    Through = SimExperiment._meta.get_field('simtrials').remote_field.through
+    SimTrial.objects.update(
+        experiment_id=Subquery(Through.objects.filter(simtrial_id=OuterRef('pk')).values('simexperiment_id')[:1]),
+    )
+    SimExperiment.objects.update(completed_at=F('modified_at'))
+
+
+def unlink_trials_from_experiments(apps, schema_editor):
+    SimTrial = apps.get_model('simulator', 'SimTrial')
+    SimExperiment = apps.get_model('simulator', 'SimExperiment')
+    Through = SimExperiment._meta.get_field('simtrials').remote_field.through
+    Through.objects.bulk_create(
+        [Through(simtrial_id=id, simexperiment_id=experiment_id) for id, experiment_id in SimTrial.objects.exclude(experiment=None).values_list('id', 'experiment_id')],
+        batch_size=10000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0008_query_indexes'),
+    ]
+
+    operations = [
+        # add the foreign key without a reverse accessor, which would clash with the M2M until it's removed
+        migrations.AddField(
+            model_name='simtrial',
+            name='experiment',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='simulator.simexperiment'),
+        ),
+        migrations.AddField(
+            model_name='simexperiment',
+            name='completed_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(link_trials_to_experiments, unlink_trials_from_experiments),
+        migrations.RemoveField(
+            model_name='simexperiment',
+            name='simtrials',
+        ),
+        migrations.AlterField(
+            model_name='simtrial',
+            name='experiment',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='simtrials', to='simulator.simexperiment'),
+        ),
+        migrations.AddIndex(
+            model_name='simtrial',
+            index=models.Index(fields=['experiment', 'trial_index'], name='simulator_s_experim_54cd6e_idx'),
+        ),
+    ]
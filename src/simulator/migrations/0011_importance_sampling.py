@@ -0,0 +1,54 @@
+# Generated by Django 4.1.3 on 2026-10-19 17:39
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0010_created_at_auto_now_add'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='simexperiment',
+            name='importance_sampling',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='simexperiment',
+            name='proposal_a',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), max_length=5, null=True, size=None),
+        ),
+        migrations.AddField(
+            model_name='simexperiment',
+            name='proposal_b',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), max_length=5, null=True, size=None),
+        ),
+        migrations.AddField(
+            model_name='simexperiment',
+            name='target_position',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), max_length=2, null=True, size=None),
+        ),
+        migrations.AddField(
+            model_name='simexperiment',
+            name='target_probability',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='simexperiment',
+            name='target_probability_se',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='simexperiment',
+            name='target_radius',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='simtrial',
+            name='likelihood_weight',
+            field=models.FloatField(null=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.1.3 on 2026-10-19 17:43
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('winds', '0005_windgenparams_spectral'),
+        ('simulator', '0011_importance_sampling'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LandingSurrogate',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('timestep', models.FloatField()),
+                ('m', models.FloatField(default=0.0456)),
+                ('drag_coef', models.FloatField(default=0)),
+                ('degree', models.IntegerField(default=3)),
+                ('num_samples', models.IntegerField()),
+                ('feature_mean', django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), max_length=4, size=None)),
+                ('feature_scale', django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), max_length=4, size=None)),
+                ('feature_min', django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), max_length=4, size=None)),
+                ('feature_max', django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), max_length=4, size=None)),
+                ('coef', django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), size=None)),
+                ('error_bound', models.FloatField()),
+                ('error_rmse', django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), max_length=2, size=None)),
+                ('experiment', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='simulator.simexperiment')),
+                ('windspacetime', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='landingsurrogates', to='winds.windspacetime')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.1.3 on 2026-10-19 17:47
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('winds', '0005_windgenparams_spectral'),
+        ('simulator', '0012_landingsurrogate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='simexperiment',
+            name='use_landing_table',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='LandingTable',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('timestep', models.FloatField()),
+                ('tee_position', django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), max_length=3, size=None)),
+                ('row_start', models.IntegerField()),
+                ('row_stop', models.IntegerField()),
+                ('vz_min', models.FloatField()),
+                ('vz_max', models.FloatField()),
+                ('num_vz', models.IntegerField()),
+                ('max_error', models.FloatField(null=True)),
+                ('num_validated', models.IntegerField(null=True)),
+                ('blob_filename', models.CharField(max_length=50, null=True)),
+                ('windspacetime', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='landingtables', to='winds.windspacetime')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='landingtable',
+            index=models.Index(fields=['windspacetime', 'timestep', '-created_at'], name='simulator_l_windspa_b8da15_idx'),
+        ),
+    ]
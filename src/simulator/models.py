@@ -67,21 +67,114 @@ class BaseParams(models.Model):
     class Meta:
         abstract = True
 
+class ExperimentChunk(Timestamped):
+    """Checkpoint of one ExperimentRunner chunk, so a retried chunk resumes where it left off instead of from trial 0"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    num_trials = models.IntegerField()
+    trials_done = models.IntegerField(default=0) # the chunk's first trials_done trials are persisted
+
 class SimTrial(BaseParams, Timestamped):
     """Single ball trajectory"""
+    experiment = models.ForeignKey('SimExperiment', on_delete=models.CASCADE, null=True, related_name='simtrials') # assigned when the trial is created by an experiment's chunk
+    chunk = models.ForeignKey(ExperimentChunk, on_delete=models.SET_NULL, null=True)
+    trial_index = models.IntegerField(null=True) # index within the experiment, keys the trial's random stream
     time_initial = models.FloatField()
     direction_initial = ArrayField(models.FloatField(), max_length=3) # unit vector
     speed_initial = models.FloatField()
     position_initial = ArrayField(models.FloatField(), max_length=3)
     position_final = ArrayField(models.FloatField(), max_length=3)
+    likelihood_weight = models.FloatField(null=True) # nominal/proposal density of the trial's samples, when importance sampling; o.w. null, i.e. 1
 
     blob_filename = models.CharField(max_length=50, null=True)
+    # once compacted, the trajectory is rows [pack_offset, pack_offset + pack_length) of a pack file shared by the experiment's trials
+    pack_offset = models.IntegerField(null=True)
+    pack_length = models.IntegerField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['experiment', 'trial_index']), # an experiment's trials in order
+            models.Index(fields=['chunk', 'trial_index']), # a chunk's trials in order, when resuming from a checkpoint
+        ]
+
+    @classmethod
+    def blob_pack_groups(cls):
+        """For BlobJanitor.compact: yield the unpacked trials of each completed experiment, in trial order"""
+        qs = cls.objects.filter(experiment__completed_at__isnull=False, pack_offset__isnull=True, blob_filename__isnull=False)
+        for experiment_id in qs.values_list('experiment_id', flat=True).distinct():
+            yield qs.filter(experiment_id=experiment_id).order_by('trial_index')
 
 class SimExperiment(BaseParams, Timestamped):
     """Collection of SimTrials for single parameter set"""
     is_control = models.BooleanField(default=False) # control will probably be uniform distribution (no target locality within timing, speed, or direction)
     num_trials = models.IntegerField(null=True)
-    simtrials = models.ManyToManyField(SimTrial)
+    seed = models.BigIntegerField(null=True) # entropy for the experiment's SeedSequence; trial n draws from its n-th spawned child
+    completed_at = models.DateTimeField(null=True) # set once all chunks have run; the experiment's trials are its simtrials
+
+    # target region on the ground plane, a disk; the experiment estimates the probability of landing in it
+    target_position = ArrayField(models.FloatField(), max_length=2, null=True) # [x,y]
+    target_radius = models.FloatField(null=True)
+    target_probability = models.FloatField(null=True) # set on completion
+    target_probability_se = models.FloatField(null=True) # standard error
+    # importance sampling: trials sample from a proposal fitted toward the target by cross-entropy iterations, each a Beta(a, b) per uniform random number [timing, aiming x1, x2, x3, speed]
+    importance_sampling = models.BooleanField(default=False)
+    proposal_a = ArrayField(models.FloatField(), max_length=5, null=True)
+    proposal_b = ArrayField(models.FloatField(), max_length=5, null=True)
+    # answer trials from a precomputed LandingTable where it covers them, storing no trajectories for those
+    use_landing_table = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['windspacetime', '-created_at']), # latest experiments on a wind spacetime
+        ]
+
+class LandingSurrogate(Timestamped):
+    """Polynomial fit of landing (x, y) to launch time and initial velocity, on one wind spacetime, for what-if queries without simulating (see simulation.surrogates)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    windspacetime = models.ForeignKey(WindSpacetime, on_delete=models.CASCADE, related_name='landingsurrogates')
+    experiment = models.ForeignKey(SimExperiment, on_delete=models.SET_NULL, null=True) # trained on its trials; o.w. on a training sweep, or all trials on the wind spacetime
+
+    # physics, as simulated by the training trials
+    timestep = models.FloatField()
+    m = models.FloatField(default=.0456)
+    drag_coef = models.FloatField(default=0)
+
+    # fit
+    degree = models.IntegerField(default=3)
+    num_samples = models.IntegerField() # landed trials fitted on
+    feature_mean = ArrayField(models.FloatField(), max_length=4) # standardization of [time_initial, vx, vy, vz]
+    feature_scale = ArrayField(models.FloatField(), max_length=4)
+    feature_min = ArrayField(models.FloatField(), max_length=4) # training domain; queries outside it are extrapolated
+    feature_max = ArrayField(models.FloatField(), max_length=4)
+    coef = ArrayField(models.FloatField()) # shape=(num_monomials, 2), flattened
+
+    # cross-validated error (m)
+    error_bound = models.FloatField() # 95th percentile of landing position error
+    error_rmse = ArrayField(models.FloatField(), max_length=2) # [x,y]
+
+class LandingTable(Timestamped):
+    """Landing positions of drag-free launches on one wind spacetime, tabulated over launch row and vertical launch velocity, so experiments can look trials up instead of simulating them (see simulation.lookups)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    windspacetime = models.ForeignKey(WindSpacetime, on_delete=models.CASCADE, related_name='landingtables')
+    timestep = models.FloatField() # of the experiments it answers
+    tee_position = ArrayField(models.FloatField(), max_length=3) # launch position [x,y,z]
+
+    # coverage
+    row_start = models.IntegerField() # launch rows [row_start, row_stop)
+    row_stop = models.IntegerField()
+    vz_min = models.FloatField() # vertical launch velocities (m/s), num_vz evenly spaced nodes over [vz_min, vz_max]
+    vz_max = models.FloatField()
+    num_vz = models.IntegerField()
+
+    # validation against the exact solver
+    max_error = models.FloatField(null=True) # largest landing position error (m) over the sampled launches
+    num_validated = models.IntegerField(null=True)
+
+    blob_filename = models.CharField(max_length=50, null=True) # .npy, shape=(row_stop-row_start, num_vz, 3)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['windspacetime', 'timestep', '-created_at']), # latest table for an experiment
+        ]
 
 # field_names = [f.__str__() for f in BaseParams._meta.get_fields()]
 class DesignOfExperiments(Timestamped):
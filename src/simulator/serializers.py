@@ -1,8 +1,27 @@
 from rest_framework.serializers import ModelSerializer
 
-from .models import SimExperiment
+from .models import SimExperiment, SimTrial, LandingSurrogate, LandingTable
 
 class SimExperimentSerializer(ModelSerializer):
     class Meta:
         model = SimExperiment
-        exclude = ['simtrials']
\ No newline at end of file
+        fields = '__all__'
+        read_only_fields = ['completed_at', 'target_probability', 'target_probability_se']
+
+class SimTrialSerializer(ModelSerializer):
+    class Meta:
+        model = SimTrial
+        exclude = ['blob_filename', 'pack_offset', 'pack_length'] # storage details; see the download endpoint
+
+class LandingSurrogateSerializer(ModelSerializer):
+    class Meta:
+        model = LandingSurrogate
+        fields = '__all__'
+        read_only_fields = ['num_samples', 'feature_mean', 'feature_scale', 'feature_min', 'feature_max', 'coef', 'error_bound', 'error_rmse'] # set by the fit
+
+class LandingTableSerializer(ModelSerializer):
+    class Meta:
+        model = LandingTable
+        exclude = ['blob_filename'] # storage detail
+        read_only_fields = ['tee_position', 'max_error', 'num_validated'] # set by the build
+        extra_kwargs = {f: {'required': False} for f in ['row_start', 'row_stop', 'vz_min', 'vz_max', 'num_vz']} # see build_landing_table for defaults
@@ -0,0 +1,158 @@
+"""Executors which run an experiment's chunks in parallel without Celery"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# N.B. Django models (and so the scientists) are imported where used: with the spawn start method, pool children import this module before Django is set up.
+
+# per-process state of pool children, set by _init_worker
+_worker = {}
+
+def _init_worker(shm_name, shape, dtype, sim_params, broadcast_shape=None, plan=None):
+    """Attach to the shared wind array and build this process' ExperimentRunner from the experiment's plan, as validated in the parent. A constant wind is shared as its one row, then broadcast back to broadcast_shape."""
+    import django
+    from django.apps import apps
+    if not apps.ready: # spawned, rather than forked, children start without Django
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'windy_golfing.settings')
+        django.setup()
+    from .scientists import ExperimentRunner
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    arr_windspacetime = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    arr_windspacetime.flags.writeable = False
+    if broadcast_shape is not None:
+        arr_windspacetime = np.broadcast_to(arr_windspacetime, broadcast_shape)
+    _worker['shm'] = shm # keep the buffer alive as long as the process
+    _worker['runner'] = ExperimentRunner(sim_params, arr_windspacetime=arr_windspacetime, plan=plan)
+
+def _simulate_chunk(trial_start, num_trials):
+    """Simulate a chunk of trials in a pool child, returning the simulated trials"""
+    runner = _worker['runner']
+    return [runner.simulate_trial(trial_index) for trial_index in range(trial_start, trial_start+num_trials)]
+
+class LocalExperimentExecutor:
+    """Runs an experiment across local CPU cores with a process pool, sharing the wind array between processes via shared memory. Mirrors the Celery workflow (chunk, simulate, collate) without needing a broker."""
+    def __init__(self, max_workers=None, mp_context=None):
+        """
+        Parameters:
+        -------
+        max_workers: int | None
+            Number of processes to use. Defaults to the number of CPUs.
+        mp_context: multiprocessing context | None
+            Start method context for the pool, e.g. multiprocessing.get_context('spawn'). Defaults to the platform's.
+        """
+        self.max_workers = max_workers or os.cpu_count()
+        self.mp_context = mp_context
+
+    def submit(self, sim_params, num_chunks=1, progress_callback=None):
+        """
+        Run an experiment locally, as submit_experiment runs it on the Celery cluster, and wait for it to complete.
+
+        Parameters:
+        -------
+        sim_params: dict
+            Experiment parameters, as ExperimentRunner takes them. A seed is drawn if none is given.
+        num_chunks: int
+            Number of chunks to split the trials into, for parallelization, from 1 to num_trials.
+        progress_callback: callable | None
+            Called periodically with a progress snapshot dict (see ProgressTracker.snapshot).
+
+        Returns:
+        -------
+        payload: dict
+            The experiment id and seed, once the experiment is saved.
+
+        Raises AssertionError or ValueError, before anything is created or run, if the parameters are missing or invalid (see ExperimentPlan.from_params).
+        """
+        from .plans import ExperimentPlan
+        from .scientists import ExperimentRunner
+        plan = ExperimentPlan.from_params(sim_params)
+        sim_params = {**sim_params, 'seed': plan.seed}
+        num_chunks = ExperimentRunner.check_num_chunks(num_chunks, sim_params['num_trials'])
+        simexperiment_obj = self.run_experiment(sim_params, num_chunks=num_chunks, progress_callback=progress_callback)
+        return {
+            'accepted': True,
+            'experiment_id': simexperiment_obj.id.__str__(),
+            'seed': simexperiment_obj.seed,
+        }
+
+    def run_experiment(self, sim_params, num_chunks=None, progress_callback=None):
+        """
+        Run the experiment, then persist all its trials in one batch and save the SimExperiment.
+
+        Parameters:
+        -------
+        sim_params: dict
+            The experiment parameters, as accepted by ExperimentRunner. Given the same 'seed', results are bit-identical to the Celery workflow.
+        num_chunks: int | None
+            Number of chunks to split the trials into. Defaults to 4 per worker, to balance load.
+        progress_callback: callable | None
+            Called periodically with a progress snapshot dict (see ProgressTracker.snapshot).
+
+        Returns:
+        -------
+        simexperiment_obj: SimExperiment
+            The saved experiment.
+        """
+        from django.db import connections
+        from .scientists import ExperimentRunner, ExperimentCollater
+        from .progress import ProgressTracker
+
+        # validate the parameters into a plan, and resolve the seed and wind, once, in this process
+        runner = ExperimentRunner(sim_params)
+        sim_params = {**sim_params, 'seed': runner.seed}
+        if runner.importance_sampling and runner.proposal is None:
+            # fit the proposal once, here, rather than in every worker
+            a, b = runner.fit_proposal()
+            sim_params = {**sim_params, 'proposal_a': a.tolist(), 'proposal_b': b.tolist()}
+        # create the experiment up front, so its trials are linked to it as they're saved
+        simexperiment_obj = ExperimentCollater.create_experiment(sim_params)
+        runner.experiment_id = simexperiment_obj.id.__str__()
+        N = sim_params['num_trials']
+        num_chunks = num_chunks or 4*self.max_workers
+        chunks = ExperimentRunner.split_trials(N, num_chunks)
+
+        progress = ProgressTracker(
+            N,
+            publish=progress_callback,
+            publish_interval=sim_params.get('progress_interval', 1.0),
+            target=runner.target,
+        )
+
+        # share the wind array with the pool; a constant wind (a broadcast view of one row) only needs that row
+        arr = runner.arr_windspacetime
+        broadcast_shape = None
+        if arr.ndim == 2 and arr.strides[0] == 0:
+            broadcast_shape = arr.shape
+            arr = arr[:1]
+        arr = np.ascontiguousarray(arr)
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        try:
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+            connections.close_all() # don't let forked children inherit the db connection
+
+            chunked_trials = {}
+            with ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=self.mp_context,
+                initializer=_init_worker,
+                initargs=(shm.name, arr.shape, arr.dtype.str, {**sim_params, 'verbosity': 0}, broadcast_shape, runner.plan),
+            ) as pool:
+                futures = {pool.submit(_simulate_chunk, trial_start, n): trial_start for trial_start, n in chunks}
+                for future in as_completed(futures):
+                    trials = future.result()
+                    chunked_trials[futures[future]] = trials
+                    for trial in trials:
+                        progress.update(trial['position_final'], trial['likelihood_weight'])
+        finally:
+            shm.close()
+            shm.unlink()
+
+        # persist in one batch, in trial order
+        trials = [trial for trial_start, _ in chunks for trial in chunked_trials[trial_start]]
+        runner.save_trials(trials)
+        collater = ExperimentCollater(runner.experiment_id, [progress.snapshot()])
+        return collater.save_experiment()
@@ -0,0 +1,193 @@
+"""Precomputed landing lookup tables, answering trials on a popular wind spacetime without simulating them"""
+from functools import lru_cache
+
+import numpy as np
+
+from django.conf import settings
+
+from .sim import SimTrialRunner
+from simulator.models import LandingTable
+from commons.wranglers import BlobWrangler
+from winds.caches import get_wind_array
+
+def tabulate_landings(arr_windspacetime, timestep, p_initial, rows, vz_nodes, g=9.81):
+    """
+    Tabulate where balls launched without drag land, over launch rows and vertical launch velocities.
+
+    Without drag, the landing step depends only on the launch row and vertical velocity vz, and the horizontal velocity enters the landing position linearly:
+        x_final = x_initial + T*vx + C_x
+    where T is the flight time, interpolated to z=0 as SimTrialRunner.run does, and C_x the drift of the wind relative to the launch row over the flight. So the table is exact at its nodes, for any direction and speed.
+
+    Parameters:
+    -------
+    arr_windspacetime: np.array
+        The wind velocity data, shape=(T, 3).
+    timestep: float
+        Time between rows, in seconds.
+    p_initial: np.array
+        The launch position.
+    rows: np.array
+        Launch rows, i.e. SimTrialRunner's t_initial.
+    vz_nodes: np.array
+        Vertical launch velocities (m/s), ascending.
+    g: float
+        As for SimTrialRunner.
+
+    Returns:
+    -------
+    table: np.array
+        [T, C_x, C_y] per launch row and vz node, shape=(len(rows), len(vz_nodes), 3). NaN where the ball doesn't land before the wind runs out.
+    """
+    W = np.asarray(arr_windspacetime, dtype=np.float64)
+    dt = timestep
+    vz = np.asarray(vz_nodes, dtype=np.float64)
+    cw = np.concatenate([np.zeros((1, 3)), np.cumsum(W, axis=0)]) # cw[i] = sum of wind rows before i
+    table = np.full((len(rows), vz.shape[0], 3), np.nan)
+
+    # rows to landing without vertical wind at the fastest vz, as SimTrialRunner.landing_horizon
+    A = g*dt**2/2
+    b = dt*vz.max() + A
+    horizon = int(np.ceil((b + np.sqrt(max(b**2 + 4*A*p_initial[2], 0)))/(2*A))) + 3
+
+    for i, t0 in enumerate(rows):
+        max_n = W.shape[0] - 1 - t0 # the simulation steps while t < T
+        if max_n < 1:
+            continue
+        H = min(horizon, max_n)
+        while True:
+            # z after n steps, for n in [1, H]: the velocity changes by the change in wind plus gravity each step
+            n = np.arange(1, H+1)
+            z = p_initial[2] + dt*(n*(vz[:,None] - W[t0,2]) + (cw[t0+n,2] - cw[t0,2])) - g*dt**2*n*(n-1)/2
+            landed = z <= 0
+            if landed.any(axis=1).all() or H == max_n:
+                break
+            H = min(2*H, max_n) # vertical wind held some balls up
+
+        hit = landed.any(axis=1)
+        n_hit = landed.argmax(axis=1) + 1 # first step at or below ground
+        z2 = z[np.arange(vz.shape[0]), n_hit-1]
+        z1 = np.where(n_hit > 1, z[np.arange(vz.shape[0]), np.maximum(n_hit-2, 0)], p_initial[2])
+        with np.errstate(divide='ignore', invalid='ignore'): # where the ball didn't land, masked below
+            s = z1/(z1-z2)
+            T = dt*(n_hit-1+s)
+            for k in range(2):
+                # drift over the full steps then the fraction s of the last, relative to the launch row's wind
+                C = dt*(cw[t0+n_hit-1,k] - cw[t0,k] + s*W[t0+n_hit-1,k]) - T*W[t0,k]
+                table[i,:,k+1] = np.where(hit, C, np.nan)
+        table[i,:,0] = np.where(hit, T, np.nan)
+    return table
+
+class LandingLookup:
+    """A landing table, answering landings by linear interpolation over vertical launch velocity (see tabulate_landings)"""
+    def __init__(self, table, row_start, vz_min, vz_max, p_initial):
+        """
+        Parameters:
+        -------
+        table: np.array
+            As returned by tabulate_landings, e.g. memory-mapped, shape=(R, V, 3).
+        row_start: int
+            The launch row of the table's first row.
+        vz_min, vz_max: float
+            The first and last vz nodes, evenly spaced.
+        p_initial: np.array
+            The launch position.
+        """
+        self.table = table
+        self.row_start = row_start
+        self.vz_min = vz_min
+        self.vz_max = vz_max
+        self.p_initial = np.asarray(p_initial, dtype=np.float64)
+
+    def landing(self, t_initial, v_initial):
+        """Landing position [x, y, 0] of a ball launched at row t_initial with velocity v_initial, or None if the table doesn't cover it"""
+        i = t_initial - self.row_start
+        R, V, _ = self.table.shape
+        f = (v_initial[2] - self.vz_min)/(self.vz_max - self.vz_min)*(V-1)
+        if not (0 <= i < R and 0 <= f <= V-1):
+            return None
+        j = min(int(f), V-2)
+        a = f - j
+        T, Cx, Cy = (1-a)*self.table[i,j] + a*self.table[i,j+1]
+        if np.isnan(T):
+            return None
+        return np.array([self.p_initial[0] + T*v_initial[0] + Cx, self.p_initial[1] + T*v_initial[1] + Cy, 0.])
+
+def validate_landings(lookup, arr_windspacetime, timestep, num_samples, g=9.81, seed=0):
+    """
+    Compare a lookup against the exact solver on a sample of launches spread over its coverage, with directions and speeds to match its vz range.
+
+    Returns:
+    -------
+    max_error: float | None
+        The largest landing position error (m) over the sample, or None if no sampled ball landed.
+    num_validated: int
+        The number of sampled launches the lookup answered.
+    """
+    rng = np.random.default_rng(seed)
+    R = lookup.table.shape[0]
+    vh_max = max(abs(lookup.vz_min), abs(lookup.vz_max))
+    errors = []
+    for _ in range(num_samples):
+        t_initial = lookup.row_start + int(rng.integers(R))
+        v_initial = np.array([*rng.uniform(-vh_max, vh_max, 2), rng.uniform(lookup.vz_min, lookup.vz_max)])
+        p_final = lookup.landing(t_initial, v_initial)
+        if p_final is None:
+            continue
+        runner = SimTrialRunner(t_initial, lookup.p_initial, v_initial, arr_windspacetime, timestep, g=g, verbosity=0)
+        runner.run()
+        errors.append(np.linalg.norm(p_final[:2] - runner.p_final[:2]))
+    return (float(np.max(errors)) if errors else None), len(errors)
+
+def build_landing_table(windspacetime_id, timestep, p_initial, row_start=0, row_stop=None, vz_min=-20., vz_max=40., num_vz=241, num_validation=200):
+    """
+    Tabulate landings on a wind spacetime at an experiment timestep, validate the table against the exact solver, and store it as a memory-mappable .npy blob.
+
+    Parameters:
+    -------
+    windspacetime_id: str | uuid
+    timestep: float
+        The experiment timestep the table answers.
+    p_initial: np.array
+        The launch position, i.e. ExperimentRunner.tee_position.
+    row_start, row_stop: int
+        The launch rows covered, [row_start, row_stop). Defaults to every row.
+    vz_min, vz_max, num_vz: float, float, int
+        The vertical launch velocities covered (m/s), and the number of evenly spaced nodes over them.
+    num_validation: int
+        The number of launches validated against the exact solver.
+
+    Returns:
+    -------
+    obj: LandingTable
+        The table entry just created.
+    """
+    arr = get_wind_array(windspacetime_id, timestep=timestep)
+    row_stop = arr.shape[0] if row_stop is None else min(row_stop, arr.shape[0])
+    table = tabulate_landings(arr, timestep, np.asarray(p_initial, dtype=np.float64), np.arange(row_start, row_stop), np.linspace(vz_min, vz_max, num_vz))
+    max_error, num_validated = validate_landings(LandingLookup(table, row_start, vz_min, vz_max, p_initial), arr, timestep, num_validation)
+
+    obj = LandingTable(
+        windspacetime_id=windspacetime_id, timestep=timestep, tee_position=[float(x) for x in p_initial],
+        row_start=row_start, row_stop=row_stop, vz_min=vz_min, vz_max=vz_max, num_vz=num_vz,
+        max_error=max_error, num_validated=num_validated,
+    )
+    BlobWrangler().write_array(obj, table)
+    obj.save()
+    return obj
+
+def find_landing_table(windspacetime_id, timestep, p_initial, tolerance=None):
+    """The newest LandingTable for a wind spacetime, timestep and launch position whose validation error is within tolerance (m, default settings.LANDING_TABLE_TOLERANCE), or None"""
+    tolerance = settings.LANDING_TABLE_TOLERANCE if tolerance is None else tolerance
+    qs = LandingTable.objects.filter(
+        windspacetime_id=windspacetime_id, timestep=timestep, tee_position=[float(x) for x in p_initial], max_error__lte=tolerance,
+    )
+    return qs.order_by('-created_at').values_list('id', flat=True).first()
+
+def get_landing_lookup(landing_table_id):
+    """Given a LandingTable id, return its LandingLookup, memory-mapping the table on first use if the storage is local"""
+    return _get_landing_lookup(landing_table_id.__str__())
+
+@lru_cache(maxsize=settings.WIND_CACHE_SIZE)
+def _get_landing_lookup(landing_table_id):
+    o = LandingTable.objects.get(pk=landing_table_id)
+    return LandingLookup(BlobWrangler().read_array(o), o.row_start, o.vz_min, o.vz_max, o.tee_position)
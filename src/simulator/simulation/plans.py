@@ -0,0 +1,203 @@
+"""Experiment plans: parameters validated and resolved once, then shared by every chunk and trial of an experiment"""
+import secrets
+from dataclasses import dataclass
+from typing import Any, ClassVar, FrozenSet, Optional, Tuple
+
+import numpy as np
+
+from .probabilities import ProbGen, UniformProbGen, NormalProbGen, LogNormalProbGen
+from .geometries import EulerAnglesGeometry, SphericalGeometry, CylindricalGeometry
+
+# N.B. Django models are imported where used, so a plan can be unpickled by a spawned pool child before it sets Django up (see executors).
+
+@dataclass(frozen=True)
+class ExperimentPlan:
+    """
+    An experiment's parameters, validated, with the probability generators and aiming geometry they name resolved. Immutable, so it can be shared across trials, chunks and runners without state leaking between them, and picklable, so it's cheap to send to workers.
+
+    Build with from_params. It holds nothing chunk-specific (num_trials, trial_start), so one plan serves every chunk of an experiment. The wind isn't held, just its handle (see wind), since workers share cached or shared-memory arrays.
+    """
+    required_keys: ClassVar[Tuple[str, ...]] = (
+        'windspacetime_id',
+        'num_trials',
+        'prob_speed_fn_name',
+        'prob_speed_max',
+        'prob_speed_center',
+        'prob_speed_spread',
+        'prob_timing_fn_name',
+        'prob_timing_max',
+        'prob_timing_center',
+        'prob_timing_spread',
+        'prob_aiming_fn_name',
+        'prob_aiming_geometry',
+        'prob_aiming_X1_min',
+        'prob_aiming_X1_max',
+        'prob_aiming_X1_center',
+        'prob_aiming_X1_spread',
+        'prob_aiming_X2_min',
+        'prob_aiming_X2_max',
+        'prob_aiming_X2_center',
+        'prob_aiming_X2_spread',
+        'prob_aiming_X3_min',
+        'prob_aiming_X3_max',
+        'prob_aiming_X3_center',
+        'prob_aiming_X3_spread',
+        'timestep',
+    )
+    ProbGens: ClassVar[dict] = { # probability function generators, keyed by function name
+        'Uniform': UniformProbGen,
+        'Normal': NormalProbGen,
+        'Log-normal': LogNormalProbGen,
+    }
+    Geometries: ClassVar[dict] = { # geometry classes, keyed by geometry name
+        'EulerAngles': EulerAnglesGeometry,
+        'Spherical': SphericalGeometry,
+        'Cylindrical': CylindricalGeometry,
+    }
+
+    windspacetime_id: Optional[str]
+    timestep: float
+    seed: int
+    prob_timing: ProbGen
+    prob_aiming: Tuple[ProbGen, ProbGen, ProbGen] # x1, x2, x3
+    prob_speed: ProbGen
+    geometry: type
+    m: float = .0456
+    drag_coef: float = 0.
+    tee_position: Tuple[float, float, float] = (0., 0., 10.)
+    simtrial_fields: Tuple[Tuple[str, Any], ...] = () # (name, value) of the parameters every SimTrial of the experiment stores
+    trial_field_names: FrozenSet[str] = frozenset() # SimTrial fields a simulated trial may set
+
+    @classmethod
+    def from_params(cls, params):
+        """
+        Validate experiment parameters, as ExperimentRunner takes them, and build their plan. A seed is drawn if none is given.
+
+        Raises AssertionError if required parameters are missing, or ValueError if any are invalid.
+        """
+        missing = [k for k in cls.required_keys if k not in params]
+        if missing:
+            raise AssertionError(f'Required params are missing: {missing}')
+
+        timestep = float(params['timestep'])
+        if not timestep > 0:
+            raise ValueError(f'timestep must be positive, got {timestep}.')
+        num_trials = params['num_trials']
+        if num_trials is None or int(num_trials) != num_trials or num_trials < 0:
+            raise ValueError(f'num_trials must be a non-negative integer, got {num_trials}.')
+        m = params.get('m')
+        m = .0456 if m is None else m
+        if not m > 0:
+            raise ValueError(f'm must be positive, got {m}.')
+
+        cls.check_target(params)
+
+        geometry = cls.Geometries.get(params['prob_aiming_geometry'])
+        if geometry is None or not hasattr(geometry, 'get_unit_vector'):
+            raise ValueError(f"prob_aiming_geometry must be one of {[k for k, G in cls.Geometries.items() if hasattr(G, 'get_unit_vector')]}, got {params['prob_aiming_geometry']!r}.")
+
+        from simulator.models import SimTrial
+        from commons.utilities import trim_dict, list_model_fields
+        seed = params.get('seed')
+        windspacetime_id = params['windspacetime_id']
+        simtrial_field_names = list_model_fields(SimTrial)
+        return cls(
+            windspacetime_id=windspacetime_id.__str__() if windspacetime_id is not None else None,
+            timestep=timestep,
+            seed=seed if seed is not None else secrets.randbits(63),
+            prob_timing=cls.prob_gen(params, 'prob_timing', params['prob_timing_fn_name']),
+            prob_aiming=tuple(cls.prob_gen(params, f'prob_aiming_X{i}', params['prob_aiming_fn_name']) for i in (1, 2, 3)),
+            prob_speed=cls.prob_gen(params, 'prob_speed', params['prob_speed_fn_name']),
+            geometry=geometry,
+            m=m,
+            drag_coef=0. if params.get('drag_coef') is None else params['drag_coef'],
+            simtrial_fields=tuple(trim_dict(params, simtrial_field_names).items()),
+            trial_field_names=frozenset(simtrial_field_names),
+        )
+
+    @staticmethod
+    def check_target(params):
+        """Raise ValueError unless the target, and the importance sampling options if enabled, are valid (see ExperimentRunner)"""
+        position, radius = params.get('target_position'), params.get('target_radius')
+        if position is not None and len(position) != 2:
+            raise ValueError(f'target_position must be [x, y], got {position!r}.')
+        if radius is not None and not radius > 0:
+            raise ValueError(f'target_radius must be positive, got {radius!r}.')
+        if not params.get('importance_sampling'):
+            return
+        if position is None or radius is None:
+            raise ValueError('Importance sampling requires target_position and target_radius.')
+        defensive_fraction, elite_fraction = params.get('defensive_fraction'), params.get('ce_elite_fraction')
+        if defensive_fraction is not None and not 0 <= defensive_fraction < 1:
+            raise ValueError(f'defensive_fraction must be in [0, 1), got {defensive_fraction!r}.')
+        if elite_fraction is not None and not 0 < elite_fraction < 1:
+            raise ValueError(f'ce_elite_fraction must be in (0, 1), got {elite_fraction!r}.')
+        for key in ['ce_trials', 'ce_max_iterations']:
+            value = params.get(key)
+            if value is not None and (type(value) is not int or value < 1):
+                raise ValueError(f'{key} must be a positive integer, got {value!r}.')
+
+    @classmethod
+    def prob_gen(cls, params, prefix, fn_name):
+        """Validate the parameters of a probability function, e.g. prefix='prob_speed', and build its generator"""
+        ProbGen = cls.ProbGens.get(fn_name)
+        if ProbGen is None:
+            raise ValueError(f'{prefix}_fn_name must be one of {list(cls.ProbGens)}, got {fn_name!r}.')
+        x_min, x_max, x_center, x_spread = (params.get(f'{prefix}_{k}') for k in ('min', 'max', 'center', 'spread'))
+        if ProbGen is UniformProbGen:
+            if x_max is None or x_max < (x_min or 0):
+                raise ValueError(f'{prefix}_max is required, and at least {prefix}_min.')
+        else:
+            if x_center is None or x_spread is None or x_spread <= 0:
+                raise ValueError(f'{prefix}_center and a positive {prefix}_spread are required by a {fn_name} distribution.')
+            if ProbGen is LogNormalProbGen and x_center <= 0:
+                raise ValueError(f'{prefix}_center must be positive for a Log-normal distribution.')
+            if x_min is not None and x_max is not None and x_max <= x_min:
+                raise ValueError(f'{prefix}_max must exceed {prefix}_min.')
+        return ProbGen(x_min=x_min, x_max=x_max, x_center=x_center, x_spread=x_spread)
+
+    def simulation_params(self,):
+        """Names of the parameters that reach the simulation, e.g. to perturb (see ExperimentRunner.run_sensitivity): the drag, the mass if there's drag (o.w. it cancels out), and those read by each distribution in use"""
+        names = {'m', 'drag_coef'} if self.drag_coef else {'drag_coef'}
+        aiming = [f'prob_aiming_X{i}' for i in (1, 2, 3)]
+        if self.geometry is SphericalGeometry:
+            aiming = aiming[:2] # the radius is throwaway
+        prefixes = dict(zip(['prob_timing', 'prob_speed', *aiming], [self.prob_timing, self.prob_speed, *self.prob_aiming]))
+        for prefix, prob in prefixes.items():
+            keys = ['min', 'max'] if isinstance(prob, UniformProbGen) else ['min', 'max', 'center', 'spread']
+            names.update(f'{prefix}_{k}' for k in keys)
+        return names
+
+    def wind(self,):
+        """The wind velocity data at the experiment's timestep, shape=(T, 3), from the per-process cache (see winds.caches)"""
+        from winds.caches import get_wind_array
+        return get_wind_array(self.windspacetime_id, timestep=self.timestep)
+
+    def sample_launch(self, u):
+        """
+        Map a trial's uniform random numbers [timing, aiming x1, x2, x3, speed] to its launch.
+
+        Returns:
+        -------
+        time_initial: float
+            In seconds.
+        t_initial: int
+            time_initial as the nearest row of the wind.
+        v_hat: np.array
+            The unit launch direction.
+        speed_initial: float
+            In m/s.
+        """
+        time_initial = self.prob_timing.inv(u[0])
+        t_initial = int(np.round(time_initial/self.timestep)) # t denotes an int
+        ## N.B. third coordinate is used in euler angles but is throwaway in spherical geometry.
+        x1, x2, x3 = (prob.inv(r) for prob, r in zip(self.prob_aiming, u[1:4]))
+        v_hat = self.geometry(x1, x2, x3).get_unit_vector()
+        speed_initial = self.prob_speed.inv(u[4])
+        return time_initial, t_initial, v_hat, speed_initial
+
+    def simtrial_params(self, trial):
+        """The fields of a simulated trial's SimTrial: the experiment's, updated with the trial's own"""
+        params_simtrial = dict(self.simtrial_fields)
+        params_simtrial.update((k, v) for k, v in trial.items() if k in self.trial_field_names)
+        return params_simtrial
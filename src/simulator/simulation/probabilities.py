@@ -1,8 +1,22 @@
 """Probability function generators used by SimTrialRunner"""
+import math
+from statistics import NormalDist
 
 class ProbGen:
-    """Base class for probability function generators"""
-    pass
+    """Base class for probability function generators. Subclasses implement pdf(x) and its sampler inv(r); both are methods, so a ProbGen and the functions it generates can be pickled (e.g. to workers, in an ExperimentPlan)."""
+    def pdf(self, x):
+        raise NotImplementedError
+
+    def inv(self, r):
+        raise NotImplementedError
+
+    def generate_fn(self):
+        """Generate a normalized probability density function (pdf)"""
+        return self.pdf
+
+    def generate_inv_fn(self):
+        """Generate the inversion of the pdf, sampling it from a uniform random number"""
+        return self.inv
 
 class UniformProbGen(ProbGen):
     """Generate Uniform probability functions"""
@@ -10,31 +24,59 @@ class UniformProbGen(ProbGen):
         self.x_min = x_min if x_min else 0
         self.x_max = x_max
 
-    def generate_fn(self):
-        """Generate a normalized probability density function (pdf)"""
-        def pdf(x):
-            if x < self.x_min:
-                return 0
-            elif x > self.x_max:
-                return 0
-            else:
-                return 1/(self.x_max-self.x_min)
-        return pdf
+    def pdf(self, x):
+        """Normalized probability density function"""
+        if x < self.x_min:
+            return 0
+        elif x > self.x_max:
+            return 0
+        else:
+            return 1/(self.x_max-self.x_min)
 
-    def generate_inv_fn(self):
-        """Generate the inversion of the pdf"""
+    def inv(self, r):
+        """Given a random number, r, in (0,1], return a value, x, sampled by the pdf"""
         # This case is easy. The function should be a line passing through the two points:
         #  p1: (0,x_min)
         #  p2: (1,x_max)
-        def inv(r):
-            """Given a random number, r, in (0,1], return a value, x, sampled by the pdf"""
-            return self.x_min + (self.x_max-self.x_min)*r  # y = mx + b
-        return inv
+        return self.x_min + (self.x_max-self.x_min)*r  # y = mx + b
 
 class NormalProbGen(ProbGen):
-    """Generate Normal probabilibty functions"""
-    pass
+    """Generate Normal probabilibty functions, with mean x_center and standard deviation x_spread, truncated to [x_min, x_max] where given"""
+    def __init__(self, x_min=None, x_max=None, x_center=None, x_spread=None, **kwargs):
+        self.x_min = x_min
+        self.x_max = x_max
+        self.dist = NormalDist(self.to_normal(x_center), x_spread)
+        # probability mass within the bounds, in terms of the normal variable
+        self.cdf_min = self.dist.cdf(self.to_normal(x_min)) if x_min is not None else 0.
+        self.cdf_max = self.dist.cdf(self.to_normal(x_max)) if x_max is not None else 1.
+
+    def to_normal(self, x):
+        """Map x to the normally distributed variable"""
+        return x
+
+    def from_normal(self, z):
+        """Inverse of to_normal"""
+        return z
+
+    def pdf(self, x):
+        """Normalized probability density function"""
+        if (self.x_min is not None and x < self.x_min) or (self.x_max is not None and x > self.x_max):
+            return 0
+        return self.dist.pdf(self.to_normal(x)) / (self.cdf_max - self.cdf_min)
+
+    def inv(self, r):
+        """Given a random number, r, in [0,1), return a value, x, sampled by the pdf, by inverting the cumulative distribution function"""
+        eps = 1e-16 # NormalDist.inv_cdf is defined on the open interval (0,1)
+        p = self.cdf_min + (self.cdf_max-self.cdf_min)*r
+        return self.from_normal(self.dist.inv_cdf(min(max(p, eps), 1-eps)))
+
+class LogNormalProbGen(NormalProbGen):
+    """Generate Log-normal probability functions, with median x_center and log standard deviation x_spread, truncated to [x_min, x_max] where given"""
+    def to_normal(self, x):
+        return math.log(x) if x > 0 else -math.inf
+
+    def from_normal(self, z):
+        return math.exp(z)
 
-class LogNormalProbGen(ProbGen):
-    """Generate Log-normal probability functions"""
-    pass
+    def pdf(self, x):
+        return super().pdf(x) / x if x > 0 else 0 # change of variables, dz/dx = 1/x
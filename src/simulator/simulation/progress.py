@@ -0,0 +1,146 @@
+"""Progress tracking for experiment runs, reporting throughput and running landing statistics"""
+
+import time
+
+import numpy as np
+
+class ProgressTracker:
+    """Accumulates per-trial results and periodically publishes a progress snapshot"""
+    def __init__(self, num_trials, publish=None, publish_interval=1.0, target=None):
+        """
+        Parameters:
+        -------
+        num_trials: int
+            The total number of trials expected in this run.
+        publish: callable | None
+            Called with a snapshot dict whenever progress is due to be published.
+        publish_interval: float
+            Minimum number of seconds between successive publishes.
+        target: tuple | None
+            (position [x, y], radius) of a target disk on the ground, to estimate the probability of landing in.
+        """
+        self.num_trials = num_trials
+        self.publish = publish
+        self.publish_interval = publish_interval
+        self.target = target
+        # sums of likelihood weight * (landed in target), and its square, over trials
+        self.target_sum = 0.
+        self.target_sum_sq = 0.
+
+        self.trials_done = 0
+        self.trials_landed = 0
+        # running (weighted Welford) statistics over landing positions (x, y), weighted by likelihood weight so importance sampled runs describe the experiment's distribution rather than the proposal's
+        self.landing_weight = 0.
+        self.landing_mean = np.zeros(2)
+        self.landing_m2 = np.zeros(2)
+
+        self.time_start = time.perf_counter()
+        self.time_published = None
+
+    def update(self, p_final, likelihood_weight=None):
+        """Record a completed trial's final position, and its likelihood weight if importance sampled, publishing a snapshot if one is due"""
+        self.trials_done += 1
+        xy = np.asarray(p_final[:2], dtype=float)
+        w = 1. if likelihood_weight is None else likelihood_weight
+        if not np.isnan(xy).any(): # ball hit the ground
+            self.trials_landed += 1
+            self.landing_weight += w
+            delta = xy - self.landing_mean
+            self.landing_mean += delta * w / self.landing_weight
+            self.landing_m2 += w * delta * (xy - self.landing_mean)
+            if self.target is not None and np.linalg.norm(xy - self.target[0]) <= self.target[1]:
+                self.target_sum += w
+                self.target_sum_sq += w**2
+
+        now = time.perf_counter()
+        is_due = self.time_published is None or now - self.time_published >= self.publish_interval
+        if self.publish is not None and (is_due or self.trials_done == self.num_trials):
+            self.time_published = now
+            self.publish(self.snapshot())
+
+    def snapshot(self,):
+        """Return the current progress as a JSON-serializable dict"""
+        elapsed = time.perf_counter() - self.time_start
+        n = self.trials_landed
+        variance = self.landing_m2 / self.landing_weight if n > 0 else np.full(2, np.nan)
+        return {
+            'trials_done': self.trials_done,
+            'num_trials': self.num_trials,
+            'trials_landed': n,
+            'elapsed': elapsed,
+            'trials_per_sec': self.trials_done / elapsed if elapsed > 0 else None,
+            'landing_mean': self.landing_mean.tolist() if n > 0 else None,
+            'landing_std': np.sqrt(variance).tolist() if n > 0 else None,
+            'landing_spread': float(np.sqrt(variance.sum())) if n > 0 else None,
+            'landing_m2': self.landing_m2.tolist(),
+            'landing_weight': self.landing_weight,
+            **(target_estimate(self.trials_done, self.target_sum, self.target_sum_sq) if self.target is not None else {}),
+        }
+
+def target_estimate(trials_done, target_sum, target_sum_sq):
+    """The (importance-weighted) Monte Carlo estimate of the probability of landing in the target, and its standard error, from the sums kept by ProgressTracker"""
+    n = trials_done
+    p = target_sum / n if n > 0 else None
+    se = float(np.sqrt(max(target_sum_sq/n - p**2, 0) / (n-1))) if n > 1 else None
+    return {
+        'target_sum': target_sum,
+        'target_sum_sq': target_sum_sq,
+        'target_probability': p,
+        'target_probability_se': se,
+    }
+
+def landing_stats(xy):
+    """Landing statistics, as in a ProgressTracker snapshot, of landing positions xy, shape=(n, 2), all of which landed"""
+    n = xy.shape[0]
+    return {
+        'trials_landed': n,
+        'landing_mean': xy.mean(axis=0).tolist() if n > 0 else None,
+        'landing_std': xy.std(axis=0).tolist() if n > 0 else None,
+        'landing_spread': float(np.sqrt(xy.var(axis=0).sum())) if n > 0 else None,
+    }
+
+def merge_snapshots(snapshots):
+    """
+    Combine the progress snapshots of parallel experiment chunks into a single snapshot.
+
+    Landing statistics are merged with the (weighted) parallel variance algorithm (Chan et al.), so the result matches a single run over all trials.
+    """
+    trials_done = 0
+    num_trials = 0
+    trials_per_sec = 0
+    n = 0
+    weight = 0.
+    mean = np.zeros(2)
+    m2 = np.zeros(2)
+    target_sum = 0.
+    target_sum_sq = 0.
+    for s in snapshots:
+        trials_done += s['trials_done']
+        target_sum += s.get('target_sum', 0.)
+        target_sum_sq += s.get('target_sum_sq', 0.)
+        num_trials += s['num_trials']
+        trials_per_sec += s['trials_per_sec'] or 0
+        n_s = s['trials_landed']
+        if n_s == 0:
+            continue
+        w_s = s.get('landing_weight', n_s) # o.w. unweighted
+        mean_s = np.array(s['landing_mean'])
+        delta = mean_s - mean
+        m2 = m2 + np.array(s['landing_m2']) + delta**2 * weight*w_s/(weight+w_s)
+        mean = mean + delta * w_s/(weight+w_s)
+        weight += w_s
+        n += n_s
+
+    variance = m2 / weight if n > 0 else np.full(2, np.nan)
+    return {
+        'trials_done': trials_done,
+        'num_trials': num_trials,
+        'trials_landed': n,
+        'trials_per_sec': trials_per_sec,
+        'landing_mean': mean.tolist() if n > 0 else None,
+        'landing_std': np.sqrt(variance).tolist() if n > 0 else None,
+        'landing_spread': float(np.sqrt(variance.sum())) if n > 0 else None,
+        'landing_m2': m2.tolist(),
+        'landing_weight': weight,
+        **(target_estimate(trials_done, target_sum, target_sum_sq) if any('target_sum' in s for s in snapshots) else {}),
+    }
@@ -0,0 +1,90 @@
+"""Output samplers, which thin a ball trajectory to the points worth storing, so its size tracks the path's complexity rather than the timestep"""
+import numpy as np
+
+# N.B. pandas is imported where used, keeping this module light for workers
+
+SAMPLERS = [
+    None, # store every integration step
+    'stride', # every stride-th step
+    'rdp', # Ramer-Douglas-Peucker: the fewest steps reproducing the path within tolerance
+]
+
+def check_sampling(sampler=None, stride=None, tolerance=None):
+    """Raise ValueError unless the sampler is known and given the options it needs"""
+    if sampler not in SAMPLERS:
+        raise ValueError(f"Unknown trajectory sampler {sampler!r}. Choose from {SAMPLERS}.")
+    if sampler == 'stride' and not (stride and int(stride) == stride and stride > 0):
+        raise ValueError("The 'stride' sampler requires a positive integer stride.")
+    if sampler == 'rdp' and not (tolerance and tolerance > 0):
+        raise ValueError("The 'rdp' sampler requires a positive tolerance.")
+
+def landmark_indices(points):
+    """Steps every sampler keeps: the launch, the apex (highest point) and the last step, where the ball lands or the wind runs out"""
+    return np.unique([0, int(np.argmax(points[:,2])), points.shape[0]-1])
+
+def stride_indices(points, stride):
+    """Every stride-th step, plus the landmarks"""
+    return np.union1d(np.arange(0, points.shape[0], stride), landmark_indices(points))
+
+def rdp_indices(points, tolerance):
+    """
+    Ramer-Douglas-Peucker simplification, keeping the landmarks.
+
+    Each span between kept steps is split at its worst step until every dropped step lies within tolerance of the chord across its span. Distances are synchronized, i.e. to where the chord is at the step's time, since steps are evenly spaced in time. So linear interpolation of the kept steps over time reproduces every step, not just the shape of the path, within tolerance.
+    """
+    keep = np.zeros(points.shape[0], dtype=bool)
+    landmarks = landmark_indices(points)
+    keep[landmarks] = True
+    spans = list(zip(landmarks[:-1], landmarks[1:]))
+    while spans:
+        a, b = spans.pop()
+        if b - a < 2:
+            continue
+        s = (np.arange(a+1, b) - a)/(b - a)
+        chord = points[a] + s[:,None]*(points[b] - points[a])
+        d = np.linalg.norm(points[a+1:b] - chord, axis=1)
+        k = int(np.argmax(d))
+        if d[k] > tolerance:
+            i = a+1+k
+            keep[i] = True
+            spans += [(a, i), (i, b)]
+    return np.flatnonzero(keep)
+
+def sample_trajectory(ball_position, timestep, sampler=None, stride=None, tolerance=None):
+    """
+    Thin a simulated ball trajectory for storage.
+
+    Parameters:
+    -------
+    ball_position: np.array
+        As returned by SimTrialRunner.run, shape=(T, 3): NaN rows before the launch, then one row per step.
+    timestep: float
+        The time between steps, in seconds.
+    sampler: str | None
+        One of SAMPLERS.
+    stride: int | None
+        The step stride, for the 'stride' sampler.
+    tolerance: float | None
+        The largest position error (m) allowed by the 'rdp' sampler (see rdp_indices).
+
+    Returns:
+    -------
+    df: pd.DataFrame
+        The kept steps, columns [t, x, y, z], where t is the time (s) since the start of the wind spacetime, since the kept steps aren't evenly spaced. The rows before the launch are dropped.
+    """
+    import pandas as pd
+    check_sampling(sampler, stride, tolerance)
+    rows = np.flatnonzero(~np.isnan(ball_position).any(axis=1))
+    points = ball_position[rows]
+    if points.shape[0] > 0 and sampler == 'stride':
+        keep = stride_indices(points, int(stride))
+    elif points.shape[0] > 0 and sampler == 'rdp':
+        keep = rdp_indices(points, tolerance)
+    else:
+        keep = np.arange(points.shape[0])
+    return pd.DataFrame({
+        't': rows[keep]*timestep,
+        'x': points[keep,0],
+        'y': points[keep,1],
+        'z': points[keep,2],
+    })
@@ -1,48 +1,28 @@
 """Scientist classes, which conduct experiments and such"""
 
-from .probabilities import UniformProbGen, NormalProbGen, LogNormalProbGen
-from .geometries import EulerAnglesGeometry, SphericalGeometry, CylindricalGeometry
+from django.conf import settings
+
+from .plans import ExperimentPlan
 from .sim import SimTrialRunner
-from simulator.models import SimTrial, SimExperiment
+from .progress import ProgressTracker, landing_stats, merge_snapshots
+from .lookups import find_landing_table, get_landing_lookup
+from .samplers import check_sampling, sample_trajectory
+from simulator.models import SimTrial, SimExperiment, ExperimentChunk
 from commons.wranglers import BlobWrangler
 from commons.utilities import trim_dict, list_model_fields
-from winds.models import WindSpacetime
 
 import numpy as np
-import pandas as pd
 
 from pprint import pprint
-from termcolor import cprint
+
+def cprint(*args, **kwargs):
+    """termcolor.cprint, imported on first use since it's only needed for verbose logging"""
+    from termcolor import cprint
+    cprint(*args, **kwargs)
 
 class ExperimentRunner:
     """ Conducts Monte Carlo experiments, sampling many SimTrials for a given parameter set """
-    required_keys_params = [
-        'windspacetime_id',
-        'num_trials',
-        'prob_speed_fn_name',
-        'prob_speed_max',
-        'prob_speed_center',
-        'prob_speed_spread',
-        'prob_timing_fn_name',
-        'prob_timing_max',
-        'prob_timing_center',
-        'prob_timing_spread',
-        'prob_aiming_fn_name',
-        'prob_aiming_geometry',
-        'prob_aiming_X1_min',
-        'prob_aiming_X1_max',
-        'prob_aiming_X1_center',
-        'prob_aiming_X1_spread',
-        'prob_aiming_X2_min',
-        'prob_aiming_X2_max',
-        'prob_aiming_X2_center',
-        'prob_aiming_X2_spread',
-        'prob_aiming_X3_min',
-        'prob_aiming_X3_max',
-        'prob_aiming_X3_center',
-        'prob_aiming_X3_spread',
-        'timestep',
-    ]
+    required_keys_params = list(ExperimentPlan.required_keys)
     optional_keys_params = [
         'prob_timing_min',
         'prob_speed_min',
@@ -50,25 +30,43 @@ class ExperimentRunner:
         'm',
         'drag_coef',
         'verbosity',
+        'progress_interval',
+        'checkpoint_interval',
+        'seed',
+        'experiment_id',
+        'trial_start',
+        'trajectory_encoding',
+        'trajectory_tolerance',
+        'trajectory_sampler',
+        'trajectory_stride',
+        'trajectory_sample_tolerance',
+        'target_position',
+        'target_radius',
+        'importance_sampling',
+        'proposal_a',
+        'proposal_b',
+        'ce_trials',
+        'ce_elite_fraction',
+        'ce_max_iterations',
+        'defensive_fraction',
+        'use_landing_table',
+        'landing_table_tolerance',
     ]
-    ProbGens = { # probability function generators, keyed by function name
-        'Uniform': UniformProbGen,
-        'Normal': NormalProbGen,
-        'Log-normal': LogNormalProbGen,
+    importance_defaults = {
+        'ce_trials': 500, # trials per cross-entropy iteration
+        'ce_elite_fraction': .1, # fraction of trials, closest to the target, the proposal is fitted to
+        'ce_max_iterations': 10,
+        'ce_smoothing': .7, # weight of each iteration's fit against the previous proposal
+        'defensive_fraction': .1, # fraction of trials sampled uniformly, bounding likelihood weights by 1/defensive_fraction
     }
-    Geometries = { # geometry classes, keyed by geometry name
-        'EulerAngles': EulerAnglesGeometry,
-        'Spherical': SphericalGeometry,
-        'Cylindrical': CylindricalGeometry,
-    }
-    tee_position = np.array([0,0,10])
+    ProbGens = ExperimentPlan.ProbGens
+    Geometries = ExperimentPlan.Geometries
+    tee_position = np.array(ExperimentPlan.tee_position)
 
-    def __init__(self, params):
+    def __init__(self, params, progress_callback=None, chunk_id=None, arr_windspacetime=None, plan=None):
         """
         Parameters:
         -------
-        df_windspacetime: pd.DataFrame
-            ...
         params: dict
             ...
             keys must include: [
@@ -105,107 +103,197 @@ class ExperimentRunner:
                 'm',
                 'drag_coef',
                 'verbosity',
-            ]
-        
+                'progress_interval',
+                'checkpoint_interval',
+                'seed',
+                'experiment_id',
+                'trial_start',
+                'trajectory_encoding',
+                'trajectory_tolerance',
+                'trajectory_sampler',
+                'trajectory_stride',
+                'trajectory_sample_tolerance',
+                'target_position',
+                'target_radius',
+                'importance_sampling',
+                'proposal_a',
+                'proposal_b',
+                'ce_trials',
+                'ce_elite_fraction',
+                'ce_max_iterations',
+                'defensive_fraction',
+                'use_landing_table',
+                'landing_table_tolerance',
+            ], as listed by optional_keys_params.
+            'seed' fixes the random streams of the whole experiment, while 'trial_start' is the experiment-wide index of this chunk's first trial.
+            'experiment_id' is the SimExperiment the trials are linked to as they're saved (see ExperimentCollater.create_experiment).
+            'trajectory_encoding' and 'trajectory_tolerance' opt in to a lossy storage encoding for trajectory blobs (see commons.encodings).
+            'trajectory_sampler' ('stride' or 'rdp'), with 'trajectory_stride' or 'trajectory_sample_tolerance' (m), opts in to storing only some steps of each trajectory, always including the apex and landing, with their times (see samplers.sample_trajectory). O.w. settings.TRAJECTORY_SAMPLING applies.
+            'target_position' ([x, y]) and 'target_radius' give a target disk on the ground, whose landing probability is estimated. With 'importance_sampling', trials sample from a proposal favoring the target instead, given by 'proposal_a' and 'proposal_b' or fitted by fit_proposal, and record likelihood weights so the estimate stays unbiased. 'ce_trials', 'ce_elite_fraction', 'ce_max_iterations' and 'defensive_fraction' tune the fit (see importance_defaults).
+            'use_landing_table' answers trials without drag from the newest LandingTable on the wind spacetime validated to within 'landing_table_tolerance' (m, default settings.LANDING_TABLE_TOLERANCE), where it covers them. Those trials store no trajectory.
+        progress_callback: callable | None
+            Called periodically during run_experiment with a progress snapshot dict (see ProgressTracker.snapshot).
+        chunk_id: str | None
+            The id of the ExperimentChunk to checkpoint into. If the chunk already has a checkpoint (e.g. a retried task), the run resumes from it.
+        arr_windspacetime: np.array | None
+            The wind velocity data, shape=(T, 3). Loaded from the WindSpacetime if not given.
+        plan: ExperimentPlan | None
+            The experiment's plan, e.g. built once and shared by every chunk's runner. Built from params, validating them, if not given.
         """
-        # assign params
-        self._check_params(params)
+        # assign params, validated and resolved into the experiment's plan
+        self.plan = plan if plan is not None else ExperimentPlan.from_params(params)
         self.params = params
+        self.progress_callback = progress_callback
+        self.chunk_id = chunk_id
+        self.chunk = None # the ExperimentChunk, once loaded
+        self.wrangler = BlobWrangler()
 
         # set verbosity
         self.verbosity = params.get('verbosity', 1)
 
-        # load winds
-        self.load_windspacetime()
+        # load winds, unless already supplied (e.g. from shared memory by a local executor)
+        if arr_windspacetime is None:
+            self.load_windspacetime()
+        else:
+            self.arr_windspacetime = arr_windspacetime
 
         # build probability functions
         self.gen_prob_fns()
 
-        # init Random Number Generator with a seed taken from fresh, unpredictable CPU entropy
-        self.rng = np.random.default_rng()
+        # seed the experiment; the plan draws a seed from fresh, unpredictable CPU entropy if none is given so the run can still be reproduced
+        self.seed = self.plan.seed
+        self.trial_start = params.get('trial_start', 0)
+        self.experiment_id = params.get('experiment_id')
+
+        # target and importance sampling proposal, if any
+        self.target = None
+        if params.get('target_position') is not None and params.get('target_radius') is not None:
+            self.target = (np.array(params['target_position'], dtype=np.float64), params['target_radius'])
+        self.importance_sampling = bool(params.get('importance_sampling')) # with a target, as the plan checked
+        self.proposal = None
+        if self.importance_sampling and params.get('proposal_a') is not None:
+            self.set_proposal(params['proposal_a'], params['proposal_b'])
+
+        # precomputed landings, if any
+        self.landing_lookup = None
+        if params.get('use_landing_table') and not params.get('drag_coef') and params.get('windspacetime_id') is not None:
+            landing_table_id = find_landing_table(params['windspacetime_id'], params['timestep'], self.tee_position, params.get('landing_table_tolerance'))
+            if landing_table_id is not None:
+                self.landing_lookup = get_landing_lookup(landing_table_id)
+
+        # opt-in precision encoding for trajectory blobs, o.w. settings.BLOB_PRECISION applies
+        self.trajectory_precision = None
+        if params.get('trajectory_encoding') is not None:
+            self.trajectory_precision = {
+                'encoding': params['trajectory_encoding'],
+                'tolerance': params.get('trajectory_tolerance'),
+            }
+
+        # opt-in output sampling of trajectories, o.w. settings.TRAJECTORY_SAMPLING applies
+        self.trajectory_sampling = dict(settings.TRAJECTORY_SAMPLING)
+        if params.get('trajectory_sampler') is not None:
+            self.trajectory_sampling = {
+                'sampler': params['trajectory_sampler'],
+                'stride': params.get('trajectory_stride'),
+                'tolerance': params.get('trajectory_sample_tolerance'),
+            }
+        check_sampling(**self.trajectory_sampling)
+
+    @staticmethod
+    def split_trials(num_trials, num_chunks):
+        """
+        Split an experiment's trials into contiguous chunks.
+
+        Returns:
+        -------
+        chunks: list of tuples
+            (trial_start, num_trials) for each non-empty chunk
+        """
+        size, remainder = divmod(num_trials, num_chunks)
+        chunks = []
+        trial_start = 0
+        for i in range(num_chunks):
+            n = size + (1 if i < remainder else 0)
+            if n > 0:
+                chunks.append((trial_start, n))
+            trial_start += n
+        return chunks
+
+    @staticmethod
+    def check_num_chunks(num_chunks, num_trials):
+        """Validate the number of chunks to split num_trials trials into, returning it as an int. Raises ValueError unless it's an integer from 1 to num_trials."""
+        if isinstance(num_chunks, str) and num_chunks.isdigit(): # e.g. from form data
+            num_chunks = int(num_chunks)
+        if type(num_chunks) is not int or not 1 <= num_chunks <= max(num_trials, 1):
+            raise ValueError(f"num_chunks must be an integer from 1 to num_trials, got {num_chunks!r}.")
+        return num_chunks
+
+    def trial_rng(self, trial_index):
+        """
+        Random Number Generator for a single trial, given its experiment-wide index.
+
+        Each trial draws from its own child stream of the experiment seed, i.e. the stream that SeedSequence(seed).spawn(...) yields for that index, so results are bit-identical however the experiment is split into chunks or workers.
+        """
+        ss = np.random.SeedSequence(self.seed, spawn_key=(trial_index,))
+        return np.random.default_rng(ss)
 
     def _check_params(self, params):
-        """Checks that supplied params meet requirements."""
-        # check for required and optional params
-        if not set(self.required_keys_params).issubset(set(params.keys())):
-            missing = []
-            for k in self.required_keys_params:
-                if k not in params.keys():
-                    missing.append(k)
-            raise AssertionError(f'Required params are missing: {missing}')        
+        """Checks that supplied params meet requirements, raising AssertionError if any are missing or ValueError if any are invalid (see ExperimentPlan.from_params)."""
+        ExperimentPlan.from_params(params)
 
     def load_windspacetime(self,):
-        id = self.params['windspacetime_id']
-        o = WindSpacetime.objects.get(pk=id)
-        self.df_windspacetime = BlobWrangler().read_blob(o)
-        self.arr_windspacetime = self.df_windspacetime.to_numpy()
+        # the simulation steps through the wind row by row, so serve it at the experiment's timestep, whatever it was generated at; analytic winds are evaluated at exactly those times, without blob I/O
+        self.arr_windspacetime = self.plan.wind()
 
     def gen_prob_fns(self,):
-        # Probability generator classes
-        ProbGenTiming = self.ProbGens[self.params['prob_timing_fn_name']]
-        ProbGenAiming = self.ProbGens[self.params['prob_aiming_fn_name']]
-        ProbGenSpeed = self.ProbGens[self.params['prob_speed_fn_name']]
-
-        # Instantiate probability generators
-        pgtime = ProbGenTiming(
-            x_min = self.params.get('prob_timing_min'), # optional, o.w. None
-            x_max = self.params['prob_timing_max'],
-            x_center = self.params['prob_timing_center'],
-            x_spread = self.params['prob_timing_spread'],
-        )
-        pgaim1 = ProbGenAiming(
-            x_min = self.params['prob_aiming_X1_min'],
-            x_max = self.params['prob_aiming_X1_max'],
-            x_center = self.params['prob_aiming_X1_center'],
-            x_spread = self.params['prob_aiming_X1_spread'],
-        )
-        pgaim2 = ProbGenAiming(
-            x_min = self.params['prob_aiming_X2_min'],
-            x_max = self.params['prob_aiming_X2_max'],
-            x_center = self.params['prob_aiming_X2_center'],
-            x_spread = self.params['prob_aiming_X2_spread'],
-        )
-        pgaim3 = ProbGenAiming(
-            x_min = self.params['prob_aiming_X3_min'],
-            x_max = self.params['prob_aiming_X3_max'],
-            x_center = self.params['prob_aiming_X3_center'],
-            x_spread = self.params['prob_aiming_X3_spread'],
-        )
-        pgspeed = ProbGenSpeed(
-            x_min = self.params.get('prob_speed_min'), # optional, o.w. None
-            x_max = self.params['prob_speed_max'],
-            x_center = self.params['prob_speed_center'],
-            x_spread = self.params['prob_speed_spread'],
+        """The plan's probability functions, and their inversions to sample (https://stackoverflow.com/questions/21100716/fast-arbitrary-distribution-random-sampling-inverse-transform-sampling), by name"""
+        pgs = {
+            'timing': self.plan.prob_timing,
+            'speed': self.plan.prob_speed,
+            'aiming_x1': self.plan.prob_aiming[0],
+            'aiming_x2': self.plan.prob_aiming[1],
+            'aiming_x3': self.plan.prob_aiming[2],
+        }
+        self.prob_fns = {k: pg.generate_fn() for k, pg in pgs.items()}
+        self.inv_prob_fns = {k: pg.generate_inv_fn() for k, pg in pgs.items()}
+
+    def load_checkpoint(self,):
+        """
+        Get or create this run's ExperimentChunk. If it holds a checkpoint, discard trials persisted after it.
+
+        Returns:
+        -------
+        simtrial_ids: list
+            list of id's for the sim trials already persisted before the checkpoint, in trial order
+        """
+        self.chunk, _ = ExperimentChunk.objects.get_or_create(
+            pk=self.chunk_id,
+            defaults={'num_trials': self.params['num_trials']},
         )
+        if self.chunk.trials_done == 0:
+            return []
 
-        # Generate prob functions
-        prob_fn_timing = pgtime.generate_fn()
-        prob_fn_speed = pgspeed.generate_fn()
-        prob_fn_aiming_x1 = pgaim1.generate_fn()
-        prob_fn_aiming_x2 = pgaim2.generate_fn()
-        prob_fn_aiming_x3 = pgaim3.generate_fn()
-
-        # Generate inversions of prob functions to sample (https://stackoverflow.com/questions/21100716/fast-arbitrary-distribution-random-sampling-inverse-transform-sampling)
-        inv_prob_fn_timing = pgtime.generate_inv_fn()
-        inv_prob_fn_speed = pgspeed.generate_inv_fn()
-        inv_prob_fn_aiming_x1 = pgaim1.generate_inv_fn()
-        inv_prob_fn_aiming_x2 = pgaim2.generate_inv_fn()
-        inv_prob_fn_aiming_x3 = pgaim3.generate_inv_fn()
-
-        self.prob_fns = {
-            'timing': prob_fn_timing,
-            'speed': prob_fn_speed,
-            'aiming_x1': prob_fn_aiming_x1,
-            'aiming_x2': prob_fn_aiming_x2,
-            'aiming_x3': prob_fn_aiming_x3,
-        }
-        self.inv_prob_fns = {
-            'timing': inv_prob_fn_timing,
-            'speed': inv_prob_fn_speed,
-            'aiming_x1': inv_prob_fn_aiming_x1,
-            'aiming_x2': inv_prob_fn_aiming_x2,
-            'aiming_x3': inv_prob_fn_aiming_x3,
-        }
+        if self.verbosity >= 1:
+            cprint(f"[Scientist] Resuming chunk {self.chunk_id} from trial #{self.chunk.trials_done}.", 'blue')
+
+        # trials saved after the last checkpoint will be re-run, so drop them
+        qs_tail = SimTrial.objects.filter(chunk=self.chunk, trial_index__gte=self.trial_start + self.chunk.trials_done)
+        for o in qs_tail:
+            self.wrangler.delete_blob(o)
+        qs_tail.delete()
+
+        # reuse the persisted trials, including their landing positions in the running stats
+        qs_done = SimTrial.objects.filter(chunk=self.chunk).order_by('trial_index')
+        simtrial_ids = []
+        for id, position_final, likelihood_weight in qs_done.values_list('id', 'position_final', 'likelihood_weight'):
+            simtrial_ids.append(id.__str__())
+            self.progress.update(position_final, likelihood_weight)
+        return simtrial_ids
+
+    def save_checkpoint(self, trials_done):
+        """Record that the chunk's first trials_done trials are persisted. Their random streams are keyed by trial index, so no RNG state is needed to continue."""
+        self.chunk.trials_done = trials_done
+        self.chunk.save(update_fields=['trials_done', 'modified_at'])
 
     def run_experiment(self,):
         """
@@ -216,129 +304,375 @@ class ExperimentRunner:
         simtrial_ids: list
             list of id's for the sim trials created during this experiment
         """
-        timestep = self.params['timestep']
         N = self.params['num_trials']
+        checkpoint_interval = self.params.get('checkpoint_interval', 100)
+
+        # track progress
+        self.progress = ProgressTracker(
+            N,
+            publish=self.progress_callback,
+            publish_interval=self.params.get('progress_interval', 1.0),
+            target=self.target,
+        )
+        if self.importance_sampling and self.proposal is None:
+            self.load_or_fit_proposal()
+
+        # resume from checkpoint
+        if self.chunk_id is not None:
+            simtrial_ids = self.load_checkpoint()
+        else:
+            simtrial_ids = []
         
         # do the trials
-        simtrial_ids = []
-        for n in range(N):
+        for n in range(len(simtrial_ids), N):
+            trial_index = self.trial_start + n
             if self.verbosity >= 1:
                 cprint(f"[Scientist] >>>>>>>>>>>>>> Running Trial #{n} >>>>>>>>>>>>>>", 'blue')
-            # choose time
-            ipt = self.inv_prob_fns['timing'] # inverted probability timing function
-            self.time_initial = time_initial = ipt(self.rng.random())
-            ## convert to nearest timestep
-            t_initial = int(np.round(time_initial/timestep)) # t denotes an int
-            
-            # choose aim
-            ## choose abstract coordinates
-            ### N.B. third coordinate is used in euler angles but is throwaway in spherical geometry.
-            ipa_x1 = self.inv_prob_fns['aiming_x1'] # inverted probability timing function
-            ipa_x2 = self.inv_prob_fns['aiming_x2']
-            ipa_x3 = self.inv_prob_fns['aiming_x3']
-            x1 = ipa_x1(self.rng.random())
-            x2 = ipa_x2(self.rng.random())
-            x3 = ipa_x3(self.rng.random())
-            ## convert to unit vector via geometry
-            G = self.Geometries[self.params['prob_aiming_geometry']]
-            self.direction_initial = v_hat = G(x1, x2, x3).get_unit_vector()
-            
-            # choose speed
-            ips = self.inv_prob_fns['speed'] # inverted probability timing function
-            self.speed_initial = speed_initial = ips(self.rng.random())
-
-            # set initial velocity
-            v_initial = speed_initial*v_hat
-            
-            # run a trial
-            runner = SimTrialRunner(t_initial, self.tee_position, v_initial, self.arr_windspacetime, timestep)
-            runner.run()
+            trial = self.simulate_trial(trial_index)
 
-            # feed runner outputs into save sim trial
-            params = self.params
-            params['position_initial'] = list(runner.p_initial)
-            params['position_final'] = list(runner.p_final)
+            # save the sim trial, in the background
+            simtrial_obj = self.save_trial(trial)
+            simtrial_ids.append(simtrial_obj.id.__str__())
+            self.progress.update(trial['position_final'], trial['likelihood_weight'])
 
-            # save the sim trial
-            id = self.save_trial(runner.ball_position, params)
-            simtrial_ids.append(id)
-
-            # log result
-            if self.verbosity >= 1:
-                cprint(f"[Scientist] v_i={runner.v_initial}m/s @ t_i={runner.t_initial} --> p_f={runner.p_final}m.", 'red')
-                print(".")
+            # persist the queued trials in a batch, then checkpoint
+            if (n+1) % checkpoint_interval == 0 or n+1 == N:
+                self.wrangler.flush()
+                if self.chunk is not None:
+                    self.save_checkpoint(n+1)
 
         return simtrial_ids
 
-    def save_trial(self, arr_ball_position, params):
+    def sample_uniforms(self, trial_index):
+        """Draw a trial's uniform random numbers from its stream, in the order simulate_trial maps them: timing, aiming x1, x2, x3, speed. When importance sampling, they're drawn from the proposal instead."""
+        rng = self.trial_rng(trial_index)
+        if self.proposal is None:
+            return rng.random(5)
+        return self.sample_proposal(rng, 1)[0]
+
+    def importance_param(self, key):
+        value = self.params.get(key)
+        return self.importance_defaults[key] if value is None else value
+
+    def set_proposal(self, a, b):
+        """Set the importance sampling proposal: Beta(a[i], b[i]) for each uniform random number, mixed with a defensive fraction of uniform samples"""
+        from math import lgamma
+        a = np.array(a, dtype=np.float64)
+        b = np.array(b, dtype=np.float64)
+        self.proposal = (a, b)
+        self.proposal_lbeta = np.array([lgamma(ai) + lgamma(bi) - lgamma(ai+bi) for ai, bi in zip(a, b)])
+
+    def sample_proposal(self, rng, n):
+        """Draw n sets of uniform random numbers from the proposal, shape=(n, 5)"""
+        a, b = self.proposal
+        u = rng.beta(a, b, size=(n, 5))
+        defensive = rng.random(n) < self.importance_param('defensive_fraction')
+        u[defensive] = rng.random((int(defensive.sum()), 5))
+        return u
+
+    def likelihood_weights(self, u):
+        """Ratio of the nominal (uniform) density to the proposal's, for sets of uniform random numbers u, shape=(n, 5)"""
+        a, b = self.proposal
+        with np.errstate(divide='ignore'):
+            log_beta_pdf = (a-1)*np.log(u) + (b-1)*np.log1p(-u) - self.proposal_lbeta
+        lam = self.importance_param('defensive_fraction')
+        return 1 / (lam + (1-lam)*np.exp(log_beta_pdf.sum(axis=1)))
+
+    def distance_to_target(self, p_final):
+        """Horizontal distance of a landing position from the target's center, inf if the ball didn't land"""
+        xy = np.asarray(p_final[:2], dtype=np.float64)
+        return np.inf if np.isnan(xy).any() else float(np.linalg.norm(xy - self.target[0]))
+
+    def fit_proposal(self,):
+        """
+        Fit the importance sampling proposal toward the target by the cross-entropy method: starting from the nominal (uniform) distribution, repeatedly sample trials, then fit each Beta to the likelihood-weighted elite fraction landing closest to the target, until the elite all land within it.
+
+        Deterministic given the seed, drawing from streams apart from the trials'. Returns the proposal, (a, b).
+        """
+        M = self.importance_param('ce_trials')
+        rho = self.importance_param('ce_elite_fraction')
+        smoothing = self.importance_defaults['ce_smoothing']
+        radius = self.target[1]
+        self.set_proposal(np.ones(5), np.ones(5))
+        for iteration in range(self.importance_param('ce_max_iterations')):
+            rng = np.random.default_rng(np.random.SeedSequence([self.seed, 1], spawn_key=(iteration,)))
+            u = self.sample_proposal(rng, M)
+            w = self.likelihood_weights(u)
+            d = np.array([self.distance_to_target(self.simulate_trial(None, ui)['position_final']) for ui in u])
+
+            # the elite: within the target, or the closest fraction rho if fewer
+            level = max(np.quantile(d, rho), radius)
+            if not np.isfinite(level):
+                raise ValueError('Too few trials landed to fit a proposal; try a longer wind spacetime or more ce_trials.')
+            elite = d <= level
+
+            # weighted method of moments Beta fit
+            we = w[elite] / w[elite].sum()
+            mean = we @ u[elite]
+            var = np.maximum(we @ (u[elite] - mean)**2, 1e-8)
+            concentration = np.maximum(mean*(1-mean)/var - 1, 1e-3)
+            a_old, b_old = self.proposal
+            self.set_proposal(
+                smoothing*mean*concentration + (1-smoothing)*a_old,
+                smoothing*(1-mean)*concentration + (1-smoothing)*b_old,
+            )
+            if self.verbosity >= 1:
+                cprint(f"[Scientist] Cross-entropy iteration {iteration}: elite level {level:.3g}m.", 'blue')
+            if level <= radius:
+                break
+        return self.proposal
+
+    def load_or_fit_proposal(self,):
+        """Use the experiment's stored proposal, fitting and storing it first if it has none. Chunks starting together may each fit it, but all then use the first one stored."""
+        qs = SimExperiment.objects.filter(pk=self.experiment_id)
+        a, b = qs.values_list('proposal_a', 'proposal_b').get()
+        if a is None:
+            a, b = self.fit_proposal()
+            qs.filter(proposal_a=None).update(proposal_a=a.tolist(), proposal_b=b.tolist())
+            a, b = qs.values_list('proposal_a', 'proposal_b').get()
+        self.set_proposal(a, b)
+
+    def simulate_trial(self, trial_index, uniforms=None):
         """
-        Store blob and simtrial obj then return simtrial_id.
+        Sample a trial's initial conditions from its random stream and simulate the ball trajectory. Touches neither the database nor blob storage.
 
         Parameters:
         -------
-        arr_ball_position: np.array
-            The ball position trajetory in 3D cartesian coordinates. Expects an np.array with 3 columns and arbitrary number of rows, shape=(T, 3).
-        params: dict
-            The simulation parameters passed to the scientist
+        trial_index: int
+            The experiment-wide index of the trial.
+        uniforms: np.array | None
+            The trial's uniform random numbers, shape=(5,). Defaults to sample_uniforms(trial_index). Given the same numbers, runners with different parameters sample comparable trials (see run_sensitivity).
+
+        Returns:
+        -------
+        trial: dict
+            The trial's index, initial conditions, initial and final positions, likelihood weight (None unless importance sampling), and ball_position, the trajectory, shape=(T, 3), which is None if the landing was looked up from a landing table.
         """
+        plan = self.plan
+        u = self.sample_uniforms(trial_index) if uniforms is None else uniforms
+
+        likelihood_weight = float(self.likelihood_weights(u[None])[0]) if self.proposal is not None else None
+
+        # choose time, aim and speed, then set initial velocity
+        time_initial, t_initial, v_hat, speed_initial = plan.sample_launch(u)
+        v_initial = speed_initial*v_hat
+
+        # look the landing up, if a landing table covers the launch...
+        p_final = self.landing_lookup.landing(t_initial, v_initial) if self.landing_lookup is not None else None
+        ball_position = None # not stored for looked up trials
+        if p_final is None:
+            # ...o.w. run a trial
+            runner = SimTrialRunner(
+                t_initial, self.tee_position, v_initial, self.arr_windspacetime, plan.timestep,
+                m=plan.m,
+                drag_coef=plan.drag_coef,
+                verbosity=self.verbosity,
+            )
+            runner.run()
+            p_final = runner.p_final
+            ball_position = runner.ball_position
+
+        # log result
         if self.verbosity >= 1:
-            print("[Scientist] Saving Trial...")
-        # make dataframe
-        df = pd.DataFrame(arr_ball_position, columns=['x', 'y', 'z'],)
+            cprint(f"[Scientist] v_i={v_initial}m/s @ t_i={t_initial} --> p_f={p_final}m.", 'red')
+            print(".")
+
+        return {
+            'trial_index': trial_index,
+            'time_initial': time_initial,
+            'direction_initial': list(v_hat), # convert np.array to list for save
+            'speed_initial': speed_initial,
+            'position_initial': list(self.tee_position),
+            'position_final': list(p_final),
+            'likelihood_weight': likelihood_weight,
+            'ball_position': ball_position,
+        }
+
+    def _prepare_trial(self, trial):
+        """Split a simulated trial into its trajectory DataFrame, None if it was looked up, and SimTrial fields"""
+        # make dataframe, of just the sampled steps if sampling
+        import pandas as pd
+        if trial['ball_position'] is None:
+            df = None
+        elif self.trajectory_sampling.get('sampler') is not None:
+            df = sample_trajectory(trial['ball_position'], self.plan.timestep, **self.trajectory_sampling)
+        else:
+            df = pd.DataFrame(trial['ball_position'], columns=['x', 'y', 'z'],)
         
-        # trim parameters to fit SimTrial model
-        params_simtrial = trim_dict(params, list_model_fields(SimTrial))
+        # the experiment's parameters, trimmed to fit SimTrial model once by the plan, and the computed parameters in this trial
+        params_simtrial = self.plan.simtrial_params(trial)
+        params_simtrial['chunk'] = self.chunk
+        params_simtrial['experiment_id'] = self.experiment_id
+        return df, params_simtrial
+
+    def _queue_trial(self, df, params_simtrial):
+        """Queue a trial's blob and simtrial obj with the wrangler, or just the obj if it has no trajectory"""
+        if df is None:
+            return self.wrangler.queue_entry(SimTrial, params_simtrial)
+        return self.wrangler.queue_blob(df, SimTrial, params_simtrial, self.trajectory_precision)
+
+    def save_trial(self, trial):
+        """
+        Queue the blob and simtrial obj for storage then return the simtrial obj. The blob is written in the background and the obj is saved on the wrangler's next flush.
 
-        # add computed parameters in this trial
-        params_simtrial['time_initial'] = self.time_initial
-        params_simtrial['direction_initial'] = list(self.direction_initial) # convert np.array to list for save
-        params_simtrial['speed_initial'] = self.speed_initial
+        Parameters:
+        -------
+        trial: dict
+            A simulated trial, as returned by simulate_trial
+        """
+        if self.verbosity >= 1:
+            print("[Scientist] Saving Trial...")
+        df, params_simtrial = self._prepare_trial(trial)
 
         # save
         if self.verbosity >= 1:
             print("[Scientist] fields:")
             pprint(params_simtrial)
-        simtrial_obj = BlobWrangler().write_blob(df, SimTrial, params_simtrial)
+        simtrial_obj = self._queue_trial(df, params_simtrial)
         
         if self.verbosity >= 1:
-            print("[Scientist] Saved.")
+            print("[Scientist] Queued.")
 
         return simtrial_obj
 
-class ExperimentCollater:
-    """Takes list of SimTrial id's from parallel instances of ExperimentRunner and saves 1 experiment"""
-    def __init__(self, params, chunked_simtrial_ids=None):
+    def save_trials(self, trials):
         """
+        Store the blobs and simtrial objs of many trials in one batch, then return the simtrial objs.
+
         Parameters:
         -------
-        params: dict
-            Experiment parameters to save
-        chunked_simtrial_ids: list of lists
-            List of SimTrial id's to save to experiment
+        trials: list of dict
+            Simulated trials, as returned by simulate_trial
         """
-        self.chunked_simtrial_ids = chunked_simtrial_ids
-        self.params = params
+        if self.verbosity >= 1:
+            print(f"[Scientist] Saving {len(trials)} Trials...")
+        for trial in trials:
+            self._queue_trial(*self._prepare_trial(trial))
+        simtrial_objs = self.wrangler.flush()
 
-        self._collate()
+        if self.verbosity >= 1:
+            print("[Scientist] Saved.")
 
-    def _collate(self, ):
-        """Collate the list of lists in chunked_simtrial_ids into a single list"""
-        self.simtrial_ids = []
-        for list_simtrial_ids in self.chunked_simtrial_ids:
-            self.simtrial_ids = self.simtrial_ids + list_simtrial_ids
-        return self.simtrial_ids
+        return simtrial_objs
 
-    def save_experiment(self, ):
-        # trim parameters to fit SimExperiment model
-        params_experiment = trim_dict(self.params, list_model_fields(SimExperiment))
+    def run_sensitivity(self, perturbations, num_trials=None):
+        """
+        Estimate how the landing statistics respond to each of some parameters, by central finite differences with common random numbers: every trial's uniform random numbers are drawn once and reused by the base parameter set and all its perturbations, so the Monte Carlo noise largely cancels in the differences. Nothing is saved.
 
-        # convert simtrial id's into objects and add to params
-        # simtrial_objs = [SimTrial.objects.get(pk=id) for id in self.simtrial_ids]
-        # params_experiment['simtrials'] = simtrial_objs
-        # params_experiment['simtrials'] = self.simtrial_ids
+        Parameters:
+        -------
+        perturbations: dict
+            Parameter name to step size, h, e.g. {'prob_speed_spread': 0.5, 'drag_coef': 1e-4}. Each parameter is run at its value - h and + h, with the others at their base values. Only parameters that reach the simulation can be perturbed (see ExperimentPlan.simulation_params); others raise ValueError.
+        num_trials: int | None
+            Number of trials per variant. Defaults to params['num_trials'].
 
-        se_obj = SimExperiment.objects.create(**params_experiment)
-        se_obj.simtrials.set(self.simtrial_ids)
-        se_obj.save()
+        Returns:
+        -------
+        result: dict
+            {
+                num_trials: int,
+                trials_paired: int
+                    The trials which landed in every variant, over which all statistics are computed.
+                base: dict
+                    The landing statistics of the base parameter set (see progress.landing_stats).
+                sensitivities: dict
+                    Parameter name to {
+                        step, minus, plus,
+                            The step size and the landing statistics of each perturbation.
+                        d_landing_mean, d_landing_mean_se,
+                            The derivative of the mean landing position (x, y) and its standard error, from the paired per-trial differences.
+                        d_landing_std, d_landing_spread,
+                            The derivatives of the landing standard deviation (x, y) and spread.
+                    }
+            }
+        """
+        from simulator.models import SimExperiment
+        N = num_trials or self.params['num_trials']
+
+        # perturbing a parameter the simulation never reads would report a spurious zero
+        inputs = self.plan.simulation_params()
+        for name in perturbations:
+            if name not in inputs:
+                raise ValueError(f"Parameter {name!r} doesn't reach the simulation, so has no sensitivity. Choose from {sorted(inputs)}.")
+
+        # a runner per variant, sharing the wind
+        variants = {'base': self}
+        for name, h in perturbations.items():
+            value = self.params.get(name)
+            if value is None:
+                value = SimExperiment._meta.get_field(name).get_default()
+            if value is None:
+                raise ValueError(f"Parameter {name!r} has no value to perturb.")
+            for sign, key in [(-1, 'minus'), (1, 'plus')]:
+                params = {**self.params, name: value + sign*h, 'verbosity': 0}
+                variants[(name, key)] = ExperimentRunner(params, arr_windspacetime=self.arr_windspacetime)
+
+        # the same uniforms through each variant's sampling and integration
+        landings = np.empty((len(variants), N, 2))
+        for n in range(N):
+            trial_index = self.trial_start + n
+            u = self.sample_uniforms(trial_index)
+            for v, runner in enumerate(variants.values()):
+                landings[v, n] = runner.simulate_trial(trial_index, u)['position_final'][:2]
+        landings = dict(zip(variants, landings))
+
+        # compare trials which landed in every variant
+        paired = ~np.isnan(np.stack(list(landings.values()))).any(axis=(0, 2))
+        if not paired.any():
+            raise ValueError("No trial landed in every variant; try a longer wind spacetime.")
+        stats = {key: landing_stats(xy[paired]) for key, xy in landings.items()}
+        sensitivities = {}
+        for name, h in perturbations.items():
+            minus, plus = stats[(name, 'minus')], stats[(name, 'plus')]
+            d = (landings[(name, 'plus')][paired] - landings[(name, 'minus')][paired]) / (2*h) # per-trial derivatives
+            sensitivities[name] = {
+                'step': h,
+                'minus': minus,
+                'plus': plus,
+                'd_landing_mean': d.mean(axis=0).tolist(),
+                'd_landing_mean_se': (d.std(axis=0, ddof=1) / np.sqrt(d.shape[0])).tolist() if d.shape[0] > 1 else None,
+                'd_landing_std': ((np.array(plus['landing_std']) - np.array(minus['landing_std'])) / (2*h)).tolist(),
+                'd_landing_spread': (plus['landing_spread'] - minus['landing_spread']) / (2*h),
+            }
+        return {
+            'num_trials': N,
+            'trials_paired': int(paired.sum()),
+            'base': stats['base'],
+            'sensitivities': sensitivities,
+        }
+
+class ExperimentCollater:
+    """Creates a SimExperiment before its chunks run, then completes it once they have. Each ExperimentRunner links its trials to the experiment as it saves them, so collation is O(chunks) rather than O(trials)."""
+    def __init__(self, experiment_id, chunk_snapshots=None):
+        """
+        Parameters:
+        -------
+        experiment_id: str
+            The id of the SimExperiment, from create_experiment.
+        chunk_snapshots: list of dict | None
+            The final progress snapshot of each chunk (see ProgressTracker.snapshot).
+        """
+        self.experiment_id = experiment_id
+        self.chunk_snapshots = chunk_snapshots or []
 
-        return se_obj
\ No newline at end of file
+    @staticmethod
+    def create_experiment(params):
+        """Create and return the SimExperiment for the given experiment parameters, for runners to link their trials to via params['experiment_id']"""
+        # trim parameters to fit SimExperiment model
+        params_experiment = trim_dict(params, list_model_fields(SimExperiment))
+        return SimExperiment.objects.create(**params_experiment)
+
+    def save_experiment(self, ):
+        """Mark the experiment complete, checking every chunk ran all its trials, and return it. Also stores the estimated probability of landing in the target, if any."""
+        from django.utils import timezone
+        se_obj = SimExperiment.objects.get(pk=self.experiment_id)
+        if self.chunk_snapshots:
+            progress = merge_snapshots(self.chunk_snapshots)
+            if progress['trials_done'] != se_obj.num_trials:
+                raise AssertionError(f'Experiment {self.experiment_id} ran {progress["trials_done"]} of its {se_obj.num_trials} trials')
+            se_obj.target_probability = progress.get('target_probability')
+            se_obj.target_probability_se = progress.get('target_probability_se')
+        se_obj.completed_at = timezone.now()
+        se_obj.save(update_fields=['completed_at', 'target_probability', 'target_probability_se', 'modified_at'])
+
+        return se_obj
@@ -1,12 +1,8 @@
 """The core algorithm for simulation trials"""
 
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-from pprint import pprint
 
-from simulator.models import SimTrial
-from commons.wranglers import BlobWrangler
+# N.B. pandas and matplotlib are imported where used, keeping this module light for workers
 
 class SimTrialRunner:
     """Takes raw inputs and simulates a single ball trajectory using physics"""
@@ -34,6 +30,10 @@ class SimTrialRunner:
             The wind velocity data
         timestep: float
             delta_t, the time interval between each row of wind speeds, and between simulation compute steps
+        m: float
+            The mass of the ball (kg)
+        drag_coef: float
+            Quadratic drag, F = -drag_coef*|v_rel|*v_rel, where v_rel is the ball's velocity relative to the wind, so drag_coef lumps together air density, drag coefficient and cross-section (kg/m)
         """
         print(f'[SimTrialRunner] Preparing parameters...')
         self.t_initial = t_initial
@@ -82,6 +82,9 @@ class SimTrialRunner:
         prev_v = self.ball_velocity[t-1,:]
         dv_wind = self.windspeed[t,:] - self.windspeed[t-1,:]
         cur_v = prev_v + dv_wind + self.g*np.array([0,0,-1])*self.timestep # a = dv/dt --> dv = dv_wind + dv_grav = dv_wind + a*dt --> vf = vi + dv_wind + a*dt
+        if self.drag_coef:
+            v_rel = prev_v - self.windspeed[t-1,:] # drag acts on the velocity relative to the air, not the ground
+            cur_v = cur_v - self.drag_coef/self.m*np.linalg.norm(v_rel)*v_rel*self.timestep # dv_drag = F/m*dt
         self.ball_velocity[t,:] = cur_v
 
         if self.verbosity >= 2:
@@ -99,9 +102,12 @@ class SimTrialRunner:
         if self.verbosity >= 2:
             print(f'[SimTrialRunner] set.')
 
-    def run(self,):
-        if self.verbosity >= 1:
-            print(f'[SimTrialRunner] Running trial...')
+    def is_constant_wind(self,):
+        """Whether the wind is a broadcast view of one row (see winds.generators.ConstantGenerator), so the trajectory has a closed form"""
+        return self.windspeed.ndim == 2 and self.windspeed.strides[0] == 0 and self.windspeed.dtype == np.float64
+
+    def run_steps(self,):
+        """Step through the trajectory one timestep at a time, till the ball hits ground or windspacetime runs out. Returns (t, ball_hit_ground)."""
         # init trajectory data
         self.init_ball_trajectory()
 
@@ -118,6 +124,54 @@ class SimTrialRunner:
             if self.ball_position[t,2] <= 0: # hits ground (z <= 0)
                 ball_hit_ground = True
             t += 1
+        return t, ball_hit_ground
+
+    def landing_horizon(self,):
+        """Estimate of the number of rows the trajectory takes to hit the ground in constant wind, from the closed form of the discrete steps, plus a margin for float error"""
+        max_t = self.windspeed.shape[0]
+        # z[n] = z0 + dt*(n*vz0 - g*dt*n*(n-1)/2)  -->  A*n^2 - b*n - z0 = 0
+        A = self.g*self.timestep**2/2
+        if A <= 0:
+            return max_t
+        b = self.timestep*self.v_initial[2] + A
+        n = (b + np.sqrt(max(b**2 + 4*A*self.p_initial[2], 0)))/(2*A)
+        return int(min(max_t, self.t_initial + np.ceil(n) + 3))
+
+    def run_constant_wind(self, horizon):
+        """
+        Compute the trajectory in constant wind up to row horizon as running sums, vectorized. The wind doesn't change, so each step adds the same dv = g*dt, and the sums are taken in the same order as set_velocity_t and set_position_t, so results are bit-identical to run_steps. Returns (t, ball_hit_ground).
+        """
+        n = horizon - self.t_initial
+        steps = np.empty((max(n, 1), 3))
+        steps[0] = self.v_initial
+        steps[1:] = self.g*np.array([0,0,-1])*self.timestep
+        velocity = np.cumsum(steps, axis=0)
+        steps[0] = self.p_initial
+        steps[1:] = velocity[:-1]*self.timestep
+        position = np.cumsum(steps, axis=0)
+
+        hits = np.flatnonzero(position[1:n,2] <= 0) # hits ground (z <= 0)
+        ball_hit_ground = hits.size > 0
+        t = self.t_initial + 2 + int(hits[0]) if ball_hit_ground else self.t_initial + max(n, 1)
+
+        self.ball_position = np.full((t, 3), np.nan)
+        self.ball_position[self.t_initial:] = position[:t-self.t_initial]
+        self.ball_velocity = np.full((t, 3), np.nan)
+        self.ball_velocity[self.t_initial:] = velocity[:t-self.t_initial]
+        return t, ball_hit_ground
+
+    def run(self,):
+        if self.verbosity >= 1:
+            print(f'[SimTrialRunner] Running trial...')
+
+        if self.is_constant_wind() and not self.drag_coef:
+            # fast path: no wind I/O per step, and only the rows up to the estimated landing are computed
+            horizon = self.landing_horizon()
+            t, ball_hit_ground = self.run_constant_wind(horizon)
+            if not ball_hit_ground and horizon < self.windspeed.shape[0]:
+                t, ball_hit_ground = self.run_constant_wind(self.windspeed.shape[0])
+        else:
+            t, ball_hit_ground = self.run_steps()
 
         if self.verbosity >= 1:
             print(f'[SimTrialRunner] ====================================')
@@ -163,15 +217,17 @@ class SimTrialRunner:
 
     def to_df(self,):
         """After self.run, convert ball trajectory to a pd.DataFrame"""
+        import pandas as pd
         return pd.DataFrame({
             'x': self.ball_position[:,0],
             'y': self.ball_position[:,1],
             'z': self.ball_position[:,2],
             },
-            index=self.dt*np.array(range(self.ball_position.shape[0])),
+            index=self.timestep*np.array(range(self.ball_position.shape[0])),
         )
 
     def _plot1D(self, arr):
+        import matplotlib.pyplot as plt
         plt.plot(arr)
         plt.show
 
@@ -189,6 +245,7 @@ class SimTrialRunner:
 
     def plot3d(self,):
         """show a 3D parametric plot of ball position, (x, y, z), over t"""
+        import matplotlib.pyplot as plt
         # setup x,y,z
         x = self.ball_position[:,0]
         y = self.ball_position[:,1]
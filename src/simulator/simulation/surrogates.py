@@ -0,0 +1,176 @@
+"""Surrogate models of landing position, for answering what-if queries without simulating"""
+from functools import lru_cache
+from itertools import combinations_with_replacement
+
+import numpy as np
+
+from django.conf import settings
+
+from .sim import SimTrialRunner
+from .scientists import ExperimentRunner
+from simulator.models import LandingSurrogate
+from winds.caches import get_wind_array
+
+def launch_features(time_initial, direction_initial, speed_initial):
+    """The inputs a surrogate is fitted on: launch time and initial velocity (vx, vy, vz), shape=(n, 4)"""
+    time_initial = np.asarray(time_initial, dtype=np.float64).reshape(-1, 1)
+    direction_initial = np.asarray(direction_initial, dtype=np.float64).reshape(-1, 3)
+    speed_initial = np.asarray(speed_initial, dtype=np.float64).reshape(-1, 1)
+    return np.hstack([time_initial, speed_initial*direction_initial])
+
+class PolynomialSurrogate:
+    """
+    Landing (x, y) as a polynomial of the launch features (see launch_features), fitted by least squares.
+
+    Its error bound is a quantile of the landing position error under k-fold cross-validation, so it holds for queries like the training launches, i.e. within the training domain. Queries outside it are flagged as extrapolated.
+    """
+    error_quantile = .95
+    num_folds = 5
+
+    def __init__(self, degree, feature_mean, feature_scale, feature_min, feature_max, coef, error_bound=None, error_rmse=None, num_samples=None):
+        """
+        Parameters:
+        -------
+        degree: int
+            The degree of the polynomial.
+        feature_mean, feature_scale: np.array
+            Standardization of the features, shape=(4,).
+        feature_min, feature_max: np.array
+            The training domain, shape=(4,).
+        coef: np.array
+            Coefficient of each monomial (see monomials) for x and y, shape=(num_monomials, 2).
+        error_bound: float
+            Landing position error (m) not exceeded by error_quantile of cross-validated predictions.
+        error_rmse: list
+            Cross-validated root mean squared error of x and y (m).
+        num_samples: int
+            Number of landed trials fitted on.
+        """
+        self.degree = degree
+        self.feature_mean = np.asarray(feature_mean, dtype=np.float64)
+        self.feature_scale = np.asarray(feature_scale, dtype=np.float64)
+        self.feature_min = np.asarray(feature_min, dtype=np.float64)
+        self.feature_max = np.asarray(feature_max, dtype=np.float64)
+        self.coef = np.asarray(coef, dtype=np.float64).reshape(-1, 2)
+        self.error_bound = error_bound
+        self.error_rmse = error_rmse
+        self.num_samples = num_samples
+
+    @staticmethod
+    def monomials(degree, num_features=4):
+        """The monomials up to degree, as tuples of feature indices, in a fixed order"""
+        return [combo for k in range(degree+1) for combo in combinations_with_replacement(range(num_features), k)]
+
+    @classmethod
+    def design_matrix(cls, z, degree):
+        """Evaluate every monomial of standardized features z, shape=(n, 4), returning shape=(n, num_monomials)"""
+        return np.stack([np.prod(z[:, list(combo)], axis=1) for combo in cls.monomials(degree, z.shape[1])], axis=1)
+
+    @classmethod
+    def lstsq(cls, z, xy, degree):
+        return np.linalg.lstsq(cls.design_matrix(z, degree), xy, rcond=None)[0]
+
+    @classmethod
+    def fit(cls, features, xy, degree=3):
+        """
+        Fit to landed trials.
+
+        Parameters:
+        -------
+        features: np.array
+            Launch features of the trials, shape=(n, 4).
+        xy: np.array
+            Their landing positions, shape=(n, 2).
+        degree: int
+            The degree of the polynomial.
+        """
+        features = np.asarray(features, dtype=np.float64)
+        xy = np.asarray(xy, dtype=np.float64)
+        n = features.shape[0]
+        num_monomials = len(cls.monomials(degree, features.shape[1]))
+        if n < 2*num_monomials:
+            raise ValueError(f'A degree {degree} surrogate needs at least {2*num_monomials} landed trials, got {n}.')
+
+        mean = features.mean(axis=0)
+        scale = features.std(axis=0)
+        scale[scale == 0] = 1 # e.g. a fixed launch time
+        z = (features - mean)/scale
+
+        # k-fold cross-validation, for the error bound
+        folds = np.array_split(np.random.default_rng(0).permutation(n), cls.num_folds)
+        residuals = np.empty_like(xy)
+        for fold in folds:
+            train = np.ones(n, dtype=bool)
+            train[fold] = False
+            coef = cls.lstsq(z[train], xy[train], degree)
+            residuals[fold] = xy[fold] - cls.design_matrix(z[fold], degree) @ coef
+
+        return cls(
+            degree, mean, scale, features.min(axis=0), features.max(axis=0),
+            cls.lstsq(z, xy, degree),
+            error_bound=float(np.quantile(np.linalg.norm(residuals, axis=1), cls.error_quantile)),
+            error_rmse=np.sqrt((residuals**2).mean(axis=0)).tolist(),
+            num_samples=n,
+        )
+
+    def in_domain(self, features):
+        """Whether each query lies within the training domain, shape=(n,)"""
+        return ((features >= self.feature_min) & (features <= self.feature_max)).all(axis=1)
+
+    def predict(self, features):
+        """Landing (x, y) of launches, shape=(n, 2)"""
+        z = (np.asarray(features, dtype=np.float64) - self.feature_mean)/self.feature_scale
+        return self.design_matrix(z, self.degree) @ self.coef
+
+def training_data(simtrials):
+    """Launch features and landing positions, shapes (n, 4) and (n, 2), of the trials in a SimTrial queryset that landed"""
+    rows = list(simtrials.values_list('time_initial', 'direction_initial', 'speed_initial', 'position_final'))
+    if not rows:
+        return np.empty((0, 4)), np.empty((0, 2))
+    time_initial, direction_initial, speed_initial, position_final = zip(*rows)
+    features = launch_features(time_initial, direction_initial, speed_initial)
+    xy = np.array(position_final, dtype=np.float64)[:, :2]
+    landed = ~np.isnan(xy).any(axis=1)
+    return features[landed], xy[landed]
+
+def sweep_training_data(sim_params, num_samples):
+    """
+    Launch features and landing positions of a training sweep: num_samples trials sampled as an experiment with sim_params would, simulated without being stored. Only the ones that landed are returned.
+    """
+    runner = ExperimentRunner({**sim_params, 'num_trials': num_samples, 'verbosity': 0})
+    trials = [runner.simulate_trial(n) for n in range(num_samples)]
+    features = launch_features(
+        [trial['time_initial'] for trial in trials],
+        [trial['direction_initial'] for trial in trials],
+        [trial['speed_initial'] for trial in trials],
+    )
+    xy = np.array([trial['position_final'][:2] for trial in trials], dtype=np.float64)
+    landed = ~np.isnan(xy).any(axis=1)
+    return features[landed], xy[landed]
+
+def get_surrogate(surrogate_id):
+    """Given a LandingSurrogate id, return its PolynomialSurrogate, built on first use"""
+    return _get_surrogate(surrogate_id.__str__())
+
+@lru_cache(maxsize=settings.SURROGATE_CACHE_SIZE)
+def _get_surrogate(surrogate_id):
+    o = LandingSurrogate.objects.get(pk=surrogate_id)
+    return PolynomialSurrogate(
+        o.degree, o.feature_mean, o.feature_scale, o.feature_min, o.feature_max, o.coef,
+        error_bound=o.error_bound, error_rmse=o.error_rmse, num_samples=o.num_samples,
+    )
+
+def simulate_landings(surrogate_obj, features):
+    """Landing (x, y) of launches by simulation, for queries the surrogate can't answer within tolerance, shape=(n, 2)"""
+    arr_windspacetime = get_wind_array(surrogate_obj.windspacetime_id, timestep=surrogate_obj.timestep)
+    xy = np.empty((features.shape[0], 2))
+    for i, (time_initial, *v_initial) in enumerate(features):
+        runner = SimTrialRunner(
+            int(np.round(time_initial/surrogate_obj.timestep)), ExperimentRunner.tee_position, np.array(v_initial), arr_windspacetime, surrogate_obj.timestep,
+            m=surrogate_obj.m,
+            drag_coef=surrogate_obj.drag_coef,
+            verbosity=0,
+        )
+        runner.run()
+        xy[i] = runner.p_final[:2]
+    return xy
@@ -1,21 +1,48 @@
 from celery import shared_task
+from celery.signals import worker_init
+from django.db import connections, InterfaceError, OperationalError
 
 from .simulation.scientists import ExperimentRunner, ExperimentCollater
+from .simulation.lookups import build_landing_table
+from winds.caches import preload_wind_cache
 
-@shared_task
-def runExperimentTask(sim_params: dict) -> list:
-    "Runs a SimExperiment, returning the resulting simtrial ids."
-    runner = ExperimentRunner(sim_params)
-    simtrial_ids = runner.run_experiment()
-    return simtrial_ids
+@worker_init.connect
+def warmUpWorker(**kwargs):
+    """Preload the wind cache in the parent worker process, so pool children forked from it share the arrays instead of each loading them"""
+    preload_wind_cache()
+    # don't let forked children inherit the parent's db connection
+    connections.close_all()
 
-@shared_task
-def pollExperimentsThenCollateTask(poll_task_ids: list , sim_params: dict,) -> str:
-    """Polls parallel experiment run chunks till all complete, then collates their simtrial ids and saves the simexperiment, returning the simexperiment id."""
-    # TO DO --> write poll logic here....
-    chunked_simtrial_ids = ...
+@shared_task(
+    bind=True,
+    acks_late=True, # redeliver the chunk if the worker dies mid-run...
+    reject_on_worker_lost=True,
+    autoretry_for=(OperationalError, InterfaceError, OSError), # ...or retry it on transient db or storage errors, resuming from the chunk's last checkpoint; bad params or a missing wind spacetime fail at once
+    max_retries=3,
+    retry_backoff=True,
+)
+def runExperimentTask(self, sim_params: dict, chunk_id: str) -> dict:
+    "Runs a SimExperiment chunk, returning its final progress snapshot. Publishes progress as the task's PROGRESS state meta while running."
+    def publish_progress(snapshot):
+        self.update_state(state='PROGRESS', meta=snapshot)
+
+    runner = ExperimentRunner(sim_params, progress_callback=publish_progress, chunk_id=chunk_id)
+    runner.run_experiment()
+    # the trials are linked to their experiment in the db, so just the progress is returned
+    return {
+        'progress': runner.progress.snapshot(),
+    }
 
-    collater = ExperimentCollater(sim_params, chunked_simtrial_ids)
+@shared_task
+def collateExperimentTask(chunk_results: list, experiment_id: str,) -> str:
+    """Runs as the callback of a chord over parallel experiment run chunks: marks the simexperiment complete, returning its id."""
+    collater = ExperimentCollater(experiment_id, [r['progress'] for r in chunk_results])
     simexperiment_obj = collater.save_experiment()
-    simexperiment_id = simexperiment_obj.id
-    return simexperiment_id
\ No newline at end of file
+    simexperiment_id = simexperiment_obj.id.__str__()
+    return simexperiment_id
+
+@shared_task
+def buildLandingTableTask(windspacetime_id: str, timestep: float, options: dict) -> str:
+    """Precomputes a LandingTable of landings on a wind spacetime at an experiment timestep, validated against the exact solver, returning its id. options are passed to build_landing_table."""
+    landingtable_obj = build_landing_table(windspacetime_id, timestep, ExperimentRunner.tee_position, **options)
+    return landingtable_obj.id.__str__()
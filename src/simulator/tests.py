@@ -1,3 +1,441 @@
-from django.test import TestCase
+import io
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from commons.janitors import BlobJanitor
+from commons.storage import MemoryStorageBackend, get_storage_backend
+from commons.wranglers import BlobWrangler
+from winds.models import WindGenParams, WindSpacetime
+from .models import SimTrial, SimExperiment
+from .simulation.progress import ProgressTracker, merge_snapshots
+from .simulation.plans import ExperimentPlan
+from .views import submit_experiment
+from .simulation.scientists import ExperimentRunner, ExperimentCollater
+from .simulation.executors import LocalExperimentExecutor
+from .simulation.sim import SimTrialRunner
+from .simulation.samplers import sample_trajectory
+from .simulation.probabilities import NormalProbGen, LogNormalProbGen
+from .simulation.surrogates import PolynomialSurrogate, launch_features
+from .simulation.lookups import tabulate_landings, LandingLookup, validate_landings
 
 # Create your tests here.
+class TestProgressTracker(SimpleTestCase):
+    def test_merged_chunks_match_single_run(self,):
+        rng = np.random.default_rng(0)
+        positions = rng.normal(size=(100, 3))
+        positions[5] = np.nan # ball didn't hit ground
+
+        trackers = [ProgressTracker(50), ProgressTracker(50)]
+        for i, p in enumerate(positions):
+            trackers[i // 50].update(p)
+        merged = merge_snapshots([t.snapshot() for t in trackers])
+
+        landed = positions[~np.isnan(positions[:,0]), :2]
+        self.assertEqual(merged['trials_done'], 100)
+        self.assertEqual(merged['trials_landed'], 99)
+        np.testing.assert_allclose(merged['landing_mean'], landed.mean(axis=0))
+        np.testing.assert_allclose(merged['landing_std'], landed.std(axis=0))
+
+    def test_weighted_merge(self,):
+        rng = np.random.default_rng(1)
+        positions = rng.normal(size=(100, 3))
+        weights = rng.uniform(.1, 10, size=100)
+        trackers = [ProgressTracker(50), ProgressTracker(50)]
+        for i, (p, w) in enumerate(zip(positions, weights)):
+            trackers[i // 50].update(p, w)
+        merged = merge_snapshots([t.snapshot() for t in trackers])
+        mean = np.average(positions[:,:2], axis=0, weights=weights)
+        np.testing.assert_allclose(merged['landing_mean'], mean)
+        np.testing.assert_allclose(merged['landing_std'], np.sqrt(np.average((positions[:,:2] - mean)**2, axis=0, weights=weights)))
+
+    def test_publishes_final_snapshot(self,):
+        published = []
+        tracker = ProgressTracker(3, publish=published.append, publish_interval=3600)
+        for _ in range(3):
+            tracker.update([1.0, 2.0, 0.0])
+        # first trial and last trial publish, the rest are throttled
+        self.assertEqual([s['trials_done'] for s in published], [1, 3])
+
+class TestSplitTrials(SimpleTestCase):
+    def test_chunks_cover_all_trials_contiguously(self,):
+        chunks = ExperimentRunner.split_trials(20, 7)
+        self.assertEqual(chunks[0], (0, 3))
+        self.assertEqual(chunks[-1], (18, 2))
+        trial_indices = [start + n for start, count in chunks for n in range(count)]
+        self.assertEqual(trial_indices, list(range(20)))
+
+    def test_more_chunks_than_trials(self,):
+        self.assertEqual(ExperimentRunner.split_trials(2, 4), [(0, 1), (1, 1)])
+
+    def test_chunks_reproduce_the_whole_experiment(self,):
+        t = .01*np.arange(3001)[:,None]
+        wind = np.array([2., -1, 0]) + np.sin(t*[1.3, 2.1, 3.7])*[1.5, 1, .5]
+        def trials(start, count):
+            runner = ExperimentRunner({**SIM_PARAMS, 'num_trials': count, 'trial_start': start}, arr_windspacetime=wind)
+            return [runner.simulate_trial(runner.trial_start + n) for n in range(runner.params['num_trials'])]
+        whole = trials(0, 30)
+        chunked = [trial for start, count in ExperimentRunner.split_trials(30, 4) for trial in trials(start, count)]
+        for k in ['time_initial', 'direction_initial', 'speed_initial', 'position_final']:
+            np.testing.assert_array_equal([trial[k] for trial in chunked], [trial[k] for trial in whole])
+
+class TestConstantWindFastPath(SimpleTestCase):
+    def test_matches_stepping_exactly(self,):
+        wind = np.broadcast_to(np.array([2., -1., .5]), (2000, 3))
+        for v_initial in [np.array([30., 5., 20.]), np.array([1., 0., -1.]), np.array([0., 0., 1e4])]: # lands, lands at once, outlasts the wind
+            fast = SimTrialRunner(3, np.zeros(3), v_initial, wind, 0.01, verbosity=0)
+            steps = SimTrialRunner(3, np.zeros(3), v_initial, np.array(wind), 0.01, verbosity=0)
+            self.assertTrue(fast.is_constant_wind())
+            self.assertFalse(steps.is_constant_wind())
+            np.testing.assert_array_equal(fast.run(), steps.run())
+            np.testing.assert_array_equal(fast.p_final, steps.p_final)
+
+class TestDrag(SimpleTestCase):
+    def test_drifting_with_the_wind_feels_no_drag(self,):
+        wind = np.broadcast_to(np.array([5., -2., 0.]), (500, 3))
+        runner = SimTrialRunner(0, np.array([0., 0., 10.]), wind[0], wind, 0.01, g=0, drag_coef=.01, verbosity=0)
+        ball_position = runner.run()
+        np.testing.assert_allclose(ball_position, np.array([0., 0., 10.]) + np.arange(500)[:,None]*0.01*wind[0], rtol=0, atol=1e-12)
+        # while a ball at rest in the air is blown along by drag
+        runner = SimTrialRunner(0, np.array([0., 0., 10.]), np.zeros(3), np.array(wind), 0.01, g=0, drag_coef=.01, verbosity=0)
+        self.assertGreater(runner.run()[-1,0], 0)
+
+class TestProbGens(SimpleTestCase):
+    def test_normal_quantiles_and_truncation(self,):
+        inv = NormalProbGen(x_center=15, x_spread=2).generate_inv_fn()
+        self.assertAlmostEqual(inv(0.5), 15)
+        self.assertAlmostEqual(inv(0.8413447460685429), 17)
+        inv = NormalProbGen(x_min=14, x_max=20, x_center=15, x_spread=2).generate_inv_fn()
+        self.assertAlmostEqual(inv(0), 14)
+        self.assertAlmostEqual(inv(1), 20)
+        self.assertAlmostEqual(LogNormalProbGen(x_center=15, x_spread=.5).generate_inv_fn()(0.5), 15)
+
+SIM_PARAMS = { # an experiment's trials on a constant wind, which the simulation runs in closed form
+    'windspacetime_id': None, 'num_trials': 30, 'seed': 11, 'timestep': 0.01, 'verbosity': 0,
+    'prob_speed_fn_name': 'Normal', 'prob_speed_min': 5, 'prob_speed_max': 25, 'prob_speed_center': 15, 'prob_speed_spread': 2,
+    'prob_timing_fn_name': 'Uniform', 'prob_timing_min': 0, 'prob_timing_max': 1, 'prob_timing_center': None, 'prob_timing_spread': None,
+    'prob_aiming_fn_name': 'Uniform', 'prob_aiming_geometry': 'Spherical',
+    'prob_aiming_X1_min': 0, 'prob_aiming_X1_max': .5, 'prob_aiming_X1_center': None, 'prob_aiming_X1_spread': None,
+    'prob_aiming_X2_min': .6, 'prob_aiming_X2_max': 1, 'prob_aiming_X2_center': None, 'prob_aiming_X2_spread': None,
+    'prob_aiming_X3_min': 0, 'prob_aiming_X3_max': 1, 'prob_aiming_X3_center': None, 'prob_aiming_X3_spread': None,
+}
+
+class TestSensitivity(SimpleTestCase):
+    def setUp(self,):
+        self.params = dict(SIM_PARAMS)
+        self.wind = np.broadcast_to(np.array([1., .5, 0]), (1001, 3))
+
+    def test_common_random_numbers(self,):
+        runner = ExperimentRunner(self.params, arr_windspacetime=self.wind)
+        result = runner.run_sensitivity({'prob_speed_center': .5})
+        self.assertEqual(result['trials_paired'], 30)
+        # the base variant is the experiment itself
+        xy = np.array([runner.simulate_trial(n)['position_final'][:2] for n in range(30)])
+        np.testing.assert_allclose(result['base']['landing_mean'], xy.mean(axis=0))
+        # faster balls fly further, precisely
+        d = result['sensitivities']['prob_speed_center']
+        self.assertGreater(d['d_landing_mean'][0], 20*d['d_landing_mean_se'][0])
+        # without drag, the mass has no effect, so isn't an input
+        with self.assertRaises(ValueError):
+            runner.run_sensitivity({'m': .001})
+        self.assertIn('m', ExperimentRunner({**self.params, 'drag_coef': .01}, arr_windspacetime=self.wind).plan.simulation_params())
+        # parameters the simulation never reads are refused, rather than reported as exactly 0
+        for name in ['g', 'prob_timing_spread', 'prob_aiming_X3_max']:
+            with self.assertRaises(ValueError):
+                runner.run_sensitivity({name: .1})
+
+    def test_importance_sampling(self,):
+        # a target in the tail of the landing distribution, ~2.5 standard deviations downrange
+        runner = ExperimentRunner(self.params, arr_windspacetime=self.wind)
+        xy = np.array([runner.simulate_trial(n)['position_final'][:2] for n in range(4000)])
+        target = xy.mean(axis=0) + [2*xy.std(axis=0)[0], 0]
+        hits = np.linalg.norm(xy - target, axis=1) <= 2
+        p_nominal, se_nominal = hits.mean(), hits.std()/np.sqrt(hits.size)
+
+        params = {**self.params, 'target_position': target.tolist(), 'target_radius': 2, 'importance_sampling': True, 'ce_trials': 200}
+        runner = ExperimentRunner(params, arr_windspacetime=self.wind)
+        a, b = runner.fit_proposal()
+        # the likelihood weights are bounded by the defensive mixture
+        u = runner.sample_proposal(np.random.default_rng(0), 1000)
+        self.assertLessEqual(runner.likelihood_weights(u).max(), 1/runner.importance_defaults['defensive_fraction'])
+
+        progress = ProgressTracker(500, target=runner.target)
+        for n in range(500):
+            trial = runner.simulate_trial(n)
+            progress.update(trial['position_final'], trial['likelihood_weight'])
+        snapshot = progress.snapshot()
+        # unbiased, and far more precise per trial than nominal sampling
+        self.assertLess(abs(snapshot['target_probability'] - p_nominal), 4*np.hypot(snapshot['target_probability_se'], se_nominal))
+        self.assertLess(snapshot['target_probability_se'], se_nominal)
+        # the landing statistics are weighted too, describing the experiment rather than the proposal
+        self.assertLess(abs(snapshot['landing_mean'][0] - xy.mean(axis=0)[0]), .5*xy.std(axis=0)[0])
+
+class TestExperimentPlan(SimpleTestCase):
+    def test_pickled_plan(self,):
+        wind = np.broadcast_to(np.array([1., .5, 0]), (1001, 3))
+        plan = ExperimentPlan.from_params(SIM_PARAMS)
+        plan_copy = pickle.loads(pickle.dumps(plan))
+        self.assertEqual(plan_copy.seed, 11)
+        # a runner given the plan, e.g. in a worker, simulates the same trials
+        trial = ExperimentRunner(SIM_PARAMS, arr_windspacetime=wind).simulate_trial(3)
+        trial_copy = ExperimentRunner(SIM_PARAMS, arr_windspacetime=wind, plan=plan_copy).simulate_trial(3)
+        self.assertEqual(trial['position_final'], trial_copy['position_final'])
+
+    def test_invalid_params(self,):
+        with self.assertRaises(AssertionError):
+            ExperimentPlan.from_params({k: v for k, v in SIM_PARAMS.items() if k != 'timestep'})
+        for invalid in [{'timestep': 0}, {'num_trials': -1}, {'prob_aiming_geometry': 'Cylindrical'}, {'prob_speed_fn_name': 'Cauchy'}, {'prob_speed_spread': None}, {'prob_timing_max': None}, {'m': 0}]:
+            with self.assertRaises(ValueError):
+                ExperimentPlan.from_params({**SIM_PARAMS, **invalid})
+
+    def test_invalid_target(self,):
+        target = {'target_position': [30, 0], 'target_radius': 2, 'importance_sampling': True}
+        ExperimentPlan.from_params({**SIM_PARAMS, **target, 'defensive_fraction': 0})
+        for invalid in [
+            {'target_position': [30, 0, 0]},
+            {'target_radius': 0},
+            {'target_position': None},
+            {'defensive_fraction': 1},
+            {'defensive_fraction': -.1},
+            {'ce_elite_fraction': 0},
+            {'ce_elite_fraction': 1},
+            {'ce_trials': 0},
+            {'ce_trials': 2.5},
+            {'ce_max_iterations': -1},
+        ]:
+            with self.subTest(**invalid), self.assertRaises(ValueError):
+                ExperimentPlan.from_params({**SIM_PARAMS, **target, **invalid})
+
+class TestTrajectorySampling(SimpleTestCase):
+    def setUp(self,):
+        t = np.arange(3001)*.001
+        wind = np.stack([3*np.sin(2*t), np.cos(5*t), .5*np.sin(3*t)], axis=1)
+        runner = SimTrialRunner(500, np.array([0., 0., 10.]), np.array([10., 2., 15.]), wind, .001, verbosity=0)
+        self.ball_position = runner.run()
+        self.steps = self.ball_position[500:]
+
+    def test_rdp(self,):
+        df = sample_trajectory(self.ball_position, .001, sampler='rdp', tolerance=1e-3)
+        self.assertLess(len(df), len(self.steps)/10)
+        # the launch, apex and landing are kept, with their times
+        np.testing.assert_array_equal(df[['x', 'y', 'z']].to_numpy()[[0, -1]], self.steps[[0, -1]])
+        self.assertEqual(df['z'].max(), self.steps[:,2].max())
+        self.assertAlmostEqual(df['t'].iloc[0], .5)
+        # interpolating the kept steps over time reproduces every step within tolerance
+        t = (np.arange(len(self.steps)) + 500)*.001
+        xyz = np.stack([np.interp(t, df['t'], df[c]) for c in ['x', 'y', 'z']], axis=1)
+        self.assertLessEqual(np.linalg.norm(xyz - self.steps, axis=1).max(), 1e-3)
+
+    def test_stride(self,):
+        df = sample_trajectory(self.ball_position, .001, sampler='stride', stride=100)
+        apex = int(np.argmax(self.steps[:,2]))
+        self.assertEqual(len(df), len(set(range(0, len(self.steps), 100)) | {apex, len(self.steps)-1}))
+        np.testing.assert_array_equal(df[['x', 'y', 'z']].to_numpy()[-1], self.steps[-1])
+        with self.assertRaises(ValueError):
+            sample_trajectory(self.ball_position, .001, sampler='stride')
+
+class TestSurrogate(SimpleTestCase):
+    def landings(self, runner, trial_indices):
+        trials = [runner.simulate_trial(n) for n in trial_indices]
+        features = launch_features(*([trial[k] for trial in trials] for k in ['time_initial', 'direction_initial', 'speed_initial']))
+        return features, np.array([trial['position_final'][:2] for trial in trials])
+
+    def test_error_bound_holds_out_of_sample(self,):
+        params = {**SIM_PARAMS, 'prob_timing_max': 5}
+        runner = ExperimentRunner(params, arr_windspacetime=np.broadcast_to(np.array([1., .5, 0]), (1001, 3)))
+        S = PolynomialSurrogate.fit(*self.landings(runner, range(400)), degree=3)
+        features, xy = self.landings(runner, range(400, 600))
+        self.assertTrue(S.in_domain(features).mean() > .9)
+        err = np.linalg.norm(S.predict(features) - xy, axis=1)[S.in_domain(features)]
+        self.assertLess(np.quantile(err, .95), 1.5*S.error_bound)
+        self.assertLess(S.error_bound, .05*np.linalg.norm(xy.std(axis=0)))
+        # outside the training domain
+        self.assertFalse(S.in_domain(launch_features(1, [0, 0, 1], 100))[0])
+        with self.assertRaises(ValueError):
+            PolynomialSurrogate.fit(features[:10], xy[:10], degree=3)
+
+class TestLandingTable(SimpleTestCase):
+    def setUp(self,):
+        # gusty wind, vertical included
+        t = .01*np.arange(2001)[:,None]
+        self.wind = np.array([2., -1, 0]) + np.sin(t*[1.3, 2.1, 3.7] + [0, 1, 2])*[1.5, 1, .5]
+        self.p_initial = np.array([0., 0, 10])
+
+    def test_exact_at_nodes(self,):
+        table = tabulate_landings(self.wind, .01, self.p_initial, np.arange(50, 60), np.linspace(-10, 30, 5))
+        lookup = LandingLookup(table, 50, -10, 30, self.p_initial)
+        for t_initial, v_initial in [(50, [3., -2, 20]), (57, [-8., 4, -10]), (59, [0., 12, 0])]:
+            runner = SimTrialRunner(t_initial, self.p_initial, np.array(v_initial), self.wind, .01, verbosity=0)
+            runner.run()
+            np.testing.assert_allclose(lookup.landing(t_initial, v_initial), runner.p_final, atol=1e-9)
+        # outside the table
+        self.assertIsNone(lookup.landing(60, [0., 0, 0]))
+        self.assertIsNone(lookup.landing(55, [0., 0, 31]))
+
+    def test_interpolation_validated(self,):
+        table = tabulate_landings(self.wind, .01, self.p_initial, np.arange(0, 1000), np.linspace(-10, 30, 161))
+        max_error, num_validated = validate_landings(LandingLookup(table, 0, -10, 30, self.p_initial), self.wind, .01, 100)
+        self.assertEqual(num_validated, 100)
+        self.assertLess(max_error, .01)
+
+class TestCompactTrials(TestCase):
+    def setUp(self,):
+        self.janitor = BlobJanitor(MemoryStorageBackend())
+        # magnitudes vary, so quantized blobs use different int types
+        self.dfs = [pd.DataFrame({c: np.arange(n, dtype=float) * 10**i for c in 'xyz'}) for i, n in enumerate([3, 5, 4])]
+        self.trial_params = {'timestep': .01, 'time_initial': 0, 'direction_initial': [1, 0, 0], 'speed_initial': 1, 'position_initial': [0, 0, 0], 'position_final': [1, 0, 0]}
+
+    def write_experiment(self, precision=None):
+        experiment = SimExperiment.objects.create(timestep=.01, completed_at=timezone.now())
+        self.janitor.wrangler.write_blobs(self.dfs, SimTrial, [{**self.trial_params, 'experiment': experiment, 'trial_index': i} for i in range(3)], precision)
+        return experiment
+
+    def test_packed_trials_read_back(self,):
+        for precision in [None, {'encoding': 'quantize', 'tolerance': 1e-3}]:
+            experiment = self.write_experiment(precision)
+            report = self.janitor.compact(min_blobs=2)
+            self.assertEqual(report['packed'], 3)
+            self.assertEqual(len(report['packs']), 1)
+
+            simtrials = list(experiment.simtrials.order_by('trial_index'))
+            self.assertEqual([o.pack_offset for o in simtrials], [0, 3, 8])
+            for df, read in zip(self.dfs, self.janitor.wrangler.read_blobs(simtrials)):
+                pd.testing.assert_frame_equal(read, df, check_exact=False, atol=1e-3)
+
+        # the packs are still referenced, so nothing is collected
+        self.assertEqual(len(self.janitor.storage.list()), 2)
+        self.assertEqual(self.janitor.collect_garbage()['orphans'], [])
+
+@override_settings(BLOB_STORAGE={'BACKEND': 'commons.storage.MemoryStorageBackend'})
+class TestSimTrialDownload(TestCase):
+    def setUp(self,):
+        get_storage_backend.cache_clear()
+        experiment = SimExperiment.objects.create(timestep=.01, completed_at=timezone.now())
+        # a sampled trajectory, its rows unevenly spaced in time
+        df = pd.DataFrame({'t': [.5, .52, .6, .9], 'x': [0., 1, 2, 3], 'y': 0., 'z': [10., 11, 10, 0]})
+        self.simtrial = BlobWrangler().write_blob(df, SimTrial, {'experiment': experiment, 'trial_index': 0, 'timestep': .01, 'time_initial': .5, 'direction_initial': [1, 0, 0], 'speed_initial': 1, 'position_initial': [0, 0, 10], 'position_final': [3, 0, 0]})
+
+    def tearDown(self,):
+        get_storage_backend.cache_clear()
+
+    def test_windowed_by_time(self,):
+        url = f'/simulator/simtrials/{self.simtrial.id}/download'
+        response = APIClient().get(url, {'start': .51, 'stop': .6})
+        arr = np.load(io.BytesIO(b''.join(response.streaming_content)))
+        np.testing.assert_array_equal(arr[:,0], [.52, .6])
+        for window in [{'start': 'abc'}, {'stop': 'inf'}]:
+            self.assertEqual(APIClient().get(url, window).status_code, 400)
+
+@override_settings(BLOB_STORAGE={'BACKEND': 'commons.storage.MemoryStorageBackend'})
+class TestLocalExperimentExecutor(TransactionTestCase): # the executor closes db connections before forking, which a TestCase's transaction wouldn't survive
+    def setUp(self,):
+        get_storage_backend.cache_clear()
+        gp = WindGenParams.objects.create(is_oscillatory=True, base_velocity=[1, 0, 0], amplitude=[1, 2, .5], frequency=[.1, .2, .3], phase_offset=[0, 1, 2])
+        wind = WindSpacetime.objects.create(generator_name='oscillatory', generator_params=gp, duration=30, timestep=.01)
+        self.params = {**SIM_PARAMS, 'windspacetime_id': wind.id.__str__(), 'num_trials': 20}
+
+    def tearDown(self,):
+        get_storage_backend.cache_clear()
+
+    def persisted(self, experiment_id):
+        simtrials = list(SimTrial.objects.filter(experiment_id=experiment_id).order_by('trial_index'))
+        fields = [[getattr(o, k) for k in ['trial_index', 'time_initial', 'direction_initial', 'speed_initial', 'position_final']] for o in simtrials]
+        return fields, BlobWrangler().read_blobs(simtrials)
+
+    def test_matches_serial_run(self,):
+        payload = LocalExperimentExecutor(max_workers=2).submit(self.params, num_chunks=3)
+        self.assertEqual(payload['seed'], SIM_PARAMS['seed'])
+        self.assertIsNotNone(SimExperiment.objects.get(pk=payload['experiment_id']).completed_at)
+
+        serial = ExperimentCollater.create_experiment(self.params)
+        ExperimentRunner({**self.params, 'experiment_id': serial.id.__str__()}).run_experiment()
+
+        (fields, dfs), (serial_fields, serial_dfs) = self.persisted(payload['experiment_id']), self.persisted(serial.id)
+        self.assertEqual(len(fields), 20)
+        self.assertEqual(fields, serial_fields)
+        for df, serial_df in zip(dfs, serial_dfs):
+            pd.testing.assert_frame_equal(df, serial_df)
+
+    def test_submit_validates_num_chunks(self,):
+        for num_chunks in [0, 21, 1.5]:
+            with self.assertRaises(ValueError):
+                LocalExperimentExecutor(max_workers=2).submit(self.params, num_chunks=num_chunks)
+        self.assertFalse(SimExperiment.objects.exists())
+
+class TestSurrogateViews(TestCase):
+    def setUp(self,):
+        gp = WindGenParams.objects.create(is_oscillatory=True, base_velocity=[1, 0, 0], amplitude=[1, 2, .5], frequency=[.1, .2, .3], phase_offset=[0, 1, 2])
+        self.wind = WindSpacetime.objects.create(generator_name='oscillatory', generator_params=gp, duration=30, timestep=.01)
+        self.client = APIClient()
+
+    def fit(self, sweep):
+        return self.client.post('/simulator/surrogates/', {'windspacetime': self.wind.id.__str__(), 'timestep': .01, 'degree': 2, 'sweep': sweep, 'sweep_trials': 200}, format='json')
+
+    def test_validates_input(self,):
+        for sweep in [['prob_speed_center', 15], 'Normal']:
+            self.assertEqual(self.fit(sweep).status_code, 400)
+        response = self.fit({k: v for k, v in SIM_PARAMS.items() if k.startswith('prob_')})
+        self.assertEqual(response.status_code, 201)
+
+        launch = {'time_initial': .5, 'direction_initial': [.6, 0, .8], 'speed_initial': 15}
+        url = f"/simulator/surrogates/{response.data['id']}/predict/"
+        for max_error in ['abc', 'nan', [1]]:
+            self.assertEqual(self.client.post(url, {'launches': [launch], 'max_error': max_error}, format='json').status_code, 400)
+        response = self.client.post(url, {'launches': [launch], 'max_error': 1e6}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['predictions']), 1)
+
+class TestAsyncViews(TestCase):
+    async def test_result_pages(self,):
+        experiment = await SimExperiment.objects.acreate(timestep=.01, num_trials=3)
+        for i, position_final in enumerate([[1., 2, 0], [np.nan, np.nan, np.nan], [3., 4, 0]]):
+            await SimTrial.objects.acreate(experiment=experiment, trial_index=i, timestep=.01, time_initial=0, direction_initial=[1, 0, 0], speed_initial=1, position_initial=[0, 0, 10], position_final=position_final)
+
+        response = await self.async_client.get(f'/simulator/async/experiments/{experiment.id}/result', {'limit': 2})
+        data = response.json()
+        self.assertFalse(data['completed'])
+        self.assertEqual([t['position_final'] for t in data['trials']], [[1, 2, 0], None])
+        response = await self.async_client.get(f'/simulator/async/experiments/{experiment.id}/result', {'limit': 2, 'after': data['next_after']})
+        data = response.json()
+        self.assertEqual([t['trial_index'] for t in data['trials']], [2])
+        self.assertIsNone(data['next_after'])
+        # malformed paging is rejected, and a non-positive limit still returns a trial per page
+        response = await self.async_client.get(f'/simulator/async/experiments/{experiment.id}/result', {'limit': 'x'})
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get(f'/simulator/async/experiments/{experiment.id}/result', {'limit': 0})
+        self.assertEqual(len(response.json()['trials']), 1)
+
+    async def test_status_long_poll(self,):
+        statuses = [{'ready': False, 'progress': {'trials_done': n}} for n in [5, 5, 8]]
+        with mock.patch('simulator.views.experiment_status', side_effect=statuses) as experiment_status, \
+             mock.patch('simulator.views.AsyncExperimentStatusView.poll_interval', 0):
+            response = await self.async_client.get('/simulator/async/experiment-status/abc', {'since': 5, 'wait': 10})
+        # waits out the polls without news
+        self.assertEqual(response.json()['progress']['trials_done'], 8)
+        self.assertEqual(experiment_status.call_count, 3)
+        for query in [{'wait': 'abc'}, {'wait': -1}, {'since': 'x'}]:
+            response = await self.async_client.get('/simulator/async/experiment-status/abc', query)
+            self.assertEqual(response.status_code, 400)
+
+    async def test_submit_validates(self,):
+        response = await self.async_client.post('/simulator/async/run-experiment', {'timestep': .01}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_submit_validates_num_chunks(self,):
+        with mock.patch('simulator.views.chord') as chord:
+            for num_chunks in [0, -1, 'x', 31]:
+                with self.assertRaises(ValueError):
+                    submit_experiment(SIM_PARAMS, num_chunks)
+            # importance sampling without a target fails before anything is created, not in every chunk
+            with self.assertRaises(ValueError):
+                submit_experiment({**SIM_PARAMS, 'importance_sampling': True})
+            chord.assert_not_called()
+        self.assertFalse(SimExperiment.objects.exists())
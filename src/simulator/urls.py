@@ -1,8 +1,21 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 
-from .views import RunExperimentView
+from .views import RunExperimentView, ExperimentStatusView, SimTrialDownloadView, SimExperimentViewSet, SimTrialViewSet, LandingSurrogateViewSet, LandingTableViewSet
+from .views import AsyncRunExperimentView, AsyncExperimentStatusView, AsyncExperimentResultView
 
-urlparameters = [
+router = DefaultRouter()
+router.register('experiments', SimExperimentViewSet)
+router.register('simtrials', SimTrialViewSet)
+router.register('surrogates', LandingSurrogateViewSet)
+router.register('landing-tables', LandingTableViewSet)
+
+urlpatterns = [
     path('run-experiment', RunExperimentView.as_view()),
-]
\ No newline at end of file
+    path('experiment-status/<str:status_id>', ExperimentStatusView.as_view()),
+    path('simtrials/<uuid:pk>/download', SimTrialDownloadView.as_view()),
+    # async, for many concurrent dashboards when served under ASGI
+    path('async/run-experiment', AsyncRunExperimentView.as_view()),
+    path('async/experiment-status/<str:status_id>', AsyncExperimentStatusView.as_view()),
+    path('async/experiments/<uuid:pk>/result', AsyncExperimentResultView.as_view()),
+] + router.urls
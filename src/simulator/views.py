@@ -1,26 +1,482 @@
+import asyncio
+import uuid
+
+import numpy as np
+
+from asgiref.sync import sync_to_async
+from celery import chord
+from celery.result import GroupResult
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+
+from rest_framework.decorators import action
+from rest_framework.mixins import CreateModelMixin, DestroyModelMixin
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.viewsets import ReadOnlyModelViewSet
+
+from commons.responses import blob_download_response
+from commons.wranglers import BlobWrangler
+from commons.views import SparseFieldsetMixin, ConditionalMixin, AsyncJSONView
+from .models import SimExperiment, SimTrial, LandingSurrogate, LandingTable
+
+from .serializers import SimExperimentSerializer, SimTrialSerializer, LandingSurrogateSerializer, LandingTableSerializer
+from .simulation.progress import merge_snapshots
+from .simulation.plans import ExperimentPlan
+from .simulation.scientists import ExperimentRunner, ExperimentCollater
+from .simulation.surrogates import PolynomialSurrogate, launch_features, training_data, sweep_training_data, get_surrogate, simulate_landings
+from .tasks import runExperimentTask, collateExperimentTask, buildLandingTableTask
+
+
+def submit_experiment(sim_params, num_chunks=1):
+    """
+    Create an experiment and queue its chunks on the Celery cluster, with a chord collating them once all complete.
+
+    Parameters:
+    -------
+    sim_params: dict
+        Experiment parameters, as ExperimentRunner takes them. A seed is drawn if none is given.
+    num_chunks: int
+        Number of chunks to split the trials into, for parallelization, from 1 to num_trials.
+
+    Returns:
+    -------
+    payload: dict
+        The accepted response: the task ids, the status id to poll and the experiment id.
+
+    Raises AssertionError or ValueError, before anything is created or queued, if the parameters are missing or invalid (see ExperimentPlan.from_params).
+    """
+    ## validate the parameters into the experiment's plan, seeding it up front, so every chunk draws from the same family of random streams
+    plan = ExperimentPlan.from_params(sim_params)
+    sim_params = {**sim_params, 'seed': plan.seed}
+    num_chunks = ExperimentRunner.check_num_chunks(num_chunks, sim_params['num_trials'])
+
+    ## create the experiment up front, so each chunk links its trials to it as it saves them
+    simexperiment_obj = ExperimentCollater.create_experiment(sim_params)
+    sim_params['experiment_id'] = simexperiment_obj.id.__str__()
+
+    # task workflow
+    ## 1. simulate, split into chunks for parallelization
+    ### each chunk gets a stable id, so a retried chunk resumes from its checkpoint
+    sim_signatures = []
+    for trial_start, num_trials in ExperimentRunner.split_trials(sim_params['num_trials'], num_chunks):
+        chunk_params = {**sim_params, 'trial_start': trial_start, 'num_trials': num_trials}
+        sim_signatures.append(runExperimentTask.s(chunk_params, uuid.uuid4().__str__()))
+    ## 2. collate once all chunks complete
+    collater_result = chord(sim_signatures)(collateExperimentTask.s(sim_params['experiment_id']))
+    ## keep the chunk results retrievable by the status endpoint
+    group_result = collater_result.parent
+    group_result.save()
+
+    return {
+        'accepted': True,
+        'sim_task_ids': [r.id for r in group_result.results],
+        'collate_task_id': collater_result.id,
+        'status_id': group_result.id,
+        'experiment_id': sim_params['experiment_id'],
+        'seed': sim_params['seed'],
+    }
+
+def experiment_params(validated_data):
+    """Experiment parameters, as ExperimentRunner takes them, from SimExperimentSerializer validated data: every SimExperiment field, defaults included, with foreign keys as id strings so they can be sent to Celery as JSON"""
+    o = SimExperiment(**validated_data)
+    sim_params = {}
+    for field in SimExperiment._meta.concrete_fields:
+        if field.name in ['id', 'created_at', 'modified_at']:
+            continue
+        value = getattr(o, field.attname)
+        sim_params[field.attname] = value.__str__() if isinstance(value, uuid.UUID) else value
+    return sim_params
 
-from .serializers import SimExperimentSerializer
-from .tasks import runExperimentTask, pollExperimentsThenCollateTask
+def experiment_status(status_id):
+    """The status payload of an experiment's group of chunk tasks (see ExperimentStatusView), or None if there's no such group"""
+    group_result = GroupResult.restore(status_id)
+    if group_result is None:
+        return None
 
+    chunks = []
+    snapshots = []
+    for r in group_result.results:
+        if r.state == 'PROGRESS':
+            meta = r.info
+        elif r.state == 'SUCCESS':
+            meta = r.result['progress']
+        else:
+            meta = None
+        chunks.append({
+            'task_id': r.id,
+            'state': r.state,
+            'progress': meta,
+        })
+        if meta is not None:
+            snapshots.append(meta)
+
+    return {
+        'status_id': status_id,
+        'ready': group_result.ready(),
+        'progress': merge_snapshots(snapshots),
+        'chunks': chunks,
+    }
 
 class RunExperimentView(APIView):
     def post(self, request,):
         # process inputs
-        serializer = SimExperimentSerializer(request.data)
-        sim_params = serializer.validated_data
-        
-        # task workflow
-        ## 1. simulate
-        ### TO DO --> setup chunking for parallelization
-        sim_task_id = runExperimentTask.delay(sim_params).id # queue up async task
-        ## 2. poll then collate
-        collater_task_id = pollExperimentsThenCollateTask.delay([sim_task_id], sim_params).id
-
-        response_payload = {
-            'accepted': True,
-            'sim_task_ids': [sim_task_id],
-            'collate_task_id': collater_task_id,
+        serializer = SimExperimentSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, 400)
+        sim_params = experiment_params(serializer.validated_data)
+        num_chunks = request.data.get('num_chunks', 1)
+
+        try:
+            response_payload = submit_experiment(sim_params, num_chunks)
+        except (AssertionError, ValueError) as exc:
+            return Response({'message': str(exc)}, 400)
+        return Response(response_payload, 202)
+
+class ExperimentStatusView(APIView):
+    def get(self, request, status_id):
+        """
+        Report the progress of a running experiment's chunks.
+
+        Response data:
+        -------
+        {
+            status_id: str,
+                The id of the experiment's group of chunk tasks.
+            ready: bool,
+                Whether all chunks have finished.
+            progress: dict,
+                Trials done, trials/sec and running landing mean and spread, merged over all chunks.
+            chunks: list of dict,
+                The task id, state and latest progress snapshot of each chunk.
+        }
+        """
+        response_payload = experiment_status(status_id)
+        if response_payload is None:
+            return Response({'message': 'Not found'}, 404)
+        return Response(response_payload)
+
+    def delete(self, request, status_id):
+        """Abort a running experiment by revoking all of its chunk tasks"""
+        group_result = GroupResult.restore(status_id)
+        if group_result is None:
+            return Response({'message': 'Not found'}, 404)
+
+        group_result.revoke(terminate=True)
+        return Response({'message': 'Aborted', 'status_id': status_id}, 202)
+
+class SimTrialDownloadView(APIView):
+    def get(self, request, pk):
+        """
+        Stream the ball trajectory of a SimTrial straight from blob storage.
+
+        Query parameters:
+        -------
+        filetype: str ['arrow' | 'npy']
+            'arrow' (default) serves the stored feather file, honoring HTTP Range. 'npy' serves a (T, 3) array of (x, y, z) ball positions, or (T, 4) of (t, x, y, z) if the trajectory was sampled.
+        start, stop: float
+            Optional time window in seconds. Implies filetype=npy.
+        """
+        o = get_object_or_404(SimTrial, pk=pk)
+        if o.blob_filename is None:
+            return Response({'message': 'No trajectory stored; the landing was looked up from a landing table.'}, 404)
+        return blob_download_response(request, o, o.timestep)
+
+class SimExperimentViewSet(SparseFieldsetMixin, ConditionalMixin, ReadOnlyModelViewSet):
+    """Experiments, newest first. Filter by e.g. ?windspacetime=<uuid>&completed_at__isnull=false"""
+    queryset = SimExperiment.objects.all()
+    serializer_class = SimExperimentSerializer
+    filterset_fields = {
+        'windspacetime': ['exact'],
+        'windgenparams': ['exact'],
+        'is_control': ['exact'],
+        'seed': ['exact'],
+        'completed_at': ['isnull'],
+    }
+
+class SimTrialViewSet(SparseFieldsetMixin, ConditionalMixin, ReadOnlyModelViewSet):
+    """Trials, newest first. Filter by e.g. ?experiment=<uuid>, and pick fields with e.g. ?fields=id,trial_index,position_final"""
+    queryset = SimTrial.objects.all()
+    serializer_class = SimTrialSerializer
+    filterset_fields = ['experiment', 'chunk', 'windspacetime', 'trial_index']
+
+class LandingSurrogateViewSet(SparseFieldsetMixin, ConditionalMixin, CreateModelMixin, DestroyModelMixin, ReadOnlyModelViewSet):
+    """Landing surrogates, fitted once then queried with predict. Filter by e.g. ?windspacetime=<uuid>"""
+    queryset = LandingSurrogate.objects.all()
+    serializer_class = LandingSurrogateSerializer
+    filterset_fields = ['windspacetime', 'experiment', 'timestep']
+
+    def create(self, request, *args, **kwargs):
+        """
+        Fit a surrogate of landing (x, y) to launch time and initial velocity, on a wind spacetime.
+
+        POST data:
+        -------
+        windspacetime: str [uuid]
+            The wind the trials fly in.
+        timestep, m, drag_coef: float
+            The physics of the trials, as for an experiment. m and drag_coef are optional.
+        degree: int [optional]
+            The degree of the polynomial, default 3.
+        experiment: str [uuid] [optional]
+            Fit to this experiment's trials. Otherwise, fits to every stored trial with this wind and physics.
+        sweep: dict [optional]
+            Fit to a training sweep instead: sweep_trials trials (default 1000) sampled as an experiment with these prob_* parameters would, simulated without being stored.
+
+        Only trials that landed are fitted. The response is the surrogate, including its cross-validated error_bound (m).
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        obj = LandingSurrogate(**serializer.validated_data)
+
+        sweep = request.data.get('sweep')
+        if sweep is not None and not isinstance(sweep, dict):
+            return Response({'sweep': ['A dict of prob_* experiment parameters is required.']}, 400)
+        try:
+            if sweep is not None:
+                sim_params = {**sweep, 'windspacetime_id': obj.windspacetime_id, 'timestep': obj.timestep, 'm': obj.m, 'drag_coef': obj.drag_coef}
+                features, xy = sweep_training_data(sim_params, int(request.data.get('sweep_trials', 1000)))
+            else:
+                qs = SimTrial.objects.filter(windspacetime=obj.windspacetime, timestep=obj.timestep, m=obj.m, drag_coef=obj.drag_coef)
+                if obj.experiment is not None:
+                    qs = qs.filter(experiment=obj.experiment)
+                features, xy = training_data(qs)
+            fit = PolynomialSurrogate.fit(features, xy, obj.degree)
+        except (AssertionError, KeyError, TypeError, ValueError) as exc:
+            return Response({'message': str(exc)}, 400)
+
+        obj.num_samples = fit.num_samples
+        obj.feature_mean = fit.feature_mean.tolist()
+        obj.feature_scale = fit.feature_scale.tolist()
+        obj.feature_min = fit.feature_min.tolist()
+        obj.feature_max = fit.feature_max.tolist()
+        obj.coef = fit.coef.ravel().tolist()
+        obj.error_bound = fit.error_bound
+        obj.error_rmse = fit.error_rmse
+        obj.save()
+        return Response(self.get_serializer(obj).data, 201)
+
+    @action(detail=True, methods=['post'])
+    def predict(self, request, pk=None):
+        """
+        Predict where launches land, in well under a millisecond each, simulating only those the surrogate can't answer within max_error.
+
+        POST data:
+        -------
+        launches: list of dict
+            Each with time_initial (s), direction_initial ([x, y, z] unit vector) and speed_initial (m/s), as on a SimTrial.
+        max_error: float [optional]
+            The landing position error (m) tolerated. Launches outside the training domain, or all of them if the surrogate's error_bound exceeds it, are simulated instead. Without it, nothing is simulated.
+
+        Response data:
+        -------
+        {
+            predictions: list of dict,
+                For each launch: position_final ([x, y], or null if a simulated ball didn't land), error_bound (m, 0 if simulated), in_domain, and source ['surrogate' | 'simulation'].
+            error_bound: float,
+                The surrogate's cross-validated error bound (m).
         }
-        return Response(response_payload, 202)
\ No newline at end of file
+        """
+        o = self.get_object()
+        launches = request.data.get('launches')
+        if not isinstance(launches, list) or not launches:
+            return Response({'launches': ['A non-empty list of launches is required.']}, 400)
+        try:
+            features = launch_features(
+                [launch['time_initial'] for launch in launches],
+                [launch['direction_initial'] for launch in launches],
+                [launch['speed_initial'] for launch in launches],
+            )
+        except (KeyError, TypeError, ValueError):
+            return Response({'launches': ['Each launch needs time_initial, direction_initial [x, y, z] and speed_initial.']}, 400)
+        max_error = request.data.get('max_error')
+        if max_error is not None:
+            try:
+                max_error = float(max_error)
+            except (TypeError, ValueError):
+                max_error = np.nan
+            if np.isnan(max_error):
+                return Response({'max_error': ['A number (m) is required.']}, 400)
+
+        S = get_surrogate(o.id)
+        xy = S.predict(features)
+        in_domain = S.in_domain(features)
+        simulated = np.zeros(len(launches), dtype=bool)
+        if max_error is not None:
+            simulated = ~in_domain | (S.error_bound > max_error)
+            if simulated.any():
+                xy[simulated] = simulate_landings(o, features[simulated])
+
+        predictions = []
+        for p, is_in_domain, is_simulated in zip(xy, in_domain, simulated):
+            predictions.append({
+                'position_final': None if np.isnan(p).any() else p.tolist(),
+                'error_bound': 0. if is_simulated else S.error_bound,
+                'in_domain': bool(is_in_domain),
+                'source': 'simulation' if is_simulated else 'surrogate',
+            })
+        return Response({
+            'predictions': predictions,
+            'error_bound': S.error_bound,
+        })
+
+class LandingTableViewSet(SparseFieldsetMixin, ConditionalMixin, DestroyModelMixin, ReadOnlyModelViewSet):
+    """Landing tables, newest first. Filter by e.g. ?windspacetime=<uuid>&timestep=0.01"""
+    queryset = LandingTable.objects.all()
+    serializer_class = LandingTableSerializer
+    filterset_fields = ['windspacetime', 'timestep']
+
+    def create(self, request, *args, **kwargs):
+        """
+        Queue a precompute job tabulating landings on a wind spacetime, for experiments with use_landing_table.
+
+        POST data:
+        -------
+        windspacetime: str [uuid]
+        timestep: float
+            The timestep of the experiments it answers.
+        row_start, row_stop, vz_min, vz_max, num_vz: [optional]
+            Coverage: launch rows, and vertical launch velocities (m/s), see build_landing_table. Defaults to every row, and -20 to 40m/s.
+        num_validation: int [optional]
+            The number of launches validated against the exact solver, default 200.
+
+        Response data:
+        -------
+        {
+            accepted: bool,
+            task_id: str,
+                The precompute task, whose result is the LandingTable id.
+        }
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        vdata = dict(serializer.validated_data)
+        windspacetime = vdata.pop('windspacetime')
+        timestep = vdata.pop('timestep')
+        if request.data.get('num_validation') is not None:
+            vdata['num_validation'] = int(request.data['num_validation'])
+        result = buildLandingTableTask.delay(windspacetime.id.__str__(), timestep, vdata)
+        return Response({'accepted': True, 'task_id': result.id}, 202)
+
+    def destroy(self, request, *args, **kwargs):
+        BlobWrangler().delete_blob(self.get_object())
+        return super().destroy(request, *args, **kwargs)
+
+class AsyncRunExperimentView(AsyncJSONView):
+    async def post(self, request,):
+        """
+        Submit an experiment, as RunExperimentView, without holding a worker thread while the chunks are queued.
+
+        POST data (JSON):
+        -------
+        SimExperiment fields, including windspacetime and num_trials, plus num_chunks [optional].
+
+        Response data:
+        -------
+        As RunExperimentView, with status 202: the status_id to poll and the experiment_id to fetch results by.
+        """
+        data = self.json_body(request)
+        if data is None:
+            return JsonResponse({'message': 'A JSON object body is required.'}, status=400)
+        serializer = SimExperimentSerializer(data=data)
+        if not await sync_to_async(serializer.is_valid)(): # looks up foreign keys
+            return JsonResponse(serializer.errors, status=400)
+        sim_params = experiment_params(serializer.validated_data)
+        if sim_params['num_trials'] is None:
+            return JsonResponse({'num_trials': ['This field is required.']}, status=400)
+
+        try:
+            response_payload = await sync_to_async(submit_experiment)(sim_params, data.get('num_chunks', 1))
+        except (AssertionError, ValueError) as exc:
+            return JsonResponse({'message': str(exc)}, status=400)
+        return JsonResponse(response_payload, status=202)
+
+class AsyncExperimentStatusView(AsyncJSONView):
+    max_wait = 30. # seconds a long-poll may wait
+    poll_interval = .5 # seconds between reads of the result backend while waiting
+
+    async def get(self, request, status_id):
+        """
+        Report the progress of a running experiment's chunks, as ExperimentStatusView, optionally long-polling for news.
+
+        Query parameters:
+        -------
+        since: int [optional]
+            Wait until more trials than this are done, or the experiment is ready, before responding.
+        wait: float [optional]
+            The longest to wait for that, in seconds (at most max_wait), before responding with the status as it is. Default 0.
+
+        Waiting is an asyncio sleep between reads of the result backend, so dashboards can hold many long-polls open at once.
+        """
+        try:
+            since = request.GET.get('since')
+            since = int(since) if since is not None else None
+            wait = float(request.GET.get('wait', 0))
+        except ValueError:
+            return JsonResponse({'message': 'since must be an integer and wait a number.'}, status=400)
+        if not wait >= 0:
+            return JsonResponse({'message': 'wait must be non-negative.'}, status=400)
+        wait = min(wait, self.max_wait)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while True:
+            response_payload = await sync_to_async(experiment_status, thread_sensitive=False)(status_id)
+            if response_payload is None:
+                return JsonResponse({'message': 'Not found'}, status=404)
+            is_news = since is None or response_payload['ready'] or response_payload['progress']['trials_done'] > since
+            if is_news or loop.time() >= deadline:
+                return JsonResponse(response_payload)
+            await asyncio.sleep(self.poll_interval)
+
+class AsyncExperimentResultView(AsyncJSONView):
+    max_limit = 10000 # trials per page
+
+    async def get(self, request, pk):
+        """
+        Fetch an experiment and its trials' landings, a page at a time, in trial order. Results can be fetched while the experiment runs; trials appear as chunks persist them.
+
+        Query parameters:
+        -------
+        after: int [optional]
+            Return trials with a trial_index after this, i.e. the previous page's next_after.
+        limit: int [optional]
+            Trials per page, default 1000, at least 1 and at most max_limit.
+
+        Response data:
+        -------
+        {
+            experiment: dict,
+                The SimExperiment, as the experiments API serializes it.
+            completed: bool,
+            trials: list of dict,
+                The id, trial_index, position_final (null if the ball didn't land) and likelihood_weight of each trial.
+            next_after: int | null,
+                The after parameter of the next page, or null if this is the last page so far.
+        }
+        """
+        try:
+            o = await SimExperiment.objects.aget(pk=pk)
+        except SimExperiment.DoesNotExist:
+            return JsonResponse({'message': 'Not found'}, status=404)
+        try:
+            after = int(request.GET.get('after', -1))
+            limit = int(request.GET.get('limit', 1000))
+        except ValueError:
+            return JsonResponse({'message': 'after and limit must be integers.'}, status=400)
+        limit = min(max(limit, 1), self.max_limit)
+
+        qs = o.simtrials.filter(trial_index__gt=after).order_by('trial_index').values('id', 'trial_index', 'position_final', 'likelihood_weight')
+        trials = [trial async for trial in qs[:limit+1]]
+        is_more = len(trials) > limit
+        trials = trials[:limit]
+        for trial in trials:
+            if np.isnan(trial['position_final']).any():
+                trial['position_final'] = None
+
+        return JsonResponse({
+            'experiment': SimExperimentSerializer(o).data,
+            'completed': o.completed_at is not None,
+            'trials': trials,
+            'next_after': trials[-1]['trial_index'] if is_more else None,
+        })
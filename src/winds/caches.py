@@ -0,0 +1,99 @@
+"""In-process cache of wind spacetime arrays and sources, shared by every experiment a worker runs"""
+from functools import lru_cache
+
+import numpy as np
+
+from django.conf import settings
+
+from .models import WindSpacetime
+from .generators import build_generator
+from .resampling import resample
+from .sources import ArrayWindSource, AnalyticWindSource
+from .summaries import downsample
+
+from commons.wranglers import BlobWrangler
+
+def get_wind_array(windspacetime_id, factor=None, timestep=None):
+    """
+    Given a WindSpacetime id, return its wind velocities as a read-only np.array of shape (T, 3), loading the blob only on first use.
+
+    Analytic spacetimes (constant, windless and oscillatory) have no blob; they're evaluated from their WindSource instead (see get_wind_source). A constant wind is a broadcast view of one row, with strides[0] == 0, which takes no memory whatever the length.
+
+    Parameters:
+    -------
+    windspacetime_id: str | uuid
+        The WindSpacetime id.
+    factor: int | None
+        Return the level downsampled by this factor instead, one of the spacetime's pyramid_factors (e.g. 100), whose rows are timestep*factor apart.
+    timestep: float | None
+        Return the wind resampled to rows this many seconds apart instead (see winds.resampling), e.g. an experiment's timestep. A whole multiple of the generation timestep is a view of the cached array, costing no memory. Analytic winds are evaluated at exactly these times rather than interpolated.
+    """
+    if timestep is not None:
+        return _resample_wind_array(windspacetime_id.__str__(), float(timestep))
+    return _load_wind_array(windspacetime_id.__str__(), factor)
+
+def get_wind_source(windspacetime_id):
+    """
+    Given a WindSpacetime id, return its WindSource, to query wind velocities at arbitrary times: an AnalyticWindSource evaluating its generator if it has no blob, otherwise an ArrayWindSource over the blob (loaded on first use).
+    """
+    return _get_wind_source(windspacetime_id.__str__())
+
+@lru_cache(maxsize=settings.WIND_CACHE_SIZE)
+def _get_wind_source(windspacetime_id):
+    o = WindSpacetime.objects.select_related('generator_params').get(pk=windspacetime_id)
+    if o.blob_filename is None:
+        return AnalyticWindSource(build_generator(o.generator_name, o.generator_params, o.timestep), o.duration)
+    return ArrayWindSource(_load_wind_array(o.id.__str__(), None), o.timestep)
+
+@lru_cache(maxsize=settings.WIND_CACHE_SIZE)
+def _load_wind_array(windspacetime_id, factor):
+    o = WindSpacetime.objects.get(pk=windspacetime_id)
+    if o.blob_filename is None:
+        return _sample_wind_source(get_wind_source(windspacetime_id), o.timestep, factor)
+    if factor is None:
+        arr = BlobWrangler().read_blob(o).to_numpy()
+    else:
+        arr = BlobWrangler().read_level(o, factor).to_numpy()
+    arr.flags.writeable = False # shared between experiments, so guard against mutation
+    return arr
+
+def _sample_wind_source(source, timestep, factor=None):
+    """Evaluate an analytic spacetime every timestep, downsampled by factor as summaries.downsample would"""
+    arr = source.sample(timestep)
+    if factor is not None:
+        if source.is_constant:
+            arr = np.broadcast_to(arr[:1], (-(-arr.shape[0] // factor), arr.shape[1])) # the same row repeated, ceil(T/factor) times
+        else:
+            arr = downsample(arr, factor)
+    arr.flags.writeable = False
+    return arr
+
+@lru_cache(maxsize=settings.WIND_CACHE_SIZE)
+def _resample_wind_array(windspacetime_id, timestep):
+    source = get_wind_source(windspacetime_id)
+    if isinstance(source, AnalyticWindSource):
+        return _sample_wind_source(source, timestep)
+    arr = resample(source.arr, source.timestep, timestep)
+    arr.flags.writeable = False
+    return arr
+
+def preload_wind_cache(windspacetime_ids=None):
+    """
+    Load wind arrays into the cache ahead of time, e.g. when a worker starts.
+
+    Parameters:
+    -------
+    windspacetime_ids: list | None
+        The WindSpacetime ids to load. Defaults to the settings.WIND_CACHE_PRELOAD most recently created.
+
+    Returns:
+    -------
+    windspacetime_ids: list
+        The ids that were loaded.
+    """
+    if windspacetime_ids is None:
+        qs = WindSpacetime.objects.exclude(blob_filename=None).order_by('-created_at')
+        windspacetime_ids = list(qs.values_list('id', flat=True)[:settings.WIND_CACHE_PRELOAD])
+    for id in windspacetime_ids:
+        get_wind_array(id)
+    return windspacetime_ids
@@ -1,30 +1,49 @@
 """The mathematical models used to generate Wind spacetimes"""
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
+
+# N.B. pandas and matplotlib are imported where used, keeping this module (and the models importing it) light for workers
 
 WIND_GENERATOR_NAMES = [
     ('windless', 'windless'), # tuples for: (actual value, human-readable name)
     ('constant', 'constant'),
     ('oscillatory', 'oscillatory'),
     ('lorenz', 'lorenz'),
+    ('spectral', 'spectral'),
+]
+TURBULENCE_SPECTRA = [
+    ('kaimal', 'kaimal'),
+    ('von_karman', 'von Kármán'),
 ]
 
 class Generator:
     """Base Generator class"""
+    is_lazy = False # whether v(t) has a closed form, so spacetimes are evaluated on demand (see winds.sources.AnalyticWindSource), rather than stored as blobs
+    is_constant = False
+
+    @classmethod
+    def from_array(cls, wind_speeds, dt):
+        """Wrap existing wind speeds, e.g. a stored level from winds.caches.get_wind_array(id, factor), to use the plot methods on them without regenerating"""
+        G = cls.__new__(cls)
+        G.wind_speeds = np.asarray(wind_speeds)
+        G.dt = dt
+        return G
+
     def plotx(self,):
+        import matplotlib.pyplot as plt
         x = self.wind_speeds[:,0]
         t = self.dt * np.arange(len(x))
         plt.plot(t, x)
         plt.show()
 
     def ploty(self,):
+        import matplotlib.pyplot as plt
         y = self.wind_speeds[:,1]
         t = self.dt * np.arange(len(y))
         plt.plot(t, y)
         plt.show()
 
     def plotz(self,):
+        import matplotlib.pyplot as plt
         z = self.wind_speeds[:,2]
         t = self.dt * np.arange(len(z))
         plt.plot(t, z)
@@ -32,6 +51,7 @@ class Generator:
 
     def plot3d(self,):
         """show a 3D parametric plot of (vx, vy, vz) over t"""
+        import matplotlib.pyplot as plt
         # setup x,y,z
         x = self.wind_speeds[:,0]
         y = self.wind_speeds[:,1]
@@ -43,6 +63,7 @@ class Generator:
     
     def to_df(self,):
         """After self.gen, run this to convert dataset to pd.DataFrame"""
+        import pandas as pd
         return pd.DataFrame({
             'x': self.wind_speeds[:,0],
             'y': self.wind_speeds[:,1],
@@ -51,7 +72,44 @@ class Generator:
             index=self.dt*np.array(range(self.wind_speeds.shape[0])),
         )
 
+class ConstantGenerator(Generator):
+    """Wind blowing at a constant velocity"""
+    is_lazy = True
+    is_constant = True
+    default_params = {
+        'base_velocity': np.array([1,0,0]), # m/s
+        'dt': .001,
+    }
+
+    def __init__(self, params=None):
+        if params is None:
+            params = self.default_params
+        self.base_velocity = np.array(params['base_velocity'], dtype=np.float64)
+        self.dt = params['dt']
+
+    def v(self, t):
+        """Calculate velocity vector at a given time, t"""
+        return self.base_velocity
+
+    def gen(self, duration):
+        """Given a duration in seconds, generate the wind speed trajectory, both returning and assigning it to self.wind_speeds. It's a read-only broadcast view of one row, whatever the duration, so takes no memory."""
+        N = int(duration/self.dt)
+        self.wind_speeds = np.broadcast_to(self.base_velocity, (N+1, 3))
+        return self.wind_speeds
+
+class WindlessGenerator(ConstantGenerator):
+    """No wind at all"""
+    default_params = {
+        'dt': .001,
+    }
+
+    def __init__(self, params=None):
+        if params is None:
+            params = self.default_params
+        super().__init__({'base_velocity': [0, 0, 0], 'dt': params['dt']})
+
 class OscillatoryGenerator(Generator):
+    is_lazy = True
     default_params = {
         'base_velocity': np.array([0,0,0]), # m/s
         'amplitude': np.array([1,1,1]),
@@ -70,19 +128,14 @@ class OscillatoryGenerator(Generator):
         self.dt = params['dt']
 
     def v(self, t):
-        """Calculate velocity vector at a given time, t"""
+        """Calculate velocity vector at a given time, t, or velocity vectors at a column of times, shape=(n, 1)"""
         return self.base_velocity + self.amplitude * np.cos( 2*np.pi * self.frequency * t + self.phase_offset )
 
     def gen(self, duration):
         """Given a duration in seconds, generate the wind speed trajectory, both returning and assigning it to self.wind_speeds"""
         N = int(duration/self.dt)
-        ws = np.empty((N+1,3))
-        # initialie
-        ws[0,:] = self.v(0)
-        # iterate
-        for i in range(1,N+1):
-            t = self.dt*i
-            ws[i,:] = self.v(t)
+        t = self.dt*np.arange(N+1)
+        ws = np.broadcast_to(self.v(t[:,None]), (N+1, 3)).astype(np.float64) # evaluated for all times at once
         self.wind_speeds = ws
         return ws
 
@@ -131,3 +184,181 @@ class LorenzGenerator(Generator):
         self.wind_speeds = ws
         return ws
 
+
+class LorenzEnsembleGenerator(Generator):
+    """K Lorenz systems with their own parameters and initial velocities, integrated at once as a (K, 3) state. Each member's trajectory is bit-identical to LorenzGenerator's with the same parameters."""
+    default_params = {
+        'base_velocity': np.array([[1.0,1.0,1.0]]), # m/s, shape=(K, 3)
+        'rho': np.array([28]), # shape=(K,)
+        'sigma': np.array([10]),
+        'beta': np.array([8/3]),
+        'dt': .001, # s
+    }
+
+    def __init__(self, params=None):
+        if params is None:
+            params = self.default_params
+        # unpack params
+        self.base_velocity = np.array(params['base_velocity'], dtype=np.float64).reshape(-1, 3)
+        self.rho = np.array(params['rho'], dtype=np.float64)
+        self.sigma = np.array(params['sigma'], dtype=np.float64)
+        self.beta = np.array(params['beta'], dtype=np.float64)
+        self.dt = params['dt'] # timestep resolution
+
+    @classmethod
+    def from_gen_params(cls, list_gen_params, dt):
+        """Given WindGenParams of Lorenz systems, one per member, build the ensemble"""
+        return cls({
+            'base_velocity': [o.base_velocity for o in list_gen_params],
+            'rho': [o.rho for o in list_gen_params],
+            'sigma': [o.sigma for o in list_gen_params],
+            'beta': [o.beta for o in list_gen_params],
+            'dt': dt,
+        })
+
+    def dv(self, v):
+        """v = (x, y, z) per member, shape=(K, 3). Same operations as LorenzGenerator.dx, dy and dz, per member."""
+        x, y, z = v[:,0], v[:,1], v[:,2]
+        dv = np.empty_like(v)
+        dv[:,0] = (self.sigma*(y - x))*self.dt
+        dv[:,1] = (x*(self.rho - z) - y)*self.dt
+        dv[:,2] = (x*y - self.beta*z)*self.dt
+        return dv
+
+    def gen(self, duration):
+        """Given a duration in seconds, generate the members' wind speed trajectories, both returning and assigning them to self.wind_speeds, shape=(N+1, K, 3)"""
+        N = int(duration / self.dt)
+        ws = np.empty((N+1, self.base_velocity.shape[0], 3)) # wind speeds (t, member, [x, y, z])
+        # initialie
+        ws[0] = self.base_velocity
+        # iterate
+        for t in range(1,N+1):
+            prev_v = ws[t-1]
+            ws[t] = prev_v + self.dv(prev_v)
+        self.wind_speeds = ws
+        return ws
+
+    def member(self, k):
+        """After self.gen, the k-th member's wind speeds as a Generator, for its plot and to_df methods"""
+        return LorenzGenerator.from_array(self.wind_speeds[:,k,:], self.dt)
+
+class SpectralGenerator(Generator):
+    """
+    Gusty wind: a mean wind plus turbulence synthesized from a spectrum by inverse FFT, with random phases.
+
+    Each component's one-sided power spectral density, with mean wind speed U = |base_velocity|, turbulence std dev sigma and length scale L, is
+        Kaimal:      S(f) = sigma^2 * (4L/U) / (1 + 6 f L/U)^(5/3)
+        von Kármán:  S(f) = sigma^2 * (4L/U) / (1 + 70.8 (f L/U)^2)^(5/6)
+    both integrating to sigma^2 over f.
+    """
+    default_params = {
+        'base_velocity': np.array([8.,0,0]), # m/s
+        'spectrum': 'kaimal',
+        'turbulence_sigma': np.array([1.,.8,.5]), # m/s
+        'length_scale': np.array([340.,113,28]), # m
+        'seed': 0,
+        'dt': .001,
+    }
+
+    def __init__(self, params=None):
+        if params is None:
+            params = self.default_params
+        self.base_velocity = np.array(params['base_velocity'], dtype=np.float64)
+        self.spectrum = params['spectrum']
+        self.turbulence_sigma = np.array(params['turbulence_sigma'], dtype=np.float64)
+        self.length_scale = np.array(params['length_scale'], dtype=np.float64)
+        self.seed = params['seed']
+        self.dt = params['dt']
+        if self.spectrum not in dict(TURBULENCE_SPECTRA):
+            raise ValueError(f"Unknown spectrum {self.spectrum!r}. Choose from {[s for s, _ in TURBULENCE_SPECTRA]}.")
+        self.mean_speed = np.linalg.norm(self.base_velocity)
+        if self.mean_speed == 0 and np.any(self.turbulence_sigma*self.length_scale):
+            raise ValueError("The spectral generator needs a non-zero mean wind (base_velocity) to scale its spectrum.")
+
+    def psd(self, f):
+        """One-sided power spectral density of each component at frequencies f (Hz), shape=(len(f), 3)"""
+        f = np.asarray(f, dtype=np.float64)[:,None]
+        if self.mean_speed == 0:
+            return np.zeros((f.shape[0], 3))
+        n = f*self.length_scale/self.mean_speed # reduced frequency
+        S0 = self.turbulence_sigma**2 * 4*self.length_scale/self.mean_speed
+        if self.spectrum == 'kaimal':
+            return S0 / (1 + 6*n)**(5/3)
+        return S0 / (1 + 70.8*n**2)**(5/6)
+
+    @staticmethod
+    def fast_length(n):
+        """Smallest 2^a * 3^b * 5^c >= n, a length the FFT handles quickly"""
+        best = 1 << max(n-1, 0).bit_length() # power of 2
+        p5 = 1
+        while p5 < best:
+            p35 = p5
+            while p35 < best:
+                p235 = p35 << max(-(-n // p35) - 1, 0).bit_length() # times the smallest power of 2 reaching n
+                best = min(best, p235)
+                p35 *= 3
+            p5 *= 5
+        return best
+
+    def gen(self, duration):
+        """Given a duration in seconds, generate the wind speed trajectory, both returning and assigning it to self.wind_speeds"""
+        N = int(duration/self.dt) + 1
+        M = self.fast_length(N) # synthesize a slightly longer, FFT-friendly series, then keep the first N rows
+        f = np.fft.rfftfreq(M, self.dt)
+        df = f[1] - f[0] if f.shape[0] > 1 else 0
+        # |X_k| = M*sqrt(S(f_k)*df/2) gives each frequency a cosine of amplitude sqrt(2*S(f_k)*df), so the variance sums to ~sigma^2; no power at f=0 (the mean) or the Nyquist frequency
+        amplitude = M*np.sqrt(self.psd(f)*df/2)
+        amplitude[0] = 0
+        if M % 2 == 0:
+            amplitude[-1] = 0
+        phases = np.random.default_rng(self.seed).uniform(0, 2*np.pi, amplitude.shape)
+        turbulence = np.fft.irfft(amplitude*np.exp(1j*phases), n=M, axis=0)[:N]
+        self.wind_speeds = self.base_velocity + turbulence
+        return self.wind_speeds
+
+
+def build_generator(generator_name, o, dt):
+    """
+    Instantiate the Generator for a wind spacetime.
+
+    Parameters:
+    -------
+    generator_name: str
+        The WindSpacetime's generator_name, one of WIND_GENERATOR_NAMES.
+    o: WindGenParams | None
+        The generator parameters, whose flags pick the generator. May be None for 'windless'.
+    dt: float
+        The timestep, in seconds.
+    """
+    if o is None or o.is_windless:
+        if o is None and generator_name != 'windless':
+            raise ValueError(f"The {generator_name!r} generator requires generator_params.")
+        return WindlessGenerator({'dt': dt})
+    if o.is_constant:
+        return ConstantGenerator({'base_velocity': o.base_velocity, 'dt': dt})
+    if o.is_oscillatory:
+        return OscillatoryGenerator({
+            'base_velocity': o.base_velocity,
+            'amplitude': o.amplitude,
+            'frequency': o.frequency,
+            'phase_offset': o.phase_offset,
+            'dt': dt,
+        })
+    if o.is_lorenz:
+        return LorenzGenerator({
+            'base_velocity': o.base_velocity, # m/s
+            'rho': o.rho,
+            'sigma': o.sigma,
+            'beta': o.beta,
+            'dt': dt, # s
+        })
+    if o.is_spectral:
+        return SpectralGenerator({
+            'base_velocity': o.base_velocity,
+            'spectrum': o.spectrum,
+            'turbulence_sigma': o.turbulence_sigma,
+            'length_scale': o.length_scale,
+            'seed': o.seed,
+            'dt': dt,
+        })
+    raise ValueError(f"WindGenParams {o.id} has no generator flag set.")
@@ -0,0 +1,31 @@
+"""Backfill summary statistics and downsampled levels of wind spacetimes"""
+from django.core.management.base import BaseCommand
+
+from commons.wranglers import BlobWrangler
+from winds.models import WindSpacetime
+from winds.summaries import summarize_spacetime
+
+class Command(BaseCommand):
+    help = "Compute summary statistics and store downsampled levels for wind spacetimes generated without them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Recompute every wind spacetime, e.g. after changing settings.WIND_PYRAMID_FACTORS.")
+
+    def handle(self, *args, **options):
+        qs = WindSpacetime.objects.exclude(blob_filename=None)
+        if not options['all']:
+            qs = qs.filter(speed_mean=None)
+        B = BlobWrangler()
+        n = 0
+        for o in qs.iterator():
+            arr = B.read_blob(o).to_numpy()
+            old_factors = o.pyramid_factors
+            summarize_spacetime(o, arr, B)
+            o.save(update_fields=WindSpacetime.summary_fields + ['modified_at'])
+            # levels no longer in settings.WIND_PYRAMID_FACTORS
+            for factor in set(old_factors) - set(o.pyramid_factors):
+                B.storage.delete(B.level_filename(o, factor))
+            n += 1
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"  {o.id}: levels {o.pyramid_factors}")
+        self.stdout.write(self.style.SUCCESS(f"Summarized {n} wind spacetimes."))
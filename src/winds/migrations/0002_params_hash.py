@@ -0,0 +1,56 @@
+# Generated by Django 4.1.3 on 2026-10-19 17:16
+
+from django.db import migrations, models
+
+from commons.models import hash_params
+
+
+def backfill_params_hash(apps, schema_editor):
+    """Hash existing parameter sets. Only the oldest of any duplicates gets the hash, as the one later lookups will find."""
+    exclude = {
+        'WindGenParams': ['id', 'created_at', 'modified_at', 'params_hash'],
+        'WindSpacetime': ['id', 'created_at', 'modified_at', 'params_hash', 'blob_filename'],
+    }
+    for model_name, excluded in exclude.items():
+        Model = apps.get_model('winds', model_name)
+        fields = [f for f in Model._meta.concrete_fields if f.name not in excluded]
+        seen = set()
+        objs = []
+        for obj in Model.objects.order_by('created_at'):
+            h = hash_params(fields, {f.name: getattr(obj, f.attname) for f in fields})
+            if h not in seen:
+                seen.add(h)
+                obj.params_hash = h
+                objs.append(obj)
+        Model.objects.bulk_update(objs, ['params_hash'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('winds', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='windgenparams',
+            name='params_hash',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='windspacetime',
+            name='params_hash',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(backfill_params_hash, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='windgenparams',
+            name='params_hash',
+            field=models.CharField(editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='windspacetime',
+            name='params_hash',
+            field=models.CharField(editable=False, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.3 on 2026-10-19 17:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('winds', '0002_params_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='windgenparams',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='windspacetime',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
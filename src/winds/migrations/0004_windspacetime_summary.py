@@ -0,0 +1,44 @@
+# Generated by Django 4.1.3 on 2026-10-19 17:23
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('winds', '0003_created_at_auto_now_add'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='windspacetime',
+            name='peak_frequency',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), max_length=3, null=True, size=None),
+        ),
+        migrations.AddField(
+            model_name='windspacetime',
+            name='pyramid_factors',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='windspacetime',
+            name='speed_max',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), max_length=3, null=True, size=None),
+        ),
+        migrations.AddField(
+            model_name='windspacetime',
+            name='speed_mean',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), max_length=3, null=True, size=None),
+        ),
+        migrations.AddField(
+            model_name='windspacetime',
+            name='speed_min',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), max_length=3, null=True, size=None),
+        ),
+        migrations.AddField(
+            model_name='windspacetime',
+            name='speed_var',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), max_length=3, null=True, size=None),
+        ),
+    ]
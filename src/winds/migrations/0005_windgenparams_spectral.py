@@ -0,0 +1,59 @@
+# Generated by Django 4.1.3 on 2026-10-19 17:34
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import winds.models
+
+from commons.models import hash_params
+
+
+def rehash_params(apps, schema_editor):
+    """The new fields are part of each parameter set, so rehash existing ones (with the new fields at their defaults), or lookups would miss them"""
+    WindGenParams = apps.get_model('winds', 'WindGenParams')
+    fields = [f for f in WindGenParams._meta.concrete_fields if f.name not in ['id', 'created_at', 'modified_at', 'params_hash']]
+    objs = []
+    for obj in WindGenParams.objects.exclude(params_hash=None):
+        obj.params_hash = hash_params(fields, {f.name: getattr(obj, f.attname) for f in fields})
+        objs.append(obj)
+    WindGenParams.objects.bulk_update(objs, ['params_hash'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('winds', '0004_windspacetime_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='windgenparams',
+            name='is_spectral',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='windgenparams',
+            name='length_scale',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), default=winds.models.get_triple_0, max_length=3, size=None),
+        ),
+        migrations.AddField(
+            model_name='windgenparams',
+            name='seed',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='windgenparams',
+            name='spectrum',
+            field=models.CharField(choices=[('kaimal', 'kaimal'), ('von_karman', 'von Kármán')], default='kaimal', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='windgenparams',
+            name='turbulence_sigma',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), default=winds.models.get_triple_0, max_length=3, size=None),
+        ),
+        migrations.AlterField(
+            model_name='windspacetime',
+            name='generator_name',
+            field=models.CharField(choices=[('windless', 'windless'), ('constant', 'constant'), ('oscillatory', 'oscillatory'), ('lorenz', 'lorenz'), ('spectral', 'spectral')], max_length=30),
+        ),
+        migrations.RunPython(rehash_params, migrations.RunPython.noop),
+    ]
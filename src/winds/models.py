@@ -3,13 +3,13 @@ import uuid
 from django.db import models
 from django.contrib.postgres.fields import ArrayField
 
-from .generators import WIND_GENERATOR_NAMES
+from .generators import WIND_GENERATOR_NAMES, TURBULENCE_SPECTRA
 
-from commons.models import Timestamped
+from commons.models import Timestamped, ParamsHashed
 
 def get_triple_0():
     return [0, 0, 0]
-class WindGenParams(Timestamped):
+class WindGenParams(ParamsHashed, Timestamped):
     """Parameters used by the generator to generate trajectories of wind speed per spatial dimension (x,y,z) over time (t)."""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     
@@ -18,6 +18,7 @@ class WindGenParams(Timestamped):
     is_constant = models.BooleanField(default=False)
     is_oscillatory = models.BooleanField(default=False)
     is_lorenz = models.BooleanField(default=False)
+    is_spectral = models.BooleanField(default=False)
 
     # Constant
     base_velocity = ArrayField(models.FloatField(), max_length=3, default=get_triple_0) # [x,y,z]
@@ -32,8 +33,14 @@ class WindGenParams(Timestamped):
     sigma = models.FloatField(null=True, default=0)
     beta = models.FloatField(null=True, default=0)
 
+    # Spectral --> speed = base_velocity + turbulence with the given spectrum, std dev and length scale   ... for each of [x,y,z] directions
+    spectrum = models.CharField(max_length=20, choices=TURBULENCE_SPECTRA, default='kaimal')
+    turbulence_sigma = ArrayField(models.FloatField(), max_length=3, default=get_triple_0) # [x,y,z] m/s
+    length_scale = ArrayField(models.FloatField(), max_length=3, default=get_triple_0) # [x,y,z] m
+    seed = models.BigIntegerField(default=0) # of the random phases
 
-class WindSpacetime(Timestamped):
+
+class WindSpacetime(ParamsHashed, Timestamped):
     """Trajectories of wind speed per spatial dimension (x,y,z) over time (t) --> Table contains meta data, blob contains the actual time-trajectory data."""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     generator_name = models.CharField(max_length=30, choices=WIND_GENERATOR_NAMES)
@@ -43,3 +50,14 @@ class WindSpacetime(Timestamped):
 
     blob_filename = models.CharField(max_length=50, null=True) # filenames will be uuid plus extension... <uuid>.pkl ... so we expect 40 or so characters
 
+    # summary statistics per component [x,y,z], computed on generation (see winds.summaries)
+    speed_mean = ArrayField(models.FloatField(), max_length=3, null=True)
+    speed_var = ArrayField(models.FloatField(), max_length=3, null=True)
+    speed_min = ArrayField(models.FloatField(), max_length=3, null=True)
+    speed_max = ArrayField(models.FloatField(), max_length=3, null=True)
+    peak_frequency = ArrayField(models.FloatField(), max_length=3, null=True) # Hz
+    pyramid_factors = ArrayField(models.IntegerField(), default=list, blank=True) # downsampled levels stored beside the blob, e.g. [10, 100, 1000]
+
+    summary_fields = ['speed_mean', 'speed_var', 'speed_min', 'speed_max', 'peak_frequency', 'pyramid_factors']
+    params_hash_exclude = ParamsHashed.params_hash_exclude + ['blob_filename'] + summary_fields # derived from the parameters, not parameters
+
@@ -0,0 +1,32 @@
+"""Serve a wind spacetime at a timestep other than the one it was generated at"""
+import numpy as np
+
+def resample(arr, timestep, new_timestep, rtol=1e-9):
+    """
+    Resample a wind array onto a grid of new_timestep, over the same duration.
+
+    Parameters:
+    -------
+    arr: np.array
+        Wind velocities, shape=(T, 3), rows timestep apart.
+    timestep: float
+        Time between rows of arr, in seconds.
+    new_timestep: float
+        Time between rows of the result, in seconds.
+
+    Returns:
+    -------
+    resampled: np.array
+        arr itself if the timesteps match; if new_timestep is a whole multiple k of timestep, the view arr[::k] (no copy), sampling the wind at exactly the same times; otherwise a new array linearly interpolated at times 0, new_timestep, 2*new_timestep, ...
+    """
+    if new_timestep <= 0:
+        raise ValueError(f"Timestep must be positive, not {new_timestep}.")
+    ratio = new_timestep / timestep
+    k = int(round(ratio))
+    if k >= 1 and abs(ratio - k) <= rtol*ratio:
+        return arr if k == 1 else arr[::k]
+
+    t = timestep*np.arange(arr.shape[0])
+    N = int(np.floor(t[-1]/new_timestep * (1 + rtol))) + 1
+    new_t = new_timestep*np.arange(N)
+    return np.stack([np.interp(new_t, t, arr[:,i]) for i in range(arr.shape[1])], axis=1)
@@ -12,4 +12,5 @@ class WindSpacetimeSerializer(serializers.ModelSerializer):
         model = WindSpacetime
         exclude = [
             'blob_filename'
-        ]
\ No newline at end of file
+        ]
+        read_only_fields = WindSpacetime.summary_fields
\ No newline at end of file
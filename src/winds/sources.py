@@ -0,0 +1,89 @@
+"""Wind sources: wind velocity queried at batches of times (and positions), whether evaluated from a closed form or read from a stored array"""
+import numpy as np
+
+from .resampling import resample
+
+class WindSource:
+    """Base WindSource class: the wind over a spacetime, from t=0 to t=duration"""
+    is_constant = False # whether the wind is the same everywhere, always
+
+    def __init__(self, duration):
+        self.duration = duration
+
+    def velocity(self, t, p=None):
+        """
+        Wind velocity at a batch of times and positions.
+
+        Parameters:
+        -------
+        t: np.array
+            Times in seconds, shape=(n,).
+        p: np.array | None
+            Positions in meters, shape=(n, 3). The current wind models are uniform in space, so it may be omitted.
+
+        Returns:
+        -------
+        v: np.array
+            Wind velocities, shape=(n, 3).
+        """
+        raise NotImplementedError
+
+    def num_rows(self, timestep):
+        """Number of rows when sampled every timestep seconds over the duration"""
+        return int(self.duration/timestep + 1e-9) + 1 # tolerate float error in the division
+
+    def sample(self, timestep, start=0, stop=None):
+        """Wind velocities of rows [start, stop) when sampled every timestep seconds, i.e. at t = row*timestep, shape=(stop-start, 3)"""
+        stop = self.num_rows(timestep) if stop is None else stop
+        return self.velocity(timestep*np.arange(start, stop))
+
+class ArrayWindSource(WindSource):
+    """Wind stored as rows of velocities, evenly spaced in time (e.g. a WindSpacetime's blob)"""
+    def __init__(self, arr, timestep):
+        """
+        Parameters:
+        -------
+        arr: np.array
+            Wind velocities, shape=(T, 3).
+        timestep: float
+            Time between rows, in seconds.
+        """
+        super().__init__((arr.shape[0]-1)*timestep)
+        self.arr = arr
+        self.timestep = timestep
+
+    def velocity(self, t, p=None):
+        """Linearly interpolated between rows, and held at the first and last rows outside the duration"""
+        t_rows = self.timestep*np.arange(self.arr.shape[0])
+        t = np.asarray(t, dtype=np.float64)
+        return np.stack([np.interp(t, t_rows, self.arr[:,i]) for i in range(self.arr.shape[1])], axis=1)
+
+    def sample(self, timestep, start=0, stop=None):
+        """As WindSource.sample, but a view of the stored rows wherever timestep is a whole multiple of the stored timestep (see winds.resampling)"""
+        return resample(self.arr, self.timestep, timestep)[start:stop]
+
+class AnalyticWindSource(WindSource):
+    """Wind evaluated on demand from a Generator with a closed-form v(t), so it's never stored, and can be sampled at any timestep"""
+    def __init__(self, generator, duration):
+        """
+        Parameters:
+        -------
+        generator: Generator
+            One whose is_lazy is set, e.g. OscillatoryGenerator. Its v(t) takes a column of times.
+        duration: float
+            In seconds.
+        """
+        super().__init__(duration)
+        self.generator = generator
+        self.is_constant = generator.is_constant
+
+    def velocity(self, t, p=None):
+        t = np.asarray(t, dtype=np.float64)
+        return np.broadcast_to(self.generator.v(t[:,None]), (t.shape[0], 3))
+
+    def sample(self, timestep, start=0, stop=None):
+        """As WindSource.sample. A constant wind is a read-only broadcast view of one row, so takes no memory whatever the length."""
+        stop = self.num_rows(timestep) if stop is None else stop
+        if self.is_constant:
+            return np.broadcast_to(self.generator.v(0.), (max(stop-start, 0), 3))
+        return np.ascontiguousarray(super().sample(timestep, start, stop))
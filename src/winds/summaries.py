@@ -0,0 +1,85 @@
+"""Summary statistics and downsampled levels of wind spacetimes, so they can be compared and previewed without loading the full array"""
+import numpy as np
+
+from django.conf import settings
+
+def summarize(arr, timestep):
+    """
+    Per-component summary statistics of a wind array.
+
+    Parameters:
+    -------
+    arr: np.array
+        Wind velocities, shape=(T, 3).
+    timestep: float
+        Time between rows, in seconds.
+
+    Returns:
+    -------
+    stats: dict
+        WindSpacetime field name to [x, y, z] values: speed_mean, speed_var, speed_min, speed_max, and peak_frequency, the frequency (Hz) of the largest non-constant spectral component (0 for a constant wind).
+    """
+    arr = np.asarray(arr, dtype=np.float64)
+    power = np.abs(np.fft.rfft(arr - arr.mean(axis=0), axis=0))**2
+    freqs = np.fft.rfftfreq(arr.shape[0], timestep)
+    if power.shape[0] > 1:
+        peak_frequency = np.where(power[1:].max(axis=0) > 0, freqs[1 + power[1:].argmax(axis=0)], 0.)
+    else:
+        peak_frequency = np.zeros(arr.shape[1])
+    return {
+        'speed_mean': arr.mean(axis=0).tolist(),
+        'speed_var': arr.var(axis=0).tolist(),
+        'speed_min': arr.min(axis=0).tolist(),
+        'speed_max': arr.max(axis=0).tolist(),
+        'peak_frequency': peak_frequency.tolist(),
+    }
+
+def downsample(arr, factor):
+    """Average each run of factor rows into one, the last run possibly shorter, so row i of the result covers times [i*factor*timestep, (i+1)*factor*timestep)"""
+    T = arr.shape[0]
+    n_full = T // factor
+    levels = [arr[:n_full*factor].reshape(n_full, factor, -1).mean(axis=1)]
+    if T % factor:
+        levels.append(arr[n_full*factor:].mean(axis=0, keepdims=True))
+    return np.concatenate(levels)
+
+def build_pyramid(arr, factors=None):
+    """
+    Downsample a wind array at each factor in settings.WIND_PYRAMID_FACTORS (e.g. 1/10, 1/100, 1/1000) which leaves more than one row.
+
+    Returns:
+    -------
+    pyramid: dict
+        factor to downsampled np.array
+    """
+    factors = settings.WIND_PYRAMID_FACTORS if factors is None else factors
+    return {f: downsample(arr, f) for f in factors if f < arr.shape[0]}
+
+def summarize_spacetime(obj, arr, wrangler, precision=None, store_levels=True):
+    """
+    Compute a WindSpacetime's summary statistics and store its pyramid levels beside its blob, setting the object's fields (without saving it).
+
+    Parameters:
+    -------
+    obj: WindSpacetime
+        The spacetime, which already has an id.
+    arr: np.array
+        Its wind velocities, shape=(T, 3).
+    wrangler: BlobWrangler
+        Where to store the levels.
+    precision: dict | None
+        Precision encoding of the levels, as for BlobWrangler.write_blob.
+    store_levels: bool
+        Whether to store pyramid levels. Lazily generated spacetimes have no blob, so no levels either.
+    """
+    import pandas as pd
+    for field, value in summarize(arr, obj.timestep).items():
+        setattr(obj, field, value)
+    if not store_levels:
+        obj.pyramid_factors = []
+        return obj
+    pyramid = build_pyramid(arr)
+    for factor, level in pyramid.items():
+        wrangler.write_level(obj, factor, pd.DataFrame(level, columns=['x', 'y', 'z']), precision)
+    obj.pyramid_factors = sorted(pyramid)
+    return obj
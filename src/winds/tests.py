@@ -1,4 +1,22 @@
-from django.test import TestCase
+import io
+
+from unittest import mock
+
+import numpy as np
+
+from django.db import IntegrityError
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from rest_framework.test import APIClient
+
+from .models import WindGenParams, WindSpacetime
+from .summaries import summarize, downsample, build_pyramid
+from .resampling import resample
+from .generators import build_generator, OscillatoryGenerator, LorenzGenerator, LorenzEnsembleGenerator, SpectralGenerator
+from .sources import ArrayWindSource, AnalyticWindSource
+from .caches import get_wind_array, get_wind_source
+
+from commons.storage import get_storage_backend
 
 # Create your tests here.
 class TestBlobWrangler(TestCase):
@@ -7,4 +25,235 @@ class TestBlobWrangler(TestCase):
         pass
 
     def read_spacetime(self,):
-        pass
\ No newline at end of file
+        pass
+
+class TestDedupe(TestCase):
+    def setUp(self,):
+        self.client = APIClient()
+        self.lorenz = {'is_lorenz': True, 'base_velocity': [1, 0, 0], 'rho': 28, 'sigma': 10, 'beta': 8/3}
+
+    def test_duplicate_params_found_in_one_query(self,):
+        response = self.client.post('/winds/wind-gen-params/', self.lorenz, format='json')
+        self.assertEqual(response.status_code, 201)
+        with self.assertNumQueries(1):
+            response_dup = self.client.post('/winds/wind-gen-params/', self.lorenz, format='json')
+        self.assertEqual(response_dup.status_code, 409)
+        self.assertEqual(response_dup.data['id'], response.data['id'])
+
+    def test_hash_ignores_representation(self,):
+        o = WindGenParams.objects.create(**self.lorenz)
+        # ints vs floats, and omitted fields which take their defaults
+        params = {**self.lorenz, 'base_velocity': [1.0, 0.0, 0.0], 'rho': 28.0, 'frequency': [0, 0, 0]}
+        self.assertEqual(WindGenParams.find_duplicate_id(params), o.id)
+        self.assertIsNone(WindGenParams.find_duplicate_id({**params, 'rho': 28.5}))
+
+    def test_spacetime_hash_ignores_blob(self,):
+        gp = WindGenParams.objects.create(**self.lorenz)
+        o = WindSpacetime.objects.create(generator_name='lorenz', generator_params=gp, duration=10, blob_filename='a.fthr')
+        with self.assertNumQueries(1):
+            self.assertEqual(WindSpacetime.find_duplicate_id({'generator_name': 'lorenz', 'generator_params': gp, 'duration': 10.0, 'timestep': 0.01}), o.id)
+
+class TestListAPI(TestCase):
+    def setUp(self,):
+        self.client = APIClient()
+        gp = WindGenParams.objects.create(is_constant=True)
+        for duration in range(5):
+            WindSpacetime.objects.create(generator_name='constant', generator_params=gp, duration=duration)
+
+    def test_cursor_pages_in_one_query_each(self,):
+        durations = []
+        url = '/winds/wind-spacetimes/?page_size=2&fields=id,duration'
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(set(response.data['results'][0]), {'id', 'duration'})
+            durations += [o['duration'] for o in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(durations, [4, 3, 2, 1, 0])
+
+    def test_filter_and_unknown_field(self,):
+        response = self.client.get('/winds/wind-spacetimes/', {'duration': 3})
+        self.assertEqual([o['duration'] for o in response.data['results']], [3])
+        self.assertEqual(self.client.get('/winds/wind-spacetimes/', {'fields': 'id,nope'}).status_code, 400)
+
+    def test_etag_not_modified_until_changed(self,):
+        response = self.client.get('/winds/wind-spacetimes/')
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/winds/wind-spacetimes/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        o = WindSpacetime.objects.get(duration=2)
+        o.timestep = 0.1
+        o.save()
+        self.assertEqual(self.client.get('/winds/wind-spacetimes/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+class TestSummaries(SimpleTestCase):
+    def setUp(self,):
+        self.timestep = 0.01
+        t = self.timestep*np.arange(10000)
+        self.arr = np.stack([2 + np.cos(2*np.pi*0.5*t), np.sin(2*np.pi*3*t), np.zeros_like(t)], axis=1)
+
+    def test_summarize(self,):
+        stats = summarize(self.arr, self.timestep)
+        np.testing.assert_allclose(stats['speed_mean'], [2, 0, 0], atol=1e-9)
+        np.testing.assert_allclose(stats['speed_var'], [.5, .5, 0], atol=1e-9)
+        np.testing.assert_allclose(stats['speed_max'], [3, 1, 0], atol=1e-6)
+        np.testing.assert_allclose(stats['peak_frequency'], [.5, 3, 0])
+
+    def test_downsample_averages_blocks(self,):
+        arr = np.arange(21, dtype=float).reshape(7, 3)
+        np.testing.assert_array_equal(downsample(arr, 3), [[3, 4, 5], [12, 13, 14], [18, 19, 20]])
+
+    @override_settings(WIND_PYRAMID_FACTORS=[10, 100, 1000, 10000])
+    def test_pyramid_levels(self,):
+        pyramid = build_pyramid(self.arr)
+        self.assertEqual({f: len(level) for f, level in pyramid.items()}, {10: 1000, 100: 100, 1000: 10})
+
+class TestResample(SimpleTestCase):
+    def setUp(self,):
+        self.arr = np.stack([np.arange(101.), 2*np.arange(101.), np.zeros(101)], axis=1) # linear in t, over 1s at 0.01s
+
+    def test_same_timestep(self,):
+        self.assertIs(resample(self.arr, 0.01, 0.01), self.arr)
+
+    def test_whole_multiple_is_decimated_view(self,):
+        resampled = resample(self.arr, 0.01, 0.05)
+        self.assertTrue(np.shares_memory(resampled, self.arr))
+        np.testing.assert_array_equal(resampled, self.arr[::5])
+
+    def test_otherwise_interpolated(self,):
+        for new_timestep, rows in [(0.03, 34), (0.005, 201)]:
+            resampled = resample(self.arr, 0.01, new_timestep)
+            self.assertEqual(resampled.shape, (rows, 3))
+            np.testing.assert_allclose(resampled[:,1], 2*new_timestep/0.01*np.arange(rows))
+
+class TestLazyGenerators(TestCase):
+    def setUp(self,):
+        self.client = APIClient()
+        self.gp = WindGenParams.objects.create(is_constant=True, base_velocity=[3, -1, 0])
+
+    def test_constant_is_broadcast_view(self,):
+        arr = build_generator('constant', self.gp, 0.01).gen(100)
+        self.assertEqual(arr.shape, (10001, 3))
+        self.assertEqual(arr.strides[0], 0)
+        np.testing.assert_array_equal(arr[-1], [3, -1, 0])
+        np.testing.assert_array_equal(build_generator('windless', None, 0.01).gen(1), np.zeros((101, 3)))
+
+    def test_created_without_blob_and_downloaded(self,):
+        response = self.client.post('/winds/wind-spacetimes/', {'generator_name': 'constant', 'generator_params': self.gp.id.__str__(), 'duration': 10, 'timestep': 0.1}, format='json')
+        o = WindSpacetime.objects.get(pk=response.data['id'])
+        self.assertIsNone(o.blob_filename)
+        self.assertEqual(o.speed_mean, [3, -1, 0])
+
+        response = self.client.get(f'/winds/wind-spacetimes/{o.id}/download/', {'start': 1, 'stop': 2})
+        arr = np.load(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(arr.shape, (11, 3))
+        np.testing.assert_array_equal(arr[0], [3, -1, 0])
+
+        for window in [{'start': 'abc'}, {'stop': 'nan'}]:
+            response = self.client.get(f'/winds/wind-spacetimes/{o.id}/download/', window)
+            self.assertEqual(response.status_code, 400)
+
+class TestWindSources(TestCase):
+    def setUp(self,):
+        self.params = {'base_velocity': [1, 0, 0], 'amplitude': [1, 2, .5], 'frequency': [.1, .2, .3], 'phase_offset': [0, 1, 2]}
+
+    def test_analytic_matches_generator(self,):
+        G = OscillatoryGenerator({**self.params, 'dt': 0.01})
+        source = AnalyticWindSource(G, 10)
+        np.testing.assert_allclose(source.sample(0.01), G.gen(10), rtol=0, atol=1e-12)
+        np.testing.assert_allclose(source.velocity(np.array([0.5, 1.25])), [G.v(0.5), G.v(1.25)], rtol=0, atol=1e-12)
+
+    def test_array_interpolates(self,):
+        arr = np.stack([np.arange(11.), np.zeros(11), np.ones(11)], axis=1)
+        source = ArrayWindSource(arr, 0.1)
+        np.testing.assert_allclose(source.velocity(np.array([0.25, 5.])), [[2.5, 0, 1], [10, 0, 1]])
+        self.assertEqual(source.sample(0.2).shape, (6, 3))
+
+    def test_oscillatory_spacetime_has_no_blob(self,):
+        gp = WindGenParams.objects.create(is_oscillatory=True, **self.params)
+        response = APIClient().post('/winds/wind-spacetimes/', {'generator_name': 'oscillatory', 'generator_params': gp.id.__str__(), 'duration': 10, 'timestep': 0.01}, format='json')
+        o = WindSpacetime.objects.get(pk=response.data['id'])
+        self.assertIsNone(o.blob_filename)
+        self.assertIsInstance(get_wind_source(o.id), AnalyticWindSource)
+        # served at any timestep, evaluated rather than interpolated
+        G = OscillatoryGenerator({**self.params, 'dt': 0.003})
+        np.testing.assert_allclose(get_wind_array(o.id, timestep=0.003), G.gen(10), rtol=0, atol=1e-12)
+        self.assertEqual(get_wind_array(o.id, factor=100).shape, (11, 3))
+
+@override_settings(BLOB_STORAGE={'BACKEND': 'commons.storage.MemoryStorageBackend'})
+class TestLorenzEnsemble(TestCase):
+    def setUp(self,):
+        get_storage_backend.cache_clear()
+        self.members = [{'base_velocity': [1, 1, 1+k/10], 'rho': 28, 'sigma': 10, 'beta': 8/3 + k/100} for k in range(5)]
+
+    def tearDown(self,):
+        get_storage_backend.cache_clear()
+
+    def test_members_match_individual_generation(self,):
+        G = LorenzEnsembleGenerator({**{k: [m[k] for m in self.members] for k in self.members[0]}, 'dt': 0.01})
+        arr = G.gen(5)
+        self.assertEqual(arr.shape, (501, 5, 3))
+        for k, m in enumerate(self.members):
+            np.testing.assert_array_equal(arr[:,k,:], LorenzGenerator({**m, 'dt': 0.01}).gen(5))
+
+    def test_endpoint_creates_once(self,):
+        data = {'members': self.members[:3] + self.members[:1], 'duration': 2, 'timestep': 0.01}
+        response = APIClient().post('/winds/wind-spacetimes/lorenz-ensemble/', data, format='json')
+        self.assertEqual(response.data['created'], 3)
+        ids = response.data['ids']
+        self.assertEqual(ids[0], ids[3])
+        o = WindSpacetime.objects.get(pk=ids[1])
+        np.testing.assert_array_equal(get_wind_array(o.id), LorenzGenerator({**self.members[1], 'dt': 0.01}).gen(2))
+        self.assertIsNotNone(o.speed_mean)
+
+        response = APIClient().post('/winds/wind-spacetimes/lorenz-ensemble/', {**data, 'members': self.members}, format='json')
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['ids'][:3], ids[:3])
+        self.assertEqual(WindGenParams.objects.count(), 5)
+
+    def test_endpoint_validates(self,):
+        data = {'members': self.members[:2], 'duration': 2, 'timestep': 0.01}
+        for invalid in [{'encoding': 'bogus'}, {'encoding': 'quantize', 'tolerance': 'abc'}, {'members': [self.members[0], 'x']}]:
+            response = APIClient().post('/winds/wind-spacetimes/lorenz-ensemble/', {**data, **invalid}, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(WindGenParams.objects.exists())
+        # a parameter set inserted concurrently is a conflict to retry, not an error
+        with mock.patch.object(WindGenParams.objects, 'bulk_create', side_effect=IntegrityError):
+            response = APIClient().post('/winds/wind-spacetimes/lorenz-ensemble/', data, format='json')
+        self.assertEqual(response.status_code, 409)
+
+@override_settings(BLOB_STORAGE={'BACKEND': 'commons.storage.MemoryStorageBackend'})
+class TestSpectralGenerator(TestCase):
+    def setUp(self,):
+        get_storage_backend.cache_clear()
+        self.params = {'base_velocity': [8, 2, 0], 'spectrum': 'kaimal', 'turbulence_sigma': [1, .8, .5], 'length_scale': [340, 113, 28], 'seed': 7}
+
+    def tearDown(self,):
+        get_storage_backend.cache_clear()
+
+    def test_statistics_and_reproducibility(self,):
+        for spectrum in ['kaimal', 'von_karman']:
+            G = SpectralGenerator({**self.params, 'spectrum': spectrum, 'dt': 0.05})
+            arr = G.gen(3600)
+            self.assertEqual(arr.shape, (72001, 3))
+            np.testing.assert_allclose(arr.mean(axis=0), [8, 2, 0], atol=.1)
+            np.testing.assert_allclose(arr.std(axis=0), [1, .8, .5], rtol=.1)
+            np.testing.assert_array_equal(arr, SpectralGenerator({**self.params, 'spectrum': spectrum, 'dt': 0.05}).gen(3600))
+
+    def test_created_via_api(self,):
+        gp = WindGenParams.objects.create(is_spectral=True, **self.params)
+        response = APIClient().post('/winds/wind-spacetimes/', {'generator_name': 'spectral', 'generator_params': gp.id.__str__(), 'duration': 60, 'timestep': 0.1}, format='json')
+        self.assertEqual(response.data['message'], 'Created')
+        np.testing.assert_allclose(get_wind_array(response.data['id']), SpectralGenerator({**self.params, 'dt': 0.1}).gen(60), atol=1e-12)
+
+        gp = WindGenParams.objects.create(is_spectral=True, **{**self.params, 'base_velocity': [0, 0, 0]})
+        response = APIClient().post('/winds/wind-spacetimes/', {'generator_name': 'spectral', 'generator_params': gp.id.__str__(), 'duration': 60, 'timestep': 0.1}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_precision(self,):
+        gp = WindGenParams.objects.create(is_spectral=True, **self.params)
+        data = {'generator_name': 'spectral', 'generator_params': gp.id.__str__(), 'duration': 60, 'timestep': 0.1}
+        for precision in [{'encoding': 'bogus'}, {'encoding': 'quantize'}, {'encoding': 'quantize', 'tolerance': 'abc'}, {'encoding': 'delta', 'tolerance': -1}]:
+            response = APIClient().post('/winds/wind-spacetimes/', {**data, **precision}, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(WindSpacetime.objects.exists())
@@ -1,41 +1,75 @@
 import pandas as pd
 
+from django.db import IntegrityError
 from django.shortcuts import render
 
+from rest_framework.decorators import action
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.response import Response
 
 from .models import WindGenParams, WindSpacetime
 from .serializers import WindGenParamsSerializer, WindSpacetimeSerializer
-from .generators import OscillatoryGenerator, LorenzGenerator
+from .generators import build_generator, LorenzEnsembleGenerator
+from .summaries import summarize_spacetime
+from .caches import get_wind_array
 
+from commons.encodings import check_precision
 from commons.wranglers import BlobWrangler
+from commons.responses import blob_download_response, array_download_response
+from commons.views import SparseFieldsetMixin, ConditionalMixin
 
-class WindGenParamsViewSet(ModelViewSet):
+def request_precision(request):
+    """The opt-in precision encoding of a request's blobs, from its 'encoding' and 'tolerance' data, or None for settings.BLOB_PRECISION. Raises ValueError if they're invalid (see commons.encodings.check_precision)."""
+    if request.data.get('encoding') is None:
+        return None
+    tolerance = request.data.get('tolerance')
+    if tolerance is not None:
+        try:
+            tolerance = float(tolerance)
+        except (TypeError, ValueError):
+            raise ValueError(f'tolerance must be a number, got {tolerance!r}.')
+    check_precision(request.data['encoding'], tolerance)
+    return {
+        'encoding': request.data['encoding'],
+        'tolerance': tolerance,
+    }
+
+class WindGenParamsViewSet(SparseFieldsetMixin, ConditionalMixin, ModelViewSet):
     queryset = WindGenParams.objects.all()
     serializer_class = WindGenParamsSerializer
+    filterset_fields = ['is_windless', 'is_constant', 'is_oscillatory', 'is_lorenz', 'is_spectral']
 
     def create(self, request, *args, **kwargs):
-        # check existence
+        # check existence, by the indexed hash of the parameter set
         serializer = self.get_serializer(data=self.request.data)
         if serializer.is_valid():
-            qs = self.get_queryset().filter(**serializer.validated_data)
-            if qs.count() != 0:
+            id = WindGenParams.find_duplicate_id(serializer.validated_data)
+            if id is not None:
                 print("This parameter set already exists.")
-                id = qs[0].id.__str__()
                 return Response(
                     data={
                         'message': 'Already exists',
-                        'id': id,
+                        'id': id.__str__(),
                     }, 
                     status=409,
                 )
 
-        return super().create(request, *args, **kwargs)
+        try:
+            return super().create(request, *args, **kwargs)
+        except IntegrityError:
+            # created concurrently since the check
+            return Response(
+                data={
+                    'message': 'Already exists',
+                    'id': WindGenParams.find_duplicate_id(serializer.validated_data).__str__(),
+                },
+                status=409,
+            )
 
-class WindSpacetimeViewSet(ModelViewSet):
+class WindSpacetimeViewSet(SparseFieldsetMixin, ConditionalMixin, ModelViewSet):
     queryset = WindSpacetime.objects.all()
     serializer_class = WindSpacetimeSerializer
+    filterset_fields = ['generator_name', 'generator_params', 'duration', 'timestep']
     
     def create(self, request, *args, **kwargs):
         """
@@ -49,6 +83,14 @@ class WindSpacetimeViewSet(ModelViewSet):
             The duration of the winds spacetime trajectory in seconds. (e.g. 100)
         timestep: float
             The timestep size of the winds spacetime trajectory in seconds. (e.g. 0.01)
+        encoding: str [optional]
+            Lossy storage encoding for the wind data, one of 'float32', 'quantize' or 'delta' (see commons.encodings). Defaults to settings.BLOB_PRECISION.
+        tolerance: float [optional]
+            The maximum absolute error (m/s) allowed by the 'quantize' and 'delta' encodings.
+
+        Analytic spacetimes (constant, windless and oscillatory) are generated lazily: only the table entry is stored, without a blob, and the wind is evaluated on demand (see winds.sources).
+
+        Generation also stores per-component summary statistics (speed_mean, speed_var, speed_min, speed_max, peak_frequency) and downsampled levels of the data (see winds.summaries).
 
         Response data:
         -------
@@ -59,51 +101,74 @@ class WindSpacetimeViewSet(ModelViewSet):
                 The uuid of the WindSpaceTime that was generated or already existed for the given parameter set.
         }
         """
-        # check existence
+        # check existence, by the indexed hash of the parameter set
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             vdata = serializer.validated_data
-            qs = self.get_queryset().filter(**vdata)
-            if qs.count() != 0:
+            id = WindSpacetime.find_duplicate_id(vdata)
+            if id is not None:
                 print("This parameter set already exists.")
-                id = qs[0].id.__str__() # uuid str
                 return Response(
                     data={
                         'message': 'Already exists',
-                        'id': id,
+                        'id': id.__str__(), # uuid str
                     }, 
                     status=409,
                 )
 
+            # check the opt-in precision encoding before generating anything to encode
+            try:
+                precision = request_precision(request)
+            except ValueError as exc:
+                return Response(data={'message': str(exc)}, status=400)
+
             # generate wind trajectory
             duration = vdata['duration']
             timestep = vdata['timestep']
-            o = vdata['generator_params'] # ForeignKey --> serializer converts uuid str to mode obj
-            if o.is_oscillatory:
-                params = {
-                    'base_velocity': o.base_velocity,
-                    'amplitude': o.amplitude,
-                    'frequency': o.frequency,
-                    'phase_offset': o.phase_offset,
-                    'dt': timestep,
-                }
-                G = OscillatoryGenerator(params=params)
-            elif o.is_lorenz:
-                params = {
-                    'base_velocity': o.base_velocity, # m/s
-                    'rho': o.rho,
-                    'sigma': o.sigma,
-                    'beta': o.beta,
-                    'dt': timestep, # s
-                }
-                G = LorenzGenerator(params=params)
-
+            o = vdata.get('generator_params') # ForeignKey --> serializer converts uuid str to mode obj
+            try:
+                G = build_generator(vdata['generator_name'], o, timestep)
+            except ValueError as exc:
+                return Response(data={'message': str(exc)}, status=400)
             arr_wind_speeds = G.gen(duration)
+            if G.is_lazy:
+                # analytic, so store only the parameters; the summary of a constant wind is that of any one row
+                obj = WindSpacetime(**vdata)
+                summarize_spacetime(obj, arr_wind_speeds[:1] if G.is_constant else arr_wind_speeds, None, store_levels=False)
+                try:
+                    obj.save()
+                except IntegrityError:
+                    return Response(
+                        data={
+                            'message': 'Already exists',
+                            'id': WindSpacetime.find_duplicate_id(vdata).__str__(),
+                        },
+                        status=409,
+                    )
+                return Response(
+                    data={
+                        'message':'Created',
+                        'id': obj.id.__str__(),
+                    }
+                )
             df_wind_speeds = pd.DataFrame(arr_wind_speeds, columns=['x','y','z'])
             
             # store data (blob and obj)
             B = BlobWrangler()
-            obj = B.write_blob(df_wind_speeds, WindSpacetime, vdata)
+            try:
+                obj = B.write_blob(df_wind_speeds, WindSpacetime, vdata, precision)
+            except IntegrityError:
+                # generated concurrently since the check; the blob just stored is left to the blob janitor
+                return Response(
+                    data={
+                        'message': 'Already exists',
+                        'id': WindSpacetime.find_duplicate_id(vdata).__str__(),
+                    },
+                    status=409,
+                )
+            # summary statistics and downsampled levels, for comparing and previewing without the full blob
+            summarize_spacetime(obj, arr_wind_speeds, B, precision)
+            obj.save(update_fields=WindSpacetime.summary_fields + ['modified_at'])
             id = obj.id.__str__() 
             return Response(
                 data={
@@ -114,6 +179,111 @@ class WindSpacetimeViewSet(ModelViewSet):
         else:
             return super().create(request, *args, **kwargs)
 
+    @action(detail=False, methods=['post'], url_path='lorenz-ensemble')
+    def lorenz_ensemble(self, request):
+        """
+        Generate the spacetimes of many Lorenz systems at once, e.g. with perturbed parameters or initial velocities, integrating them together as one (K, 3) state (see LorenzEnsembleGenerator). Parameter sets and spacetimes which already exist are reused, the rest are created with one bulk insert each.
+
+        POST data:
+        -------
+        members: list of dict
+            The Lorenz parameters of each member: base_velocity, rho, sigma, beta.
+        duration: float
+            The duration of the winds spacetime trajectories in seconds. (e.g. 100)
+        timestep: float
+            The timestep size of the winds spacetime trajectories in seconds. (e.g. 0.01)
+        encoding, tolerance: [optional]
+            As for create.
+
+        Response data:
+        -------
+        {
+            message: str ['Created'],
+            ids: list of str [uuid]
+                The WindSpacetime of each member, in order.
+            created: int
+                How many of them were generated, rather than already existing.
+        }
+        """
+        members = request.data.get('members')
+        if not isinstance(members, list) or not members or not all(isinstance(m, dict) for m in members):
+            return Response(data={'members': ['A non-empty list of Lorenz parameters is required.']}, status=400)
+        try:
+            precision = request_precision(request)
+        except ValueError as exc:
+            return Response(data={'message': str(exc)}, status=400)
+        params_serializer = WindGenParamsSerializer(data=[{**m, 'is_lorenz': True} for m in members], many=True)
+        spacetime_serializer = self.get_serializer(data={
+            'generator_name': 'lorenz',
+            **{k: request.data[k] for k in ('duration', 'timestep') if k in request.data},
+        })
+        if not params_serializer.is_valid():
+            return Response(data={'members': params_serializer.errors}, status=400)
+        if not spacetime_serializer.is_valid():
+            return Response(data=spacetime_serializer.errors, status=400)
+        duration = spacetime_serializer.validated_data['duration']
+        timestep = spacetime_serializer.validated_data['timestep']
+
+        # parameter sets, then spacetimes, found by their indexed hashes
+        try:
+            list_gen_params = WindGenParams.bulk_get_or_create(params_serializer.validated_data)
+        except IntegrityError:
+            # some were created concurrently since the check
+            return Response(data={'message': 'Already exists; retry to get the ids.'}, status=409)
+        list_vdata = [{**spacetime_serializer.validated_data, 'generator_params': o} for o in list_gen_params]
+        hashes = [WindSpacetime.hash_params(vdata) for vdata in list_vdata]
+        ids = dict(WindSpacetime.objects.filter(params_hash__in=set(hashes)).values_list('params_hash', 'id'))
+        to_generate = {}
+        for h, vdata in zip(hashes, list_vdata):
+            if h not in ids:
+                to_generate.setdefault(h, vdata)
+
+        if to_generate:
+            # integrate the new members together
+            G = LorenzEnsembleGenerator.from_gen_params([vdata['generator_params'] for vdata in to_generate.values()], timestep)
+            arr_wind_speeds = G.gen(duration)
+
+            # store blobs in the background, then the entries in one bulk insert
+            B = BlobWrangler()
+            for k, (h, vdata) in enumerate(to_generate.items()):
+                arr = arr_wind_speeds[:,k,:]
+                obj = B.queue_blob(pd.DataFrame(arr, columns=['x','y','z']), WindSpacetime, vdata, precision)
+                obj.params_hash = h # bulk_create doesn't call save
+                summarize_spacetime(obj, arr, B, precision)
+                ids[h] = obj.id
+            try:
+                B.flush()
+            except IntegrityError:
+                # some were generated concurrently since the check; the blobs just stored are left to the blob janitor
+                return Response(data={'message': 'Already exists; retry to get the ids.'}, status=409)
+
+        return Response(
+            data={
+                'message': 'Created',
+                'ids': [ids[h].__str__() for h in hashes],
+                'created': len(to_generate),
+            }
+        )
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """
+        Stream the wind speed data of a WindSpacetime straight from blob storage.
+
+        Query parameters:
+        -------
+        filetype: str ['arrow' | 'npy']
+            'arrow' (default) serves the stored feather file, honoring HTTP Range. 'npy' serves a (T, 3) array of (x, y, z) wind speeds.
+        start, stop: float
+            Optional time window in seconds. Implies filetype=npy.
+
+        Analytic spacetimes have no blob, so are evaluated and served from memory.
+        """
+        o = self.get_object()
+        if o.blob_filename is None:
+            return array_download_response(request, get_wind_array(o.id), o.timestep, o.id.__str__())
+        return blob_download_response(request, o, o.timestep)
+
     def destroy(self, request, *args, **kwargs):
         # destory blob
         o = self.get_object()
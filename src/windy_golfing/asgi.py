@@ -5,6 +5,8 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
+
+Serve with an ASGI server, e.g. `uvicorn windy_golfing.asgi:application`, so the async views (simulator/async/...) wait without holding a thread per client.
 """
 
 import os
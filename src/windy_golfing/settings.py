@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 
 from pathlib import Path
 
+from celery.schedules import crontab
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -38,12 +40,18 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "rest_framework",
+    "django_filters",
     "commons",
     "winds",
     "simulator",
     "django_extensions",
 ]
 
+REST_FRAMEWORK = {
+    'DEFAULT_PAGINATION_CLASS': 'commons.pagination.CreatedCursorPagination',
+    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+}
+
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -134,6 +142,29 @@ STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+### Blob storage ###
+BLOB_STORAGE = {
+    'BACKEND': 'commons.storage.LocalStorageBackend',
+    'OPTIONS': {
+        'location': BASE_DIR / '.blob_storage',
+    },
+    # e.g. an S3-compatible bucket (requires boto3)...
+    # 'BACKEND': 'commons.storage.S3StorageBackend',
+    # 'OPTIONS': {'bucket': 'windy-golfing', 'prefix': 'blobs/', 'endpoint_url': 'http://127.0.0.1:9000'},
+}
+BLOB_COMPRESSION = { # feather compression per model, tuned to the data each holds
+    'default': {'compression': 'lz4'},
+    'windspacetime': {'compression': 'zstd'}, # smooth series, where zstd is several times smaller than lz4
+    'simtrial': {'compression': 'lz4'}, # many small, mostly-NaN trajectories, where lz4 is as small and fastest
+}
+BLOB_PRECISION = { # opt-in lossy encoding per model (see commons.encodings), e.g. {'encoding': 'delta', 'tolerance': 1e-3}
+    'default': {}, # float64 as-is
+}
+TRAJECTORY_SAMPLING = {} # opt-in output sampling of stored trial trajectories (see simulator.simulation.samplers), e.g. {'sampler': 'rdp', 'tolerance': 1e-3}; o.w. every step is stored
+BLOB_IO_THREADS = 4 # background threads for blob reads and writes
+BLOB_GC_GRACE = 6*60*60 # seconds; blobs younger than this are never garbage collected, since their entries may not be saved yet
+BLOB_PACK_MIN_BLOBS = 16 # compact a group of small blobs (e.g. an experiment's trials) into a pack file once it has this many
+
 ### Celery Configuration Options ###
 # CELERY_BROKER_URL = 'redis://127.0.0.1:6379/0'
 # CELERY_RESULT_BACKEND = 'redis://127.0.0.1:6379/0'
@@ -142,4 +173,17 @@ CELERY_RESULT_BACKEND = 'redis://127.0.0.1:6379'
 
 CELERY_TIMEZONE = "US/Central"
 CELERY_TASK_TRACK_STARTED = True
+CELERY_BEAT_SCHEDULE = { # run with `celery -A windy_golfing beat`
+    'collect-blob-garbage': {
+        'task': 'commons.tasks.collectBlobGarbageTask',
+        'schedule': crontab(hour=3, minute=0), # nightly
+    },
+}
+
+### Worker warm-up ###
+WIND_CACHE_SIZE = 8 # wind spacetime arrays kept in memory per worker process
+WIND_CACHE_PRELOAD = 4 # most recently created wind spacetimes loaded when a worker starts
+WIND_PYRAMID_FACTORS = [10, 100, 1000] # downsampled levels of each wind spacetime, stored beside its blob for previews
+SURROGATE_CACHE_SIZE = 64 # fitted landing surrogates kept in memory per process, for the predict API
+LANDING_TABLE_TOLERANCE = .05 # m; experiments only use landing tables validated to within this of the exact solver
 # CELERY_TASK_TIME_LIMIT = 30 * 60
\ No newline at end of file
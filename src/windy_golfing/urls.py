@@ -19,4 +19,5 @@ from django.urls import path, include
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("winds/", include('winds.urls')),
+    path("simulator/", include('simulator.urls')),
 ]